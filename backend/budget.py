@@ -0,0 +1,84 @@
+"""
+Rate budgets for background work. A task that sets budgets (e.g. the precompute
+scheduler's workers) has every upstream FDA / Gemini call it makes, directly or
+through helpers, wait for a token first; foreground requests run without a budget.
+
+Work shared between callers (SingleFlight) runs in a shared_context(): it is charged
+to the budgets of the caller that started it until a foreground caller joins it, so a
+request never waits on a background budget.
+"""
+import asyncio
+import contextvars
+import time
+
+
+class RateBudget:
+    """Token bucket: `per_minute` calls per minute on average, bursts up to `burst`."""
+
+    def __init__(self, per_minute: float, burst: int | None = None):
+        self.per_minute = per_minute
+        self.capacity = float(burst if burst is not None else max(1, int(per_minute // 6)))
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock: asyncio.Lock | None = None
+        self._loop = None
+        self.spent = 0
+        self.waited_s = 0.0
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.per_minute / 60)
+        self._updated = now
+
+    async def acquire(self) -> None:
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop, self._lock = loop, asyncio.Lock()
+        async with self._lock:
+            started = time.monotonic()
+            self._refill()
+            if self._tokens < 1:
+                await asyncio.sleep((1 - self._tokens) * 60 / self.per_minute)
+                self._refill()
+            self._tokens -= 1
+            self.spent += 1
+            self.waited_s += time.monotonic() - started
+
+    def stats(self) -> dict:
+        return {"per_minute": self.per_minute, "spent": self.spent, "waited_s": round(self.waited_s, 2)}
+
+
+_budgets: contextvars.ContextVar[dict[str, RateBudget] | None] = contextvars.ContextVar("budgets", default=None)
+
+
+def use_budgets(budgets: dict[str, RateBudget]) -> None:
+    """Charge upstream calls made from the current task (and tasks it starts) to budgets."""
+    _budgets.set(budgets)
+
+
+async def spend(upstream: str) -> None:
+    """Wait for a token from the current task's budget for upstream ("fda", "gemini"), if any."""
+    budgets = _budgets.get()
+    if budgets and upstream in budgets:
+        await budgets[upstream].acquire()
+
+
+def shared_context() -> contextvars.Context:
+    """
+    Context for work other callers may join: the current budgets, through a copy of
+    their mapping that waive_budgets() can empty without touching the owner's.
+    """
+    context = contextvars.copy_context()
+    budgets = _budgets.get()
+    if budgets:
+        context.run(_budgets.set, dict(budgets))
+    return context
+
+
+def waive_budgets(context: contextvars.Context) -> None:
+    """A caller joins work running in context; a foreground one stops it being charged."""
+    if _budgets.get():
+        return
+    budgets = context.get(_budgets)
+    if budgets:
+        budgets.clear()
@@ -0,0 +1,259 @@
+import asyncio
+import contextvars
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable
+
+from budget import shared_context, waive_budgets
+
+
+class TTLCache:
+    """
+    Bounded in-memory cache with per-entry TTL and LRU eviction.
+    Entries can carry a tag (e.g. a patient id) so a group can be dropped at once.
+    Guarded by a lock so it can also be used from asyncio.to_thread workers.
+    """
+
+    def __init__(self, maxsize: int = 512, ttl: float = 3600.0):
+        self.maxsize = max(1, maxsize)
+        self.ttl = ttl
+        self._data: OrderedDict[str, tuple[float, Any]] = OrderedDict()
+        self._lock = threading.RLock()
+        self._tags: dict[str, set[str]] = {}
+        self._key_tags: dict[str, str] = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key: str, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            expires_at, value = entry
+            if expires_at <= time.monotonic():
+                self._remove(key)
+                self.expirations += 1
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def peek(self, key: str, default: Any = None) -> Any:
+        """get without touching hit/miss counts or LRU order, for bookkeeping reads."""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or entry[0] <= time.monotonic():
+                return default
+            return entry[1]
+
+    def set(self, key: str, value: Any, ttl: float | None = None, tag: str | None = None) -> None:
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._untag(key)
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            if tag is not None:
+                self._tags.setdefault(tag, set()).add(key)
+                self._key_tags[key] = tag
+            while len(self._data) > self.maxsize:
+                self._remove(next(iter(self._data)))
+                self.evictions += 1
+
+    def pop(self, key: str, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return default
+            self._remove(key)
+            return entry[1]
+
+    def invalidate_tag(self, tag: str) -> int:
+        """Drop every entry stored with this tag. Returns how many were dropped."""
+        with self._lock:
+            keys = list(self._tags.get(tag, ()))
+            for key in keys:
+                self._remove(key)
+            return len(keys)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self._tags.clear()
+            self._key_tags.clear()
+
+    def _remove(self, key: str) -> None:
+        self._data.pop(key, None)
+        self._untag(key)
+
+    def _untag(self, key: str) -> None:
+        tag = self._key_tags.pop(key, None)
+        if tag is not None:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
+
+    def __contains__(self, key: str) -> bool:
+        entry = self._data.get(key)
+        return entry is not None and entry[0] > time.monotonic()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> dict:
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
+
+
+class SQLiteCache:
+    """
+    Persistent key -> JSON value cache with expiry and optional tags, for results
+    that should survive restarts. Blocking; call through asyncio.to_thread from async code.
+    """
+
+    def __init__(self, path: str, table: str = "cache"):
+        if not table.isidentifier():
+            raise ValueError(f"Invalid table name: {table!r}")
+        self.path = path
+        self.table = table
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                f"""CREATE TABLE IF NOT EXISTS {table} (
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL,
+                    expires_at REAL NOT NULL,
+                    tag TEXT
+                )"""
+            )
+            self._conn.execute(f"CREATE INDEX IF NOT EXISTS {table}_tag ON {table} (tag)")
+
+    def get(self, key: str, default: Any = None) -> Any:
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT value, expires_at FROM {self.table} WHERE key = ?", (key,)
+            ).fetchone()
+        if row is None or row[1] <= time.time():
+            return default
+        return json.loads(row[0])
+
+    def set(self, key: str, value: Any, ttl: float, tag: str | None = None) -> None:
+        with self._lock, self._conn:
+            self._conn.execute(
+                f"INSERT OR REPLACE INTO {self.table} (key, value, expires_at, tag) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(value), time.time() + ttl, tag),
+            )
+
+    def get_many(self, keys: list[str]) -> dict[str, Any]:
+        """Unexpired values for the given keys (missing keys are omitted)."""
+        out: dict[str, Any] = {}
+        now = time.time()
+        for start in range(0, len(keys), 500):
+            chunk = keys[start:start + 500]
+            placeholders = ",".join("?" for _ in chunk)
+            with self._lock:
+                rows = self._conn.execute(
+                    f"SELECT key, value FROM {self.table} WHERE key IN ({placeholders}) AND expires_at > ?",
+                    (*chunk, now),
+                ).fetchall()
+            out.update((key, json.loads(value)) for key, value in rows)
+        return out
+
+    def set_many(self, items: dict[str, Any], ttl: float, tag: str | None = None) -> None:
+        expires_at = time.time() + ttl
+        with self._lock, self._conn:
+            self._conn.executemany(
+                f"INSERT OR REPLACE INTO {self.table} (key, value, expires_at, tag) VALUES (?, ?, ?, ?)",
+                [(key, json.dumps(value), expires_at, tag) for key, value in items.items()],
+            )
+
+    def delete(self, key: str) -> None:
+        with self._lock, self._conn:
+            self._conn.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+
+    def invalidate_tag(self, tag: str) -> int:
+        with self._lock, self._conn:
+            return self._conn.execute(f"DELETE FROM {self.table} WHERE tag = ?", (tag,)).rowcount
+
+    def purge_expired(self) -> int:
+        with self._lock, self._conn:
+            return self._conn.execute(
+                f"DELETE FROM {self.table} WHERE expires_at <= ?", (time.time(),)
+            ).rowcount
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+def stable_hash(*parts: Any) -> str:
+    """sha256 of the canonical JSON of parts; stable across processes and restarts."""
+    payload = json.dumps(parts, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+class SingleFlight:
+    """
+    Collapses concurrent calls for the same key into one running coroutine.
+    The shared call is shielded, so a caller that times out or is cancelled
+    doesn't cancel the work other callers are waiting on.
+    """
+
+    def __init__(self):
+        self._inflight: dict[str, tuple[asyncio.Future, contextvars.Context]] = {}
+        self.coalesced = 0
+
+    def start(
+        self, key: str, fn: Callable[[], Awaitable[Any]], context: contextvars.Context | None = None
+    ) -> tuple[asyncio.Future, bool]:
+        """
+        The shared future for key and whether this call started it. fn() runs in a
+        budget.shared_context() (or context, for work fn() only waits on), so a
+        foreground caller joining background work stops it waiting on rate budgets.
+        """
+        running = self._inflight.get(key)
+        if running is not None:
+            self.coalesced += 1
+            waive_budgets(running[1])
+            return running[0], False
+        context = context if context is not None else shared_context()
+        work = fn()
+        if asyncio.iscoroutine(work):
+            fut = asyncio.get_running_loop().create_task(work, context=context)
+        else:
+            fut = asyncio.ensure_future(work)
+        self._inflight[key] = (fut, context)
+        fut.add_done_callback(lambda f: self._done(key, f))
+        return fut, True
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        fut, _ = self.start(key, fn)
+        return await asyncio.shield(fut)
+
+    def _done(self, key: str, fut: asyncio.Future) -> None:
+        running = self._inflight.get(key)
+        if running is not None and running[0] is fut:
+            del self._inflight[key]
+        # Mark the exception retrieved even if every waiter gave up
+        if not fut.cancelled():
+            fut.exception()
+
+    def __len__(self) -> int:
+        return len(self._inflight)
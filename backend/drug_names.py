@@ -0,0 +1,158 @@
+"""
+Drug-name normalization: free-text medication names ("Lisinopril 10 MG Oral Tablet",
+"ZESTRIL", "lisinopril 10mg") map to one canonical ingredient key ("lisinopril"),
+so label caches and upstream lookups are shared across spellings.
+
+Strength, dose-form and bracketed brand suffixes are stripped by rule; brand to
+generic mappings come from the openfda brand_name / generic_name fields of labels
+(the offline index in bulk, plus every label fetched live) and are kept in SQLite.
+"""
+import re
+import sqlite3
+import threading
+
+_UNITS = r"(?:mg|mcg|µg|ug|g|gm|kg|ml|l|%|units?|iu|meq|mmol|mg/ml|mcg/ml|mg/g)"
+# A number hyphenated onto a word ("omega-3") or a #N product designator ("Tylenol #3", which
+# contains codeine) is part of the name, not a strength
+_STRENGTH_RE = re.compile(
+    rf"(?<![\w.#])(?<![a-z]-)\d+(?:[.,]\d+)?\s*{_UNITS}?(?:\s*/\s*\d*(?:[.,]\d+)?\s*(?:{_UNITS}|actuation|hr|h|dose))?(?![a-z])"
+)
+_FORMS = (
+    "extended release", "extended-release", "delayed release", "delayed-release", "film coated",
+    "film-coated", "orally disintegrating", "oral", "tablets?", "tabs?", "capsules?", "caps?",
+    "solution", "suspension", "syrup", "elixir", "injection", "injectable", "cream", "ointment",
+    "lotion", "gel", "patch", "inhaler", "inhalation", "aerosol", "spray", "drops", "powder",
+    "chewable", "topical", "ophthalmic", "otic", "nasal", "vial", "prefilled syringe",
+    "er", "xr", "xl", "sr", "cr", "dr", "la", "odt", "ec",
+)
+_FORM_RE = re.compile(r"\b(?:" + "|".join(_FORMS) + r")\b")
+# Salt and hydrate words name the formulation, not the active moiety ("metformin hcl")
+_SALTS = frozenset((
+    "hcl", "hydrochloride", "hbr", "hydrobromide", "sodium", "potassium", "calcium", "magnesium",
+    "sulfate", "phosphate", "maleate", "tartrate", "succinate", "besylate", "mesylate", "citrate",
+    "acetate", "fumarate", "bromide", "chloride", "monohydrate", "dihydrate", "trihydrate",
+))
+# Mineral words that are half of the drug's name, never a moiety a salt can be stripped from
+# ("ferrous sulfate", "zinc sulfate")
+_MINERALS = frozenset((
+    "ferrous", "ferric", "iron", "zinc", "lithium", "aluminum", "aluminium", "ammonium",
+    "copper", "cupric", "manganese", "chromium", "selenium", "silver", "strontium",
+))
+# RxNorm-style displays carry the brand in brackets: "lisinopril 10 MG Oral Tablet [Zestril]"
+_BRACKET_RE = re.compile(r"\[[^\]]*\]|\([^)]*\)")
+_INGREDIENT_SPLIT_RE = re.compile(r"\s*(?:,|/|\+|;|\band\b|\bwith\b)\s*")
+
+
+def normalize_text(name: str) -> str:
+    return " ".join((name or "").split()).casefold()
+
+
+def strip_strength(name: str) -> str:
+    """The drug part of a medication string: strengths, dose forms, salts and bracketed text removed."""
+    text = normalize_text(name)
+    stripped = _BRACKET_RE.sub(" ", text)
+    stripped = _STRENGTH_RE.sub(" ", stripped)
+    stripped = _FORM_RE.sub(" ", stripped)
+    stripped = " ".join(stripped.replace(" ,", ",").split()).strip(" ,-/")
+    words = stripped.split()
+    # Only salt words trailing a known moiety go ("metformin hcl", "losartan potassium"); when
+    # the salt is the drug ("potassium chloride", "calcium carbonate", "ferrous sulfate") it stays
+    end = len(words)
+    while end and words[end - 1].strip(",") in _SALTS:
+        end -= 1
+    if 0 < end < len(words) and any(w.strip(",") not in _SALTS | _MINERALS for w in words[:end]):
+        stripped = " ".join(words[:end]).strip(" ,-/")
+    # Never strip a name down to nothing ("Oral Solution" alone stays as typed)
+    return stripped or text
+
+
+def display_name(name: str) -> str:
+    """strip_strength for display: the original casing of the words that survive."""
+    kept = strip_strength(name)
+    words = (name or "").split()
+    folded = [w.casefold() for w in words]
+    target = kept.split()
+    for start in range(len(folded) - len(target) + 1):
+        if folded[start:start + len(target)] == target:
+            return " ".join(words[start:start + len(target)])
+    return kept
+
+
+def ingredient_key(generic_name: str) -> str:
+    """Canonical key for an openfda generic_name: ingredients stripped, sorted, joined with ' / '."""
+    parts = {strip_strength(p) for p in _INGREDIENT_SPLIT_RE.split(normalize_text(generic_name)) if p.strip()}
+    parts.discard("")
+    return " / ".join(sorted(parts)) or normalize_text(generic_name)
+
+
+class DrugSynonyms:
+    """
+    Alias (normalized brand or generic name) -> canonical ingredient key, in memory
+    and, when path is set, in a SQLite table that survives restarts.
+    """
+
+    def __init__(self, path: str = ""):
+        self.path = path
+        self._lock = threading.Lock()
+        self._aliases: dict[str, str] = {}
+        self._conn = None
+        if path:
+            self._conn = sqlite3.connect(path, check_same_thread=False)
+            with self._lock, self._conn:
+                self._conn.execute("PRAGMA journal_mode=WAL")
+                self._conn.execute(
+                    """CREATE TABLE IF NOT EXISTS drug_synonyms (
+                        alias TEXT PRIMARY KEY,
+                        canonical TEXT NOT NULL
+                    )"""
+                )
+                rows = self._conn.execute("SELECT alias, canonical FROM drug_synonyms").fetchall()
+            self._aliases.update(rows)
+
+    def __len__(self) -> int:
+        return len(self._aliases)
+
+    def canonical(self, name: str) -> str:
+        """Canonical key for any spelling; unknown names fall back to their own ingredient key."""
+        text = normalize_text(name)
+        if text in self._aliases:
+            return self._aliases[text]
+        stripped = strip_strength(text)
+        if stripped in self._aliases:
+            return self._aliases[stripped]
+        return ingredient_key(stripped)
+
+    def add_many(self, pairs) -> int:
+        """Record (alias, canonical) pairs; an alias keeps its first mapping. Returns new aliases."""
+        new = []
+        with self._lock:
+            for alias, canonical in pairs:
+                alias = strip_strength(alias)
+                if alias and canonical and alias not in self._aliases:
+                    self._aliases[alias] = canonical
+                    new.append((alias, canonical))
+            if new and self._conn is not None:
+                with self._conn:
+                    self._conn.executemany(
+                        "INSERT OR IGNORE INTO drug_synonyms (alias, canonical) VALUES (?, ?)", new
+                    )
+        return len(new)
+
+    def learn_label(self, info: dict) -> str | None:
+        """
+        Map a label's brand and generic names (get_drug_info shape) to its ingredient key.
+        Returns that key, or None when the label has no generic name.
+        """
+        names = info.get("name", {})
+        generics = [g for g in names.get("generic", []) if g and g != "N/A"]
+        if not generics:
+            return None
+        canonical = ingredient_key(generics[0])
+        brands = [b for b in names.get("brand", []) if b and b != "N/A"]
+        self.add_many((alias, canonical) for alias in [*generics, *brands, canonical])
+        return canonical
+
+    def close(self) -> None:
+        if self._conn is not None:
+            with self._lock:
+                self._conn.close()
@@ -0,0 +1,106 @@
+"""
+In-memory prefix index of drug brand and generic names for /drugs/search typeahead.
+
+Each name is indexed under its full text and under every word start, so "cod"
+finds both CODEINE and ACETAMINOPHEN AND CODEINE. Lookups are a bisect into a
+sorted key list plus a bounded scan, so a keystroke never waits on SQLite or the
+FDA API. openfda fills the index from the offline label index, the label store and
+every label it fetches live.
+"""
+import bisect
+import threading
+
+from drug_names import normalize_text as normalize_name
+
+KINDS = ("brand", "generic")
+# Upper bound on keys scanned for one prefix; short prefixes stop early
+_MAX_SCAN = 2000
+
+
+class DrugNameIndex:
+    """Distinct (name, kind) entries with a label count used as a popularity signal."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # (normalized name, kind) -> {"name", "kind", "labels"}
+        self._entries: dict[tuple[str, str], dict] = {}
+        # Sorted (key, normalized name, kind); key is the name or one of its word suffixes
+        self._keys: list[tuple[str, str, str]] = []
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @staticmethod
+    def _word_keys(norm: str) -> list[str]:
+        keys = [norm]
+        for i, char in enumerate(norm):
+            if char == " " and i + 1 < len(norm):
+                keys.append(norm[i + 1:])
+        return keys
+
+    def _put(self, name: str, kind: str, labels: int) -> tuple[str, str] | None:
+        """Record an entry; returns its id when it is new (its keys still need indexing)."""
+        norm = normalize_name(name)
+        if not norm or kind not in KINDS:
+            return None
+        entry_id = (norm, kind)
+        entry = self._entries.get(entry_id)
+        if entry is not None:
+            entry["labels"] = max(entry["labels"], labels)
+            return None
+        self._entries[entry_id] = {"name": " ".join(name.split()), "kind": kind, "labels": labels}
+        return entry_id
+
+    def add(self, name: str, kind: str, labels: int = 1) -> None:
+        with self._lock:
+            entry_id = self._put(name, kind, labels)
+            if entry_id is not None:
+                for key in self._word_keys(entry_id[0]):
+                    bisect.insort(self._keys, (key, *entry_id))
+
+    def add_many(self, names) -> int:
+        """Bulk add (name, kind, labels) triples; the key list is re-sorted once. Returns new entries."""
+        with self._lock:
+            added = []
+            for name, kind, labels in names:
+                entry_id = self._put(name, kind, labels)
+                if entry_id is not None:
+                    added.append(entry_id)
+            if added:
+                self._keys.extend((key, *entry_id) for entry_id in added for key in self._word_keys(entry_id[0]))
+                self._keys.sort()
+            return len(added)
+
+    def add_label(self, info: dict) -> None:
+        """Index the brand and generic names of one label in the get_drug_info shape."""
+        names = info.get("name", {})
+        for kind in KINDS:
+            for name in names.get(kind, []):
+                if name and name != "N/A":
+                    self.add(name, kind)
+
+    def search(self, q: str, limit: int = 10) -> list[dict]:
+        """
+        Names starting with q (best) or with a word starting with q, ranked by exact
+        match, whole-name prefix, label count (how common the drug is), brand before
+        generic, then length.
+        """
+        prefix = normalize_name(q)
+        if not prefix:
+            return []
+        best: dict[tuple[str, str], int] = {}
+        with self._lock:
+            i = bisect.bisect_left(self._keys, (prefix,))
+            end = min(len(self._keys), i + _MAX_SCAN)
+            while i < end and self._keys[i][0].startswith(prefix):
+                key, norm, kind = self._keys[i]
+                rank = 0 if norm == prefix else 1 if key == norm else 2
+                entry_id = (norm, kind)
+                if rank < best.get(entry_id, 3):
+                    best[entry_id] = rank
+                i += 1
+            ranked = sorted(
+                best,
+                key=lambda e: (best[e], -self._entries[e]["labels"], KINDS.index(e[1]), len(e[0]), e[0]),
+            )
+            return [dict(self._entries[e]) for e in ranked[:limit]]
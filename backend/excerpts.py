@@ -0,0 +1,130 @@
+"""
+Extractive pre-processing of FDA label text for Gemini prompts: label sections are
+split into sentences, scored against the patient's other medications and conditions,
+and the best sentences are packed into a token budget shared by the whole prompt.
+"""
+import re
+
+from drug_names import strip_strength
+from interactions import CLASS_RE, ingredients, severity_of, split_sentences
+
+MAX_SENTENCE_CHARS = 400
+# Sentences scoring below this only get in as an entry's single best sentence
+MIN_SCORE = 1
+
+_BOILERPLATE_RE = re.compile(
+    r"see (?:full )?prescribing information|see (?:section|table)|\(\s*\d+(?:\.\d+)*\s*\)$"
+    r"|^table \d+|^(?:the )?following (?:table|drugs)",
+    re.IGNORECASE,
+)
+# Section numbers and upper-case headings glued to the start of a sentence: "7 DRUG INTERACTIONS 7.1 ..."
+_HEADING_RE = re.compile(r"^(?:\s*\d+(?:\.\d+)*\s+(?:[A-Z][A-Z/&,\-]+\s+)*)+")
+_XREF_RE = re.compile(r"\[\s*see[^\]]*\]|\(\s*\d+(?:\.\d+)*\s*\)", re.IGNORECASE)
+_WORD_RE = re.compile(r"[a-z][a-z-]{3,}")
+_STOPWORDS = frozenset((
+    "with", "from", "that", "this", "have", "were", "been", "when", "than", "other", "patient",
+    "patients", "none", "normal", "follow-up", "results", "annual", "physical", "consult",
+    "continue", "current", "daily", "history", "family", "member", "routine", "review",
+))
+
+
+def approx_tokens(text: str) -> int:
+    """Rough Gemini token count (about four characters per token)."""
+    return len(text) // 4 + 1
+
+
+def relevance_terms(medication_names: list[str], context_texts: list[str]) -> tuple[set[str], set[str]]:
+    """
+    Phrases that make a sentence relevant to this patient: medication names and their
+    ingredients, and the content words of history / family-history text.
+    """
+    meds = set()
+    for name in medication_names:
+        stripped = strip_strength(name)
+        if stripped:
+            meds.add(stripped)
+        meds |= {i for i in ingredients(name) if len(i) >= 4}
+    words = {w for text in context_texts for w in _WORD_RE.findall((text or "").casefold())}
+    return meds, words - _STOPWORDS
+
+
+def shorten(text: str, max_chars: int) -> str:
+    if len(text) <= max_chars:
+        return text
+    if max_chars <= 0:
+        return ""
+    return text[:max_chars].rsplit(" ", 1)[0] + "…"
+
+
+def clean_sentence(sentence: str) -> str:
+    text = _XREF_RE.sub("", _HEADING_RE.sub("", sentence.strip()))
+    text = re.sub(r"\s+([.,;:])", r"\1", " ".join(text.split()))
+    return shorten(text, MAX_SENTENCE_CHARS)
+
+
+def score_sentence(sentence: str, terms: tuple[set[str], set[str]], own: set[str] = frozenset()) -> float:
+    """Other medications named count most, then drug classes, severity cues and condition words."""
+    meds, words = terms
+    folded = f" {sentence.casefold()} "
+    score = 0.0
+    score += 4 * sum(1 for m in meds - own if f" {m} " in folded or f" {m}," in folded or f" {m}." in folded)
+    if CLASS_RE.search(folded):
+        score += 2
+    score += {"SEVERE": 2, "MODERATE": 1, "LOW": 0}[severity_of(sentence)]
+    score += min(3, len(words & set(_WORD_RE.findall(folded))))
+    return score
+
+
+def excerpt_sections(
+    sections: list[list[str]],
+    terms: tuple[set[str], set[str]],
+    budget_tokens: int,
+    labels: list[str] | None = None,
+) -> list[list[str]]:
+    """
+    For each entry's FDA texts, the sentences to put in the prompt, in label order.
+    Every entry first gets its best sentence (its first text when no sentence
+    qualifies), each cut to an equal share of the budget if they don't all fit; the
+    rest of the budget goes to the highest-scoring remaining sentences across all
+    entries. labels (the entries' own drug names) keep a drug from scoring on
+    mentions of itself.
+    """
+    candidates = []  # (score, entry, position, sentence)
+    for e, texts in enumerate(sections):
+        own = ingredients(labels[e]) | {strip_strength(labels[e])} if labels else set()
+        position = 0
+        for text in texts:
+            for raw in split_sentences(text):
+                sentence = clean_sentence(raw)
+                if len(sentence) < 20 or _BOILERPLATE_RE.search(sentence):
+                    continue
+                candidates.append((score_sentence(sentence, terms, own), e, position, sentence))
+                position += 1
+        if not position and texts and clean_sentence(texts[0]):
+            candidates.append((0.0, e, 0, clean_sentence(texts[0])))
+
+    chosen: dict[int, list[tuple[int, str]]] = {e: [] for e in range(len(sections))}
+    best: dict[int, tuple] = {}
+    for c in candidates:
+        if c[1] not in best or c[0] > best[c[1]][0]:
+            best[c[1]] = c
+    firsts = list(best.values())
+    if sum(approx_tokens(c[3]) for c in firsts) > budget_tokens:
+        share_chars = max(4 * (budget_tokens // len(firsts) - 1) - 1, 0)
+        firsts = [(score, e, position, shorten(sentence, share_chars)) for score, e, position, sentence in firsts]
+    used = 0
+    for score, e, position, sentence in firsts:
+        if sentence:
+            chosen[e].append((position, sentence))
+            used += approx_tokens(sentence)
+    taken = {(c[1], c[2]) for c in firsts}
+    for score, e, position, sentence in sorted(candidates, key=lambda c: (-c[0], c[1], c[2])):
+        if score < MIN_SCORE or (e, position) in taken:
+            continue
+        cost = approx_tokens(sentence)
+        if used + cost > budget_tokens:
+            continue
+        chosen[e].append((position, sentence))
+        used += cost
+
+    return [[s for _, s in sorted(chosen[e])] for e in range(len(sections))]
@@ -1,64 +1,134 @@
-import requests
+import asyncio
+import os
+import time
+from datetime import datetime, timedelta, timezone
+from email.utils import parsedate_to_datetime
+from typing import AsyncIterator, Iterator
 
+import httpx
 
-def get_patient_info(patient_id):
-    BASE_URL = "https://www.iehr.ai/fhir/ie/core"
+from cache import SingleFlight, SQLiteCache, TTLCache, stable_hash
+from drug_names import display_name
+from json_stream import StreamedObjectParser
 
-    headers = {
-        "Accept": "application/fhir+json"
-    }
+FHIR_BASE_URL = os.getenv("FHIR_BASE_URL", "https://www.iehr.ai/fhir/ie/core")
+
+# Client tuning: timeouts, connection pool, Bundle page size (_count)
+FHIR_TIMEOUT = float(os.getenv("FHIR_TIMEOUT", "30"))
+FHIR_CONNECT_TIMEOUT = float(os.getenv("FHIR_CONNECT_TIMEOUT", "5"))
+FHIR_MAX_CONNECTIONS = int(os.getenv("FHIR_MAX_CONNECTIONS", "10"))
+FHIR_MAX_KEEPALIVE = int(os.getenv("FHIR_MAX_KEEPALIVE", "5"))
+FHIR_PAGE_SIZE = int(os.getenv("FHIR_PAGE_SIZE", "200"))
+FHIR_MAX_PAGES = int(os.getenv("FHIR_MAX_PAGES", "1000"))
+
+# Incremental sync cache: re-check a patient at most every FHIR_SYNC_MIN_INTERVAL seconds,
+# asking only for resources changed since the last sync (minus FHIR_SYNC_OVERLAP for clock skew).
+# Set FHIR_CACHE_DB to a SQLite path to keep synced charts across restarts.
+FHIR_SYNC_MIN_INTERVAL = float(os.getenv("FHIR_SYNC_MIN_INTERVAL", "60"))
+FHIR_SYNC_OVERLAP = float(os.getenv("FHIR_SYNC_OVERLAP", "60"))
+FHIR_CACHE_SIZE = int(os.getenv("FHIR_CACHE_SIZE", "2048"))
+FHIR_CACHE_TTL = float(os.getenv("FHIR_CACHE_TTL", "604800"))
+FHIR_CACHE_DB = os.getenv("FHIR_CACHE_DB", "")
+
+HEADERS = {"Accept": "application/fhir+json"}
+
+_client: httpx.AsyncClient | None = None
+_sync_client: httpx.Client | None = None
+patient_cache = TTLCache(FHIR_CACHE_SIZE, FHIR_CACHE_TTL)
+_patient_db = SQLiteCache(FHIR_CACHE_DB, "fhir_patients") if FHIR_CACHE_DB else None
+_sync_flight = SingleFlight()
+# Key prefix for entries rebuilt from a stored dashboard record (PatientRecordBuilder.from_record)
+_RECORD_KEY = "_record"
+# "source" of the records to_dict writes
+RECORD_SOURCE = "fhir"
 
-    url = f"{BASE_URL}/Patient/{patient_id}/$everything"
-    resp = requests.get(url, headers=headers)
 
-    if resp.status_code != 200:
-        raise Exception(f"Failed to retrieve data: {resp.status_code}\n{resp.text}")
+class PatientRecordBuilder:
+    """
+    Maps FHIR resources onto the dashboard's patient shape one resource at a time,
+    so a Bundle (or NDJSON export) never has to be held in memory as a whole.
+    Entries are keyed by resource id, so adding a newer version of a resource
+    replaces the older one.
+    """
 
-    bundle = resp.json()
+    def __init__(self, patient_id: str):
+        self.patient_id = patient_id
+        self.name = None
+        self.patientid = None
+        self.patientDOB = None
+        self.patient_history: dict[str, list[str]] = {}
+        self.current_medications: dict[str, list[str]] = {}
+        self.family_history: dict[str, dict] = {}  # {relation, conditions} per FamilyMemberHistory resource
+        self._anonymous = 0
+        # (resource type, entry value) -> placeholder keys of entries rebuilt by from_record
+        self._placeholders: dict[tuple[str, str], list[str]] = {}
 
-    name = None
-    patientid = None
-    patientDOB = None
-    patient_history = []
-    current_medications = []
-    family_history = []  # list of {relation, conditions} per FamilyMemberHistory resource
+    def _key(self, resource: dict) -> str:
+        rid = resource.get("id")
+        if rid:
+            return rid
+        self._anonymous += 1
+        return f"_anon{self._anonymous}"
 
-    for entry in bundle.get("entry", []):
-        resource = entry.get("resource")
-        if not resource:
-            continue
+    def _tables(self) -> dict[str, dict]:
+        return {
+            "Condition": self.patient_history,
+            "MedicationStatement": self.current_medications,
+            "FamilyMemberHistory": self.family_history,
+        }
 
+    def _index_placeholders(self) -> None:
+        self._placeholders = {}
+        for rtype, table in self._tables().items():
+            for key, value in table.items():
+                if key.startswith(_RECORD_KEY):
+                    self._placeholders.setdefault((rtype, stable_hash(value)), []).append(key)
+
+    def _put(self, rtype: str, table: dict, resource: dict, value) -> None:
+        # A resource re-sent for an entry rebuilt by from_record replaces its placeholder
+        if self._placeholders:
+            keys = self._placeholders.get((rtype, stable_hash(value)))
+            if keys:
+                table.pop(keys.pop(), None)
+        table[self._key(resource)] = value
+
+    def add(self, resource: dict) -> None:
         rtype = resource.get("resourceType")
 
         if rtype == "Patient":
-            patientid = resource.get("id")
-            patientDOB = resource.get("birthDate")
+            self.patientid = resource.get("id")
+            self.patientDOB = resource.get("birthDate")
             if "name" in resource:
                 name_data = resource["name"][0]
                 given = " ".join(name_data.get("given", []))
                 family = name_data.get("family", "")
-                name = f"{given} {family}".strip()
+                self.name = f"{given} {family}".strip()
 
         elif rtype == "Condition":
             code = resource.get("code", {})
             text_val = code.get("text")
             if text_val:
-                patient_history.append(text_val)
+                self._put(rtype, self.patient_history, resource, [text_val])
             else:
-                for coding in code.get("coding", []):
-                    if coding.get("display"):
-                        patient_history.append(coding["display"])
+                self._put(
+                    rtype,
+                    self.patient_history,
+                    resource,
+                    [coding["display"] for coding in code.get("coding", []) if coding.get("display")],
+                )
 
         elif rtype == "MedicationStatement":
             med = resource.get("medicationCodeableConcept")
-            if med:
+            if resource.get("status") == "entered-in-error" and resource.get("id"):
+                self.current_medications.pop(resource["id"], None)
+            elif med:
                 med_text = med.get("text")
                 if med_text:
-                    current_medications.append(med_text)
+                    self._put(rtype, self.current_medications, resource, [med_text])
                 else:
                     for coding in med.get("coding", []):
                         if coding.get("display"):
-                            current_medications.append(coding["display"])
+                            self._put(rtype, self.current_medications, resource, [coding["display"]])
                             break
 
         elif rtype == "FamilyMemberHistory":
@@ -75,27 +145,431 @@ def get_patient_info(patient_id):
                         if coding.get("display"):
                             conds.append(coding["display"])
                             break
-            family_history.append({"relation": relation, "conditions": conds})
-
-    # Format for dashboard: same shape as sample_data / frontend expectations
-    history_formatted = [
-        {"type": "diagnostic", "label": c, "date": "", "items": []}
-        for c in patient_history
-    ]
-    meds_formatted = [
-        {"type": "diagnostic", "label": m, "conflicts": [], "items": [], "description": None}
-        for m in current_medications
-    ]
-    family_formatted = [
-        {"type": "diagnostic", "label": f["relation"], "relation": f["relation"], "conditions": f["conditions"]}
-        for f in family_history
-    ]
+            self._put(rtype, self.family_history, resource, {"relation": relation, "conditions": conds})
+
+    def remove(self, resource_type: str, resource_id: str) -> None:
+        """Forget a resource (e.g. deleted upstream)."""
+        table = self._tables().get(resource_type)
+        if table is not None:
+            table.pop(resource_id, None)
+
+    def to_state(self) -> dict:
+        """JSON-serializable snapshot, so a cached chart can take deltas later."""
+        return {
+            "patient_id": self.patient_id,
+            "name": self.name,
+            "patientid": self.patientid,
+            "patientDOB": self.patientDOB,
+            "patient_history": self.patient_history,
+            "current_medications": self.current_medications,
+            "family_history": self.family_history,
+            "anonymous": self._anonymous,
+        }
+
+    @classmethod
+    def from_state(cls, state: dict) -> "PatientRecordBuilder":
+        builder = cls(state["patient_id"])
+        builder.name = state.get("name")
+        builder.patientid = state.get("patientid")
+        builder.patientDOB = state.get("patientDOB")
+        builder.patient_history = dict(state.get("patient_history", {}))
+        builder.current_medications = dict(state.get("current_medications", {}))
+        builder.family_history = dict(state.get("family_history", {}))
+        builder._anonymous = state.get("anonymous", 0)
+        builder._index_placeholders()
+        return builder
+
+    @classmethod
+    def from_record(cls, patient_id: str, record: dict) -> "PatientRecordBuilder | None":
+        """
+        Rebuild from a dashboard record written by to_dict when no sync state is left for
+        it; None for any other record (sample_data, hand-entered), whose shape to_dict
+        can't reproduce. Resource ids aren't in the record, so entries get placeholder
+        keys that the same resource arriving again replaces.
+        """
+        if record.get("source") != RECORD_SOURCE:
+            return None
+        builder = cls(patient_id)
+        builder.name = record.get("name") if record.get("name") != "Unknown" else None
+        builder.patientid = record.get("patientid")
+        builder.patientDOB = record.get("patientDOB") or None
+        for i, h in enumerate(record.get("patient_history", [])):
+            builder.patient_history[f"{_RECORD_KEY}{i}"] = [h["label"]]
+        for i, m in enumerate(record.get("current_medications", [])):
+            # to_dict keeps the full medication text as the only item when it shortened the label
+            builder.current_medications[f"{_RECORD_KEY}{i}"] = [(m.get("items") or [m["label"]])[0]]
+        for i, f in enumerate(record.get("family_history", [])):
+            builder.family_history[f"{_RECORD_KEY}{i}"] = {
+                "relation": f.get("relation", f.get("label")),
+                "conditions": list(f.get("conditions", [])),
+            }
+        builder._index_placeholders()
+        return builder
+
+    def to_dict(self) -> dict:
+        # Format for dashboard: same shape as sample_data / frontend expectations
+        history_formatted = [
+            {"type": "diagnostic", "label": c, "date": "", "items": []}
+            for labels in self.patient_history.values()
+            for c in labels
+        ]
+        # Free text like "Lisinopril 10 MG Oral Tablet" becomes label "Lisinopril" with the
+        # full text as an item, matching sample_data and keying label lookups on the drug
+        meds_formatted = []
+        for labels in self.current_medications.values():
+            for m in labels:
+                drug = display_name(m)
+                meds_formatted.append({
+                    "type": "diagnostic",
+                    "label": drug,
+                    "conflicts": [],
+                    "items": [m] if drug != m.strip() else [],
+                    "description": None,
+                })
+        family_formatted = [
+            {"type": "diagnostic", "label": f["relation"], "relation": f["relation"], "conditions": f["conditions"]}
+            for f in self.family_history.values()
+        ]
+
+        return {
+            "name": self.name or "Unknown",
+            "patientid": self.patientid or self.patient_id,
+            "patientDOB": self.patientDOB or "",
+            "patient_history": history_formatted,
+            "current_medications": meds_formatted,
+            "family_history": family_formatted,
+            # Lets from_record tell charts it can rebuild from records of other origins
+            "source": RECORD_SOURCE,
+        }
+
+
+def _next_link(links: list[dict] | None) -> str | None:
+    for link in links or []:
+        if link.get("relation") == "next" and link.get("url"):
+            return link["url"]
+    return None
+
+
+def _everything_url(patient_id: str) -> str:
+    return f"{FHIR_BASE_URL}/Patient/{patient_id}/$everything"
+
+
+class _BundlePager:
+    """
+    Page and entry parsing shared by the async and blocking Bundle iterators; they
+    only do the I/O. Stopping at FHIR_MAX_PAGES with a next link left is reported,
+    and recorded as response_info["truncated"] so a sync doesn't treat it as complete.
+    """
+
+    def __init__(self, url: str, params: dict | None, headers: dict | None, response_info: dict | None):
+        self.url, self.params, self.headers = url, params, headers
+        self.info = response_info if response_info is not None else {}
+        self.pages = 0
+        self._parser: StreamedObjectParser | None = None
+        self._next_url: str | None = None
+
+    def request(self) -> dict | None:
+        """Arguments for the next page's GET, or None when the Bundle is done."""
+        if not self.url:
+            return None
+        if self.pages >= FHIR_MAX_PAGES:
+            self.info["truncated"] = True
+            print(f"FHIR Bundle truncated at FHIR_MAX_PAGES={FHIR_MAX_PAGES}; next page not fetched: {self.url}")
+            return None
+        return {"params": self.params, "headers": self.headers if self.pages == 0 else None}
+
+    def open(self, resp: httpx.Response) -> bool:
+        """Record the first response's status/ETag/Date; False when there is nothing to parse (304)."""
+        if self.pages == 0:
+            self.info.update(status=resp.status_code, etag=resp.headers.get("etag"), date=resp.headers.get("date"))
+            if resp.status_code == 304:
+                return False
+        self._parser, self._next_url = StreamedObjectParser("entry"), None
+        return True
+
+    def fail(self, resp: httpx.Response, body: bytes) -> None:
+        raise Exception(f"Failed to retrieve data: {resp.status_code}\n{body.decode(errors='replace')}")
+
+    def feed(self, text: str) -> list[dict]:
+        resources = []
+        for kind, value in self._parser.feed(text):
+            if kind == "item":
+                resource = value.get("resource")
+                if resource:
+                    resources.append(resource)
+            elif value[0] == "link":
+                self._next_url = _next_link(value[1])
+        return resources
+
+    def close(self) -> None:
+        for kind, value in self._parser.close():
+            if kind == "field" and value[0] == "link":
+                self._next_url = _next_link(value[1])
+        self.url, self.params = self._next_url, None
+        self.pages += 1
+
+
+# ---- async client -------------------------------------------------------------
+
+
+def get_client() -> httpx.AsyncClient:
+    """Shared pooled FHIR client, created on first use (closed by the app lifespan)."""
+    global _client
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(
+            headers=HEADERS,
+            timeout=httpx.Timeout(FHIR_TIMEOUT, connect=FHIR_CONNECT_TIMEOUT),
+            limits=httpx.Limits(
+                max_connections=FHIR_MAX_CONNECTIONS,
+                max_keepalive_connections=FHIR_MAX_KEEPALIVE,
+            ),
+            follow_redirects=True,
+        )
+    return _client
+
+
+async def close_client() -> None:
+    global _client
+    client, _client = _client, None
+    if client is not None and not client.is_closed:
+        await client.aclose()
+
+
+async def iter_bundle_resources(
+    url: str,
+    params: dict | None = None,
+    headers: dict | None = None,
+    response_info: dict | None = None,
+) -> AsyncIterator[dict]:
+    """
+    Yield every resource of a searchset Bundle, following link[rel=next] page by page.
+    Each page is parsed incrementally as bytes arrive. `headers` go on the first request
+    only (e.g. If-None-Match); status, ETag and Date of that first response are written
+    into `response_info` when given, plus truncated=True if FHIR_MAX_PAGES cut it short.
+    A 304 yields nothing.
+    """
+    client = get_client()
+    pager = _BundlePager(url, params, headers, response_info)
+    while (request := pager.request()) is not None:
+        async with client.stream("GET", pager.url, **request) as resp:
+            if not pager.open(resp):
+                return
+            if resp.status_code != 200:
+                pager.fail(resp, await resp.aread())
+            async for text in resp.aiter_text():
+                for resource in pager.feed(text):
+                    yield resource
+            pager.close()
+
+
+async def get_patient_info_async(patient_id: str, incremental: bool = True) -> dict:
+    """
+    Async get_patient_info: pooled client, timeouts, every page of $everything.
+    With incremental=True the chart comes from patient_cache and is refreshed with
+    conditional _since requests (see sync_patient); incremental=False always re-pulls it.
+    """
+    if incremental:
+        entry = await sync_patient(patient_id)
+        return PatientRecordBuilder.from_state(entry["state"]).to_dict()
+    builder = PatientRecordBuilder(patient_id)
+    async for resource in iter_bundle_resources(_everything_url(patient_id), {"_count": FHIR_PAGE_SIZE}):
+        builder.add(resource)
+    return builder.to_dict()
 
+
+# ---- incremental sync ---------------------------------------------------------
+
+
+async def sync_patient(patient_id: str, force: bool = False) -> dict:
+    """
+    Bring the cached chart for patient_id up to date and return its cache entry:
+    {"state", "last_sync", "etag", "version_id", "checked_at"}.
+
+    First sync pulls everything. Later syncs (at most every FHIR_SYNC_MIN_INTERVAL
+    seconds unless force=True) send If-None-Match with the stored ETag and
+    _since=<last sync>, then merge the changed resources into the stored lists by id.
+    $everything doesn't report deletions; those need a full re-pull (invalidate_patient).
+    """
+    entry = await _load_entry(patient_id)
+    if entry is not None and not force and time.time() - entry["checked_at"] < FHIR_SYNC_MIN_INTERVAL:
+        return entry
+    return await _sync_flight.do(patient_id, lambda: _sync(patient_id, entry))
+
+
+async def invalidate_patient(patient_id: str) -> None:
+    patient_cache.pop(patient_id)
+    if _patient_db is not None:
+        await asyncio.to_thread(_patient_db.delete, patient_id)
+
+
+async def _sync(patient_id: str, entry: dict | None) -> dict:
+    builder, params, headers = _sync_request(patient_id, entry)
+    info: dict = {}
+    requested_at = datetime.now(timezone.utc)
+    version_id = entry.get("version_id") if entry else None
+    async for resource in iter_bundle_resources(_everything_url(patient_id), params, headers, info):
+        version_id = _add_synced(builder, resource, version_id)
+    entry = _synced_entry(entry, builder, info, requested_at, version_id)
+    await _save_entry(patient_id, entry)
+    return entry
+
+
+def _sync_request(patient_id: str, entry: dict | None) -> tuple[PatientRecordBuilder, dict, dict]:
+    """Builder to merge into, plus query params and headers, for syncing from entry."""
+    params = {"_count": FHIR_PAGE_SIZE}
+    headers = {}
+    if entry is None:
+        return PatientRecordBuilder(patient_id), params, headers
+    if entry.get("last_sync"):
+        params["_since"] = entry["last_sync"]
+    if entry.get("etag"):
+        headers["If-None-Match"] = entry["etag"]
+    return PatientRecordBuilder.from_state(entry["state"]), params, headers
+
+
+def _add_synced(builder: PatientRecordBuilder, resource: dict, version_id: str | None) -> str | None:
+    builder.add(resource)
+    if resource.get("resourceType") == "Patient":
+        return resource.get("meta", {}).get("versionId", version_id)
+    return version_id
+
+
+def _synced_entry(
+    entry: dict | None, builder: PatientRecordBuilder, info: dict, requested_at: datetime, version_id: str | None
+) -> dict:
+    if info.get("status") == 304 and entry is not None:
+        return {**entry, "checked_at": time.time()}
+    if info.get("truncated"):
+        # Keep what was merged, but ask for the same changes again next time
+        last_sync, etag = (entry.get("last_sync"), entry.get("etag")) if entry else (None, None)
+    else:
+        last_sync, etag = _since_value(info.get("date"), requested_at), info.get("etag")
     return {
-        "name": name or "Unknown",
-        "patientid": patientid or patient_id,
-        "patientDOB": patientDOB or "",
-        "patient_history": history_formatted,
-        "current_medications": meds_formatted,
-        "family_history": family_formatted,
-    }
\ No newline at end of file
+        "state": builder.to_state(),
+        "last_sync": last_sync,
+        "etag": etag,
+        "version_id": version_id,
+        "checked_at": time.time(),
+    }
+
+
+def _since_value(date_header: str | None, fallback: datetime) -> str:
+    """Server time of the sync (Date header when present) minus the overlap, as a FHIR instant."""
+    server_time = fallback
+    if date_header:
+        try:
+            server_time = parsedate_to_datetime(date_header)
+        except (TypeError, ValueError):
+            pass
+    since = server_time.astimezone(timezone.utc) - timedelta(seconds=FHIR_SYNC_OVERLAP)
+    return since.strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+async def load_entries(patient_ids: list[str]) -> dict[str, dict]:
+    """Cached sync entries for several patients at once (bulk ingestion)."""
+    out = {}
+    missing = []
+    for pid in patient_ids:
+        entry = patient_cache.get(pid)
+        if entry is None:
+            missing.append(pid)
+        else:
+            out[pid] = entry
+    if missing and _patient_db is not None:
+        out.update(await asyncio.to_thread(_patient_db.get_many, missing))
+    return out
+
+
+async def save_entries(entries: dict[str, dict]) -> None:
+    for pid, entry in entries.items():
+        patient_cache.set(pid, entry)
+    if _patient_db is not None:
+        await asyncio.to_thread(_patient_db.set_many, entries, FHIR_CACHE_TTL)
+
+
+async def _load_entry(patient_id: str) -> dict | None:
+    entry = patient_cache.get(patient_id)
+    if entry is None and _patient_db is not None:
+        entry = await asyncio.to_thread(_patient_db.get, patient_id)
+        if entry is not None:
+            patient_cache.set(patient_id, entry)
+    return entry
+
+
+async def _save_entry(patient_id: str, entry: dict) -> None:
+    patient_cache.set(patient_id, entry)
+    if _patient_db is not None:
+        await asyncio.to_thread(_patient_db.set, patient_id, entry, FHIR_CACHE_TTL)
+
+
+# ---- sync client --------------------------------------------------------------
+
+
+def _get_sync_client() -> httpx.Client:
+    global _sync_client
+    if _sync_client is None or _sync_client.is_closed:
+        _sync_client = httpx.Client(
+            headers=HEADERS,
+            timeout=httpx.Timeout(FHIR_TIMEOUT, connect=FHIR_CONNECT_TIMEOUT),
+            follow_redirects=True,
+        )
+    return _sync_client
+
+
+def _iter_bundle_resources_sync(
+    url: str,
+    params: dict | None = None,
+    headers: dict | None = None,
+    response_info: dict | None = None,
+) -> Iterator[dict]:
+    """Blocking iter_bundle_resources."""
+    client = _get_sync_client()
+    pager = _BundlePager(url, params, headers, response_info)
+    while (request := pager.request()) is not None:
+        with client.stream("GET", pager.url, **request) as resp:
+            if not pager.open(resp):
+                return
+            if resp.status_code != 200:
+                pager.fail(resp, resp.read())
+            for text in resp.iter_text():
+                yield from pager.feed(text)
+            pager.close()
+
+
+def get_patient_info(patient_id, incremental: bool = True):
+    """
+    Pull a patient's $everything Bundle (all pages) and map it to the dashboard shape.
+    Blocking; async callers should use get_patient_info_async. With incremental=True it
+    reads and refreshes the same sync cache as sync_patient (see sync_patient_blocking).
+    """
+    if incremental:
+        entry = sync_patient_blocking(patient_id)
+        return PatientRecordBuilder.from_state(entry["state"]).to_dict()
+    builder = PatientRecordBuilder(patient_id)
+    for resource in _iter_bundle_resources_sync(_everything_url(patient_id), {"_count": FHIR_PAGE_SIZE}):
+        builder.add(resource)
+    return builder.to_dict()
+
+
+def sync_patient_blocking(patient_id: str, force: bool = False) -> dict:
+    """
+    sync_patient for blocking callers: same cache entries, same conditional _since
+    requests, over the sync client. It can't join sync_patient's in-flight syncs (those
+    live on the event loop), so a concurrent async sync of the same patient may repeat it.
+    """
+    entry = patient_cache.get(patient_id)
+    if entry is None and _patient_db is not None:
+        entry = _patient_db.get(patient_id)
+    if entry is not None and not force and time.time() - entry["checked_at"] < FHIR_SYNC_MIN_INTERVAL:
+        return entry
+    builder, params, headers = _sync_request(patient_id, entry)
+    info: dict = {}
+    requested_at = datetime.now(timezone.utc)
+    version_id = entry.get("version_id") if entry else None
+    for resource in _iter_bundle_resources_sync(_everything_url(patient_id), params, headers, info):
+        version_id = _add_synced(builder, resource, version_id)
+    entry = _synced_entry(entry, builder, info, requested_at, version_id)
+    patient_cache.set(patient_id, entry)
+    if _patient_db is not None:
+        _patient_db.set(patient_id, entry, FHIR_CACHE_TTL)
+    return entry
@@ -0,0 +1,206 @@
+"""
+FHIR Bulk Data ($export) ingestion: kick off an export, poll until it completes,
+then stream each NDJSON file resource by resource into the patient repository
+(patients.repository) and the FHIR sync cache used by fhir.get_patient_info_async.
+
+    python fhir_bulk.py                      # system-level export from FHIR_BASE_URL
+    python fhir_bulk.py --group GROUP_ID     # Group/{id}/$export
+    python fhir_bulk.py --since 2026-01-01T00:00:00Z
+
+Resources are applied in batches of FHIR_BULK_BATCH_SIZE, so memory stays flat no
+matter how large the files are. Run it with PATIENT_STORE=sqlite (and FHIR_CACHE_DB)
+so the records land on disk where the API process can read them.
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from typing import AsyncIterator
+
+import httpx
+
+import fhir
+from patients import repository
+
+EXPORT_TYPES = ("Patient", "Condition", "MedicationStatement", "FamilyMemberHistory")
+
+FHIR_BULK_BATCH_SIZE = int(os.getenv("FHIR_BULK_BATCH_SIZE", "1000"))
+FHIR_BULK_POLL_INTERVAL = float(os.getenv("FHIR_BULK_POLL_INTERVAL", "5"))
+FHIR_BULK_TIMEOUT = float(os.getenv("FHIR_BULK_TIMEOUT", "3600"))
+FHIR_BEARER_TOKEN = os.getenv("FHIR_BEARER_TOKEN", "")
+
+
+def _headers() -> dict:
+    headers = {"Accept": "application/fhir+json"}
+    if FHIR_BEARER_TOKEN:
+        headers["Authorization"] = f"Bearer {FHIR_BEARER_TOKEN}"
+    return headers
+
+
+async def start_export(
+    client: httpx.AsyncClient,
+    base_url: str,
+    group_id: str | None = None,
+    since: str | None = None,
+) -> str:
+    """Start an async $export; returns the status (Content-Location) URL to poll."""
+    url = f"{base_url}/Group/{group_id}/$export" if group_id else f"{base_url}/$export"
+    params = {"_type": ",".join(EXPORT_TYPES), "_outputFormat": "application/fhir+ndjson"}
+    if since:
+        params["_since"] = since
+    resp = await client.get(url, params=params, headers={**_headers(), "Prefer": "respond-async"})
+    if resp.status_code != 202 or "content-location" not in resp.headers:
+        raise Exception(f"Failed to start export: {resp.status_code}\n{resp.text}")
+    return resp.headers["content-location"]
+
+
+async def wait_for_export(client: httpx.AsyncClient, status_url: str) -> dict:
+    """Poll the status URL (honouring Retry-After) until the export manifest is ready."""
+    deadline = time.monotonic() + FHIR_BULK_TIMEOUT
+    while True:
+        resp = await client.get(status_url, headers=_headers())
+        if resp.status_code == 200:
+            return resp.json()
+        if resp.status_code != 202:
+            raise Exception(f"Export failed: {resp.status_code}\n{resp.text}")
+        if time.monotonic() > deadline:
+            raise TimeoutError(f"Export not finished after {FHIR_BULK_TIMEOUT:.0f}s: {status_url}")
+        try:
+            delay = float(resp.headers.get("retry-after", FHIR_BULK_POLL_INTERVAL))
+        except ValueError:
+            delay = FHIR_BULK_POLL_INTERVAL
+        await asyncio.sleep(max(0.0, delay))
+
+
+async def iter_ndjson(client: httpx.AsyncClient, url: str) -> AsyncIterator[dict]:
+    """Stream one NDJSON output file, yielding a resource per line."""
+    headers = {**_headers(), "Accept": "application/fhir+ndjson"}
+    async with client.stream("GET", url, headers=headers) as resp:
+        if resp.status_code != 200:
+            body = (await resp.aread()).decode(errors="replace")
+            raise Exception(f"Failed to download {url}: {resp.status_code}\n{body}")
+        async for line in resp.aiter_lines():
+            line = line.strip()
+            if line:
+                yield json.loads(line)
+
+
+def _patient_ref(resource: dict) -> str | None:
+    if resource.get("resourceType") == "Patient":
+        return resource.get("id")
+    ref = (resource.get("subject") or resource.get("patient") or {}).get("reference", "")
+    if ref.startswith("Patient/"):
+        return ref.split("/", 1)[1].split("/", 1)[0]
+    return None
+
+
+async def apply_batch(resources: list[dict], synced_at: str | None) -> int:
+    """Merge a batch of resources into the patient stores, one load/save per patient."""
+    by_patient: dict[str, list[dict]] = {}
+    for resource in resources:
+        pid = _patient_ref(resource)
+        if pid:
+            by_patient.setdefault(pid, []).append(resource)
+    if not by_patient:
+        return 0
+
+    existing = await fhir.load_entries(list(by_patient))
+    # Sync entries age out (and, without FHIR_CACHE_DB, are evicted from memory), so a patient
+    # written by an earlier batch may have none: merge into its stored record instead. Records
+    # that didn't come from FHIR can't be rebuilt; the export's chart replaces them.
+    missing = [pid for pid in by_patient if pid not in existing]
+    records = await asyncio.to_thread(lambda: {pid: repository.get(pid) for pid in missing})
+    updated = {}
+    for pid, patient_resources in by_patient.items():
+        entry = existing.get(pid)
+        if entry:
+            builder = fhir.PatientRecordBuilder.from_state(entry["state"])
+        else:
+            record = records.get(pid)
+            builder = (record and fhir.PatientRecordBuilder.from_record(pid, record)) or fhir.PatientRecordBuilder(pid)
+        version_id = entry.get("version_id") if entry else None
+        for resource in patient_resources:
+            builder.add(resource)
+            if resource.get("resourceType") == "Patient":
+                version_id = resource.get("meta", {}).get("versionId", version_id)
+        updated[pid] = {
+            "state": builder.to_state(),
+            # The export's transactionTime lets the next incremental sync use _since
+            "last_sync": synced_at or (entry or {}).get("last_sync"),
+            "etag": None,
+            "version_id": version_id,
+            "checked_at": time.time(),
+        }
+    await fhir.save_entries(updated)
+    await asyncio.to_thread(
+        repository.upsert_many,
+        {pid: fhir.PatientRecordBuilder.from_state(e["state"]).to_dict() for pid, e in updated.items()},
+    )
+    return len(updated)
+
+
+async def ingest_manifest(client: httpx.AsyncClient, manifest: dict, log=print) -> dict:
+    """Stream every output file of a completed export into the store. Returns counts per type."""
+    synced_at = manifest.get("transactionTime")
+    outputs = sorted(
+        manifest.get("output", []),
+        key=lambda o: EXPORT_TYPES.index(o["type"]) if o.get("type") in EXPORT_TYPES else len(EXPORT_TYPES),
+    )
+    counts: dict[str, int] = {}
+    for output in outputs:
+        rtype = output.get("type")
+        if rtype not in EXPORT_TYPES:
+            continue
+        batch: list[dict] = []
+        async for resource in iter_ndjson(client, output["url"]):
+            batch.append(resource)
+            counts[rtype] = counts.get(rtype, 0) + 1
+            if len(batch) >= FHIR_BULK_BATCH_SIZE:
+                await apply_batch(batch, synced_at)
+                batch = []
+        await apply_batch(batch, synced_at)
+        log(f"{output['url']}: {counts.get(rtype, 0)} {rtype}")
+    for error in manifest.get("error", []):
+        log(f"export reported errors: {error.get('url')}")
+    return counts
+
+
+async def run_export(
+    base_url: str = fhir.FHIR_BASE_URL,
+    group_id: str | None = None,
+    since: str | None = None,
+    client: httpx.AsyncClient | None = None,
+    log=print,
+) -> dict:
+    """Start, await and ingest a Bulk Data export end to end."""
+    own_client = client is None
+    if own_client:
+        client = httpx.AsyncClient(
+            timeout=httpx.Timeout(fhir.FHIR_TIMEOUT, connect=fhir.FHIR_CONNECT_TIMEOUT),
+            follow_redirects=True,
+        )
+    try:
+        status_url = await start_export(client, base_url, group_id, since)
+        log(f"export started: {status_url}")
+        manifest = await wait_for_export(client, status_url)
+        return await ingest_manifest(client, manifest, log)
+    finally:
+        if own_client:
+            await client.aclose()
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Ingest a FHIR Bulk Data $export into the patient store.")
+    parser.add_argument("--base-url", default=fhir.FHIR_BASE_URL)
+    parser.add_argument("--group", help="export a Group instead of the whole system")
+    parser.add_argument("--since", help="only resources changed since this FHIR instant")
+    args = parser.parse_args(argv)
+    counts = asyncio.run(run_export(args.base_url, args.group, args.since))
+    print(f"Ingested {sum(counts.values())} resources: {counts}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,7 +1,14 @@
+import asyncio
 import os
 import json
 import re
+import time
+from typing import AsyncIterator
 import google.generativeai as genai
+from budget import spend
+from excerpts import approx_tokens
+from resilience import CircuitOpenError, Upstream
+from cache import TTLCache, SQLiteCache, stable_hash
 
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY", "")
 
@@ -9,19 +16,144 @@ GEMINI_API_KEY = os.getenv("GEMINI_API_KEY", "")
 if GEMINI_API_KEY:
     genai.configure(api_key=GEMINI_API_KEY)
 
+# Returned in place of generated text; callers shouldn't cache these as answers
+NO_API_KEY_TEXT = "Gemini API key not configured. Set GEMINI_API_KEY in environment."
+NO_SUMMARY_TEXT = "No summary generated."
+PLACEHOLDER_TEXTS = (NO_API_KEY_TEXT, NO_SUMMARY_TEXT)
+
 # Use Gemini 2.5 Flash Lite (override with GEMINI_MODEL env). If you get model errors, set GEMINI_MODEL=gemini-2.5-flash
 GEMINI_MODEL = os.getenv("GEMINI_MODEL", "gemini-2.5-flash-lite")
 
+# Contraindication filtering cache, keyed by a hash of the normalized inputs + model.
+# Set GEMINI_CACHE_DB to a SQLite path to keep results across restarts.
+GEMINI_CACHE_TTL = float(os.getenv("GEMINI_CACHE_TTL", "21600"))
+GEMINI_CACHE_SIZE = int(os.getenv("GEMINI_CACHE_SIZE", "1024"))
+GEMINI_CACHE_DB = os.getenv("GEMINI_CACHE_DB", "")
+
+# Max concurrent Gemini calls from the async path (others queue; wait time is in gemini_limiter.stats())
+GEMINI_MAX_CONCURRENCY = int(os.getenv("GEMINI_MAX_CONCURRENCY", "8"))
+
+# Batched contraindication analysis: prompt size (approx. tokens) and patients per call,
+# and how many more rounds patients with an unusable answer get
+GEMINI_BATCH_TOKENS = int(os.getenv("GEMINI_BATCH_TOKENS", "8000"))
+GEMINI_BATCH_MAX_PATIENTS = int(os.getenv("GEMINI_BATCH_MAX_PATIENTS", "20"))
+GEMINI_BATCH_RETRIES = int(os.getenv("GEMINI_BATCH_RETRIES", "1"))
+
+# Retries on 429/5xx and a circuit breaker for the async calls (GEMINI_RETRIES,
+# GEMINI_BREAKER_FAILURES, GEMINI_BREAKER_RESET, ...; see resilience.py). Generation is
+# billed per call, so hedging stays off unless GEMINI_HEDGE is set.
+gemini_upstream = Upstream("gemini", "GEMINI", backoff_base=0.5, backoff_max=8.0)
+
+_models: dict[float | None, "genai.GenerativeModel"] = {}
+contraindication_cache = TTLCache(GEMINI_CACHE_SIZE, GEMINI_CACHE_TTL)
+batch_counts = {"calls": 0, "patients": 0, "retried": 0, "unfiltered": 0}
+_contraindication_db = SQLiteCache(GEMINI_CACHE_DB, "contraindications") if GEMINI_CACHE_DB else None
+
 
 def generate_text(prompt: str, temperature: float = 0.7) -> str:
     if not GEMINI_API_KEY:
-        return "Gemini API key not configured. Set GEMINI_API_KEY in environment."
-    model = genai.GenerativeModel(
-        GEMINI_MODEL,
-        generation_config={"temperature": temperature},
-    )
-    response = model.generate_content(prompt)
-    return response.text or "No summary generated."
+        return NO_API_KEY_TEXT
+    response = _model(temperature).generate_content(prompt)
+    return response.text or NO_SUMMARY_TEXT
+
+
+async def generate_text_async(prompt: str, temperature: float = 0.7) -> str:
+    """generate_text on the SDK's async transport, behind gemini_limiter and gemini_upstream."""
+    if not GEMINI_API_KEY:
+        return NO_API_KEY_TEXT
+    response = await _generate_async(prompt, temperature)
+    return response.text or NO_SUMMARY_TEXT
+
+
+async def stream_text_async(prompt: str, temperature: float = 0.7) -> AsyncIterator[str]:
+    """
+    Yield text chunks as Gemini streams them; holds a gemini_limiter slot until done.
+    Only opening the stream is retried, before any text has been yielded.
+    """
+    if not GEMINI_API_KEY:
+        yield NO_API_KEY_TEXT
+        return
+    async with gemini_limiter:
+        response = await gemini_upstream.call(
+            lambda: _model(temperature).generate_content_async(prompt, stream=True)
+        )
+        async for chunk in response:
+            text = chunk.text
+            if text:
+                yield text
+
+
+async def _generate_async(prompt: str, temperature: float | None = None):
+    """One generate_content_async call; every attempt takes its own gemini_limiter slot."""
+
+    async def once():
+        async with gemini_limiter:
+            return await _model(temperature).generate_content_async(prompt)
+
+    return await gemini_upstream.call(once)
+
+
+def _model(temperature: float | None = None) -> "genai.GenerativeModel":
+    """GenerativeModel instances are reused, one per temperature (None = model default)."""
+    model = _models.get(temperature)
+    if model is None:
+        config = {"temperature": temperature} if temperature is not None else None
+        model = _models[temperature] = genai.GenerativeModel(GEMINI_MODEL, generation_config=config)
+    return model
+
+
+class GeminiLimiter:
+    """
+    Caps concurrent Gemini calls from the async path and records how long callers
+    queue for a slot. Rebinds its semaphore if used from a new event loop.
+    """
+
+    def __init__(self, limit: int):
+        self.limit = max(1, limit)
+        self._semaphore: asyncio.Semaphore | None = None
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self.in_flight = 0
+        self.waiting = 0
+        self.calls = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    async def __aenter__(self):
+        # Background callers wait on their rate budget before taking a slot
+        await spend("gemini")
+        loop = asyncio.get_running_loop()
+        if self._semaphore is None or self._loop is not loop:
+            self._semaphore, self._loop = asyncio.Semaphore(self.limit), loop
+        started = time.monotonic()
+        self.waiting += 1
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self.waiting -= 1
+        waited = time.monotonic() - started
+        self.calls += 1
+        self.wait_total += waited
+        self.wait_max = max(self.wait_max, waited)
+        self.in_flight += 1
+        return self
+
+    async def __aexit__(self, *exc):
+        self.in_flight -= 1
+        self._semaphore.release()
+        return False
+
+    def stats(self) -> dict:
+        return {
+            "limit": self.limit,
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "calls": self.calls,
+            "queue_wait_avg_ms": round(1000 * self.wait_total / self.calls, 2) if self.calls else 0.0,
+            "queue_wait_max_ms": round(1000 * self.wait_max, 2),
+        }
+
+
+gemini_limiter = GeminiLimiter(GEMINI_MAX_CONCURRENCY)
 
 
 def filter_contraindications(
@@ -73,23 +205,256 @@ Reply with a JSON array of indices to KEEP, e.g. [0, 2, 4]. If none are relevant
     return raw_results
 
 
+def contraindications_cache_key(
+    patient_name: str,
+    medication_names: list[str],
+    history_text: str,
+    family_text: str,
+    raw_results: list[dict],
+) -> str:
+    def norm(text: str) -> str:
+        return " ".join((text or "").split())
+
+    return stable_hash(
+        GEMINI_MODEL,
+        norm(patient_name),
+        [norm(m).casefold() for m in medication_names],
+        norm(history_text),
+        norm(family_text),
+        raw_results,
+    )
+
+
+def invalidate_patient_contraindications(patient_id: str) -> int:
+    """Drop every cached contraindication result for this patient. Returns entries dropped."""
+    dropped = contraindication_cache.invalidate_tag(patient_id)
+    if _contraindication_db is not None:
+        dropped = max(dropped, _contraindication_db.invalidate_tag(patient_id))
+    return dropped
+
+
 def filter_and_summarize_contraindications(
     patient_name: str,
     medication_names: list[str],
     history_text: str,
     family_text: str,
     raw_results: list[dict],
+    patient_id: str | None = None,
 ) -> list[dict]:
     """
     Single Gemini call: filter to relevant entries and summarize for display.
     Faster than filter_contraindications + summarize_contraindications_for_display (one round-trip instead of two).
+    Successful results are cached by contraindications_cache_key; patient_id tags the
+    entry so invalidate_patient_contraindications can drop it.
     """
     if not raw_results or not GEMINI_API_KEY:
         return raw_results
 
+    key = contraindications_cache_key(patient_name, medication_names, history_text, family_text, raw_results)
+    cached = _cached_contraindications(key, patient_id)
+    if cached is not None:
+        return cached
+
+    prompt = _contraindications_prompt(patient_name, medication_names, history_text, family_text, raw_results)
+    try:
+        response = _model().generate_content(prompt)
+        out = _parse_contraindications(response.text, raw_results)
+    except Exception:
+        out = None
+    if out is None:
+        return raw_results
+    _store_contraindications(key, out, patient_id)
+    return out
+
+
+async def filter_and_summarize_contraindications_async(
+    patient_name: str,
+    medication_names: list[str],
+    history_text: str,
+    family_text: str,
+    raw_results: list[dict],
+    patient_id: str | None = None,
+) -> list[dict]:
+    """filter_and_summarize_contraindications on the async transport, behind gemini_limiter."""
+    if not raw_results or not GEMINI_API_KEY:
+        return raw_results
+
+    key = contraindications_cache_key(patient_name, medication_names, history_text, family_text, raw_results)
+    cached = contraindication_cache.get(key)
+    if cached is None and _contraindication_db is not None:
+        cached = await asyncio.to_thread(_cached_contraindications, key, patient_id)
+    if cached is not None:
+        return cached
+
+    prompt = _contraindications_prompt(patient_name, medication_names, history_text, family_text, raw_results)
+    try:
+        response = await _generate_async(prompt)
+        out = _parse_contraindications(response.text, raw_results)
+    except Exception:
+        out = None
+    if out is None:
+        return raw_results
+    if _contraindication_db is not None:
+        await asyncio.to_thread(_store_contraindications, key, out, patient_id)
+    else:
+        _store_contraindications(key, out, patient_id)
+    return out
+
+
+def _cached_contraindications(key: str, patient_id: str | None) -> list[dict] | None:
+    cached = contraindication_cache.get(key)
+    if cached is None and _contraindication_db is not None:
+        cached = _contraindication_db.get(key)
+        if cached is not None:
+            contraindication_cache.set(key, cached, tag=patient_id)
+    return cached
+
+
+def _store_contraindications(key: str, out: list[dict], patient_id: str | None) -> None:
+    contraindication_cache.set(key, out, tag=patient_id)
+    if _contraindication_db is not None:
+        _contraindication_db.set(key, out, GEMINI_CACHE_TTL, tag=patient_id)
+
+
+async def filter_and_summarize_contraindications_batch_async(requests: list[dict]) -> list[list[dict]]:
+    """
+    filter_and_summarize_contraindications_async for many patients, packing several into
+    each Gemini call (up to GEMINI_BATCH_TOKENS of prompt and GEMINI_BATCH_MAX_PATIENTS).
+    Each request is a dict of that function's arguments (patient_name, medication_names,
+    history_text, family_text, raw_results, optional patient_id). Returns one list per
+    request, in order. Each patient's part of a reply is validated on its own; only the
+    patients whose part was missing or unusable go into the next, smaller round, and
+    after GEMINI_BATCH_RETRIES rounds the rest get their raw_results (the same object).
+    """
+    out: list[list[dict] | None] = [None] * len(requests)
+    keys: dict[int, str] = {}
+    for i, req in enumerate(requests):
+        if not req["raw_results"] or not GEMINI_API_KEY:
+            out[i] = req["raw_results"]
+            continue
+        keys[i] = contraindications_cache_key(
+            req["patient_name"], req["medication_names"], req["history_text"], req["family_text"], req["raw_results"]
+        )
+        cached = contraindication_cache.get(keys[i])
+        if cached is None and _contraindication_db is not None:
+            cached = await asyncio.to_thread(_cached_contraindications, keys[i], req.get("patient_id"))
+        if cached is not None:
+            out[i] = cached
+
+    pending = [i for i in keys if out[i] is None]
+    for attempt in range(1 + max(0, GEMINI_BATCH_RETRIES)):
+        if not pending:
+            break
+        if attempt:
+            batch_counts["retried"] += len(pending)
+        batches = _pack_batches([(i, _batch_block(requests[i])) for i in pending])
+        replies = await asyncio.gather(
+            *(_run_batch([requests[i] for i in batch]) for batch in batches), return_exceptions=True
+        )
+        failed, circuit_open = [], False
+        for batch, reply in zip(batches, replies):
+            # No point retrying into an open breaker
+            circuit_open = circuit_open or isinstance(reply, CircuitOpenError)
+            for i, result in zip(batch, reply if isinstance(reply, list) else [None] * len(batch)):
+                if result is None:
+                    failed.append(i)
+                    continue
+                out[i] = result
+                if _contraindication_db is not None:
+                    await asyncio.to_thread(_store_contraindications, keys[i], result, requests[i].get("patient_id"))
+                else:
+                    _store_contraindications(keys[i], result, requests[i].get("patient_id"))
+        pending = [] if circuit_open else failed
+
+    for i, req in enumerate(requests):
+        if out[i] is None:
+            batch_counts["unfiltered"] += 1
+            out[i] = req["raw_results"]
+    return out
+
+
+def _batch_block(req: dict) -> str:
+    """One patient's section of a batch prompt (its label is added by _batch_prompt)."""
+    entries_text = "\n".join(
+        f"[{i}] {r.get('label', '')} (severity: {r.get('severity', '')}): " + " ".join(r.get("items") or [])
+        for i, r in enumerate(req["raw_results"])
+    )
+    return f"""Patient: {req["patient_name"]}
+Medications: {", ".join(req["medication_names"])}
+Clinical history:
+{req["history_text"] or "(none)"}
+Family history:
+{req["family_text"] or "(none)"}
+FDA entries (index, drug, severity, excerpt):
+{entries_text}"""
+
+
+def _pack_batches(blocks: list[tuple[int, str]]) -> list[list[int]]:
+    """Group request indices so each batch stays within the token and patient limits (one patient always fits)."""
+    batches: list[list[int]] = []
+    current: list[int] = []
+    used = 0
+    for i, block in blocks:
+        cost = approx_tokens(block)
+        if current and (used + cost > GEMINI_BATCH_TOKENS or len(current) >= GEMINI_BATCH_MAX_PATIENTS):
+            batches.append(current)
+            current, used = [], 0
+        current.append(i)
+        used += cost
+    if current:
+        batches.append(current)
+    return batches
+
+
+async def _run_batch(batch: list[dict]) -> list[list[dict] | None]:
+    """One Gemini call for a batch; per patient, its filtered entries or None if its answer is unusable."""
+    batch_counts["calls"] += 1
+    batch_counts["patients"] += len(batch)
+    response = await _generate_async(_batch_prompt(batch))
+    try:
+        parsed = _reply_json(response.text)
+    except Exception:
+        return [None] * len(batch)
+    if not isinstance(parsed, dict):
+        return [None] * len(batch)
+    results = []
+    for n, req in enumerate(batch, 1):
+        answer = parsed.get(f"P{n}")
+        # Indices outside this patient's entries mean the answer got mixed up with another patient's
+        if not isinstance(answer, dict) or any(
+            not k.isdigit() or int(k) >= len(req["raw_results"]) for k in answer
+        ):
+            results.append(None)
+        else:
+            results.append(_map_contraindications(answer, req["raw_results"]))
+    return results
+
+
+def _batch_prompt(batch: list[dict]) -> str:
+    patients_text = "\n\n".join(f"=== P{n} ===\n{_batch_block(req)}" for n, req in enumerate(batch, 1))
+    example = '{"P1": {"0": {"severity": "MODERATE", "items": ["Monitor for myopathy with gemfibrozil."]}}, "P2": {"1": {"severity": "LOW", "items": ["No significant drug interaction risks for this patient."]}}}'
+    return f"""You are a clinical assistant. Below are {len(batch)} separate patients, labelled P1 to P{len(batch)}. Treat each patient independently: never use one patient's medications or history for another. For each patient, (1) consider which of THAT patient's FDA entries are RELEVANT (e.g. omit drug-drug when they don't take both; omit irrelevant conditions), and (2) for each RELEVANT entry output a short doctor-friendly summary and severity.
+
+{patients_text}
+
+Rules:
+- Include only entries that are relevant for that patient. Skip irrelevant ones.
+- For each included entry output "severity" (SEVERE, MODERATE, or LOW) and "items" (1–4 short bullet points in plain language; no FDA boilerplate). If a patient has no relevant risks: one entry with severity "LOW", items: ["No significant drug interaction risks for this patient."]
+- Reply with ONE JSON object keyed by patient label ("P1", "P2", ...). Each value is an object keyed by that patient's original entry index as string, whose value is {{"severity": "...", "items": ["..."]}}. Include every patient label. Example: {example}
+No other text."""
+
+
+def _contraindications_prompt(
+    patient_name: str,
+    medication_names: list[str],
+    history_text: str,
+    family_text: str,
+    raw_results: list[dict],
+) -> str:
+
     entries_text = "\n".join(
         f"[{i}] {r.get('label', '')} (severity: {r.get('severity', '')}): "
-        + "; ".join((r.get("items") or [])[:3])
+        + " ".join(r.get("items") or [])
         for i, r in enumerate(raw_results)
     )
 
@@ -113,41 +478,52 @@ Rules:
 - Reply with a JSON object keyed by the original index as string (e.g. "0", "2"). Each value: {{"severity": "...", "items": ["..."]}}. Only include indices you keep. Example: {{"0": {{"severity": "LOW", "items": ["No significant drug interaction risks for this patient."]}}, "1": {{"severity": "MODERATE", "items": ["Avoid grapefruit juice.", "Monitor for myopathy with gemfibrozil."]}}}}
 No other text."""
 
+    return prompt
+
+
+def _parse_contraindications(text: str | None, raw_results: list[dict]) -> list[dict] | None:
+    """Map Gemini's JSON reply back onto raw_results; None if the reply is unusable."""
     try:
-        model = genai.GenerativeModel(GEMINI_MODEL)
-        response = model.generate_content(prompt)
-        text = (response.text or "").strip()
-        if "```" in text:
-            for part in text.split("```"):
-                part = part.strip()
-                if part.startswith("json"):
-                    part = part[4:].strip()
-                if part.startswith("{"):
-                    text = part
-                    break
-        parsed = json.loads(text)
-        valid_severities = {"SEVERE", "MODERATE", "LOW"}
-        if isinstance(parsed, dict):
-            out = []
-            for i, r in enumerate(raw_results):
-                key = str(i)
-                if key not in parsed:
-                    continue
-                entry = parsed[key]
-                if not isinstance(entry, dict):
-                    continue
-                new_severity = (entry.get("severity") or "LOW").upper()
-                if new_severity not in valid_severities:
-                    new_severity = "LOW"
-                new_items = entry.get("items")
-                if not isinstance(new_items, list) or not all(isinstance(s, str) for s in new_items):
-                    new_items = ["No significant drug interaction risks for this patient."]
-                out.append({**r, "severity": new_severity, "items": new_items})
-            if out:
-                return out
+        return _map_contraindications(_reply_json(text), raw_results)
     except (json.JSONDecodeError, Exception):
-        pass
-    return raw_results
+        return None
+
+
+def _reply_json(text: str | None):
+    """The JSON object in a Gemini reply, with any ``` fences stripped."""
+    text = (text or "").strip()
+    if "```" in text:
+        for part in text.split("```"):
+            part = part.strip()
+            if part.startswith("json"):
+                part = part[4:].strip()
+            if part.startswith("{"):
+                text = part
+                break
+    return json.loads(text)
+
+
+def _map_contraindications(parsed, raw_results: list[dict]) -> list[dict] | None:
+    """{"index": {"severity", "items"}} onto raw_results; None unless it keeps at least one entry."""
+    valid_severities = {"SEVERE", "MODERATE", "LOW"}
+    if not isinstance(parsed, dict):
+        return None
+    out = []
+    for i, r in enumerate(raw_results):
+        key = str(i)
+        if key not in parsed:
+            continue
+        entry = parsed[key]
+        if not isinstance(entry, dict):
+            continue
+        new_severity = (entry.get("severity") or "LOW").upper()
+        if new_severity not in valid_severities:
+            new_severity = "LOW"
+        new_items = entry.get("items")
+        if not isinstance(new_items, list) or not all(isinstance(s, str) for s in new_items):
+            new_items = ["No significant drug interaction risks for this patient."]
+        out.append({**r, "severity": new_severity, "items": new_items})
+    return out or None
 
 
 def summarize_contraindications_for_display(
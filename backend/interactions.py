@@ -0,0 +1,280 @@
+"""
+Local drug-interaction matrix: each label's drug_interactions section parsed into
+ingredient-pair -> (severity, excerpt) rows, so get_contraindications can settle the
+obvious cases without Gemini.
+
+    python interactions.py build --index fda_label_index.db --db fda_interactions.db
+
+Point FDA_INTERACTIONS_DB at the result. Drugs missing from the table are scanned on
+the fly from their label text, which needs no network either.
+"""
+import argparse
+import os
+import re
+import sqlite3
+import sys
+import threading
+from typing import Iterable
+
+from drug_names import ingredient_key, strip_strength
+
+SEVERITIES = ("SEVERE", "MODERATE", "LOW")
+EXCERPT_CHARS = 300
+
+_SEVERE_RE = re.compile(
+    r"contraindicated|do not (?:use|co-?administer|administer|take)|avoid (?:use|concomitant|co-?administration)"
+    r"|fatal|life-threatening|death"
+)
+_MODERATE_RE = re.compile(
+    r"monitor|caution|adjust|reduce the dose|dose reduction|dosage reduction"
+    r"|increased? (?:the )?(?:risk|exposure|plasma|concentrations?|levels?)|decreased? (?:the )?(?:effect|exposure|plasma|concentrations?|levels?)"
+)
+# References to whole drug classes, which need clinical knowledge to match against a medication list
+CLASS_RE = re.compile(
+    r"\b(?:inhibitors?|inducers?|substrates|nsaids?|diuretics|anticoagulants|antiplatelets?|antacids"
+    r"|blockers|antagonists|agonists|antidepressants|antibiotics|antifungals|antiarrhythmics|statins"
+    r"|ssris|snris|maois|opioids|benzodiazepines|corticosteroids|other drugs|agents)\b"
+)
+_SENTENCE_RE = re.compile(r"(?<=[.;])\s+(?=[A-Z0-9(])")
+_WORD_RE = re.compile(r"[a-z0-9][a-z0-9-]*")
+_MAX_TERM_WORDS = 4
+
+
+def severity_of(sentence: str) -> str:
+    text = sentence.casefold()
+    if _SEVERE_RE.search(text):
+        return "SEVERE"
+    if _MODERATE_RE.search(text):
+        return "MODERATE"
+    return "LOW"
+
+
+def split_sentences(text: str) -> list[str]:
+    return [s for s in _SENTENCE_RE.split(text or "") if s.strip()]
+
+
+def ingredients(name: str) -> set[str]:
+    """Single ingredients of a drug name or canonical key ("acetaminophen / codeine")."""
+    return set(ingredient_key(name).split(" / "))
+
+
+def mentions(texts: Iterable[str], terms: dict[str, set[str]]) -> tuple[dict[str, tuple[str, str]], bool]:
+    """
+    Scan interaction text for the given terms (lower-case phrase -> ingredients).
+    Returns {ingredient: (severity, excerpt)} keeping the most severe sentence per
+    ingredient, and whether any drug class is referenced.
+    """
+    found: dict[str, tuple[str, str]] = {}
+    mentions_classes = False
+    for text in texts:
+        for sentence in split_sentences(text):
+            folded = sentence.casefold()
+            if not mentions_classes and CLASS_RE.search(folded):
+                mentions_classes = True
+            words = _WORD_RE.findall(folded)
+            hit: set[str] = set()
+            for n in range(1, _MAX_TERM_WORDS + 1):
+                for i in range(len(words) - n + 1):
+                    hit |= terms.get(" ".join(words[i:i + n]), set())
+            if not hit:
+                continue
+            severity = severity_of(sentence)
+            for ingredient in hit:
+                current = found.get(ingredient)
+                if current is None or SEVERITIES.index(severity) < SEVERITIES.index(current[0]):
+                    found[ingredient] = (severity, sentence.strip()[:EXCERPT_CHARS])
+    return found, mentions_classes
+
+
+def mentions_words(texts: Iterable[str], words: set[str]) -> bool:
+    """Whether any of the (lower-case) words occurs in the text."""
+    if not words:
+        return False
+    return any(w in words for text in texts for w in _WORD_RE.findall(text.casefold()))
+
+
+class InteractionTable:
+    """
+    SQLite table of (drug ingredient, other ingredient) -> severity and excerpt, plus
+    a per-ingredient profile saying whether its labels reference drug classes.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.executescript(
+                """
+                CREATE TABLE IF NOT EXISTS interaction_pairs (
+                    drug TEXT NOT NULL,
+                    other TEXT NOT NULL,
+                    severity TEXT NOT NULL,
+                    excerpt TEXT NOT NULL,
+                    PRIMARY KEY (drug, other)
+                );
+                CREATE TABLE IF NOT EXISTS interaction_profiles (
+                    drug TEXT PRIMARY KEY,
+                    labels INTEGER NOT NULL,
+                    mentions_classes INTEGER NOT NULL
+                );
+                """
+            )
+
+    def profile(self, drug: str) -> dict | None:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT labels, mentions_classes FROM interaction_profiles WHERE drug = ?", (drug,)
+            ).fetchone()
+        return {"labels": row[0], "mentions_classes": bool(row[1])} if row else None
+
+    def pairs(self, drugs: Iterable[str], others: Iterable[str]) -> dict[str, tuple[str, str]]:
+        """{other: (severity, excerpt)} over every (drug, other) row, most severe first."""
+        drugs, others = list(drugs), list(others)
+        if not drugs or not others:
+            return {}
+        with self._lock:
+            rows = self._conn.execute(
+                f"""SELECT other, severity, excerpt FROM interaction_pairs
+                    WHERE drug IN ({",".join("?" * len(drugs))}) AND other IN ({",".join("?" * len(others))})""",
+                (*drugs, *others),
+            ).fetchall()
+        found: dict[str, tuple[str, str]] = {}
+        for other, severity, excerpt in rows:
+            if other not in found or SEVERITIES.index(severity) < SEVERITIES.index(found[other][0]):
+                found[other] = (severity, excerpt)
+        return found
+
+    def replace_all(self, pairs: dict[tuple[str, str], tuple[str, str]], profiles: dict[str, list[int]]) -> None:
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM interaction_pairs")
+            self._conn.execute("DELETE FROM interaction_profiles")
+            self._conn.executemany(
+                "INSERT INTO interaction_pairs (drug, other, severity, excerpt) VALUES (?, ?, ?, ?)",
+                [(drug, other, sev, excerpt) for (drug, other), (sev, excerpt) in pairs.items()],
+            )
+            self._conn.executemany(
+                "INSERT INTO interaction_profiles (drug, labels, mentions_classes) VALUES (?, ?, ?)",
+                [(drug, labels, classes) for drug, (labels, classes) in profiles.items()],
+            )
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+def build(table: InteractionTable, index, log=print) -> int:
+    """Parse every indexed label's drug_interactions section into table. Returns pairs written."""
+    terms: dict[str, set[str]] = {}
+    for field, name in index.names(("generic_name", "substance_name")):
+        for ingredient in ingredients(name):
+            if len(ingredient) >= 4:
+                terms.setdefault(ingredient, set()).add(ingredient)
+    log(f"{len(terms)} ingredient terms")
+
+    pairs: dict[tuple[str, str], tuple[str, str]] = {}
+    profiles: dict[str, list[int]] = {}
+    for n, record in enumerate(index.records(), 1):
+        generic = (record.get("openfda", {}).get("generic_name") or [None])[0]
+        section = record.get("drug_interactions")
+        if not generic or not section:
+            continue
+        drugs = ingredients(generic)
+        found, mentions_classes = mentions(section, terms)
+        for drug in drugs:
+            profile = profiles.setdefault(drug, [0, 0])
+            profile[0] += 1
+            profile[1] |= int(mentions_classes)
+            for other, (severity, excerpt) in found.items():
+                if other in drugs:
+                    continue
+                current = pairs.get((drug, other))
+                if current is None or SEVERITIES.index(severity) < SEVERITIES.index(current[0]):
+                    pairs[(drug, other)] = (severity, excerpt)
+        if n % 10000 == 0:
+            log(f"{n} labels, {len(pairs)} pairs")
+    table.replace_all(pairs, profiles)
+    return len(pairs)
+
+
+def triage(
+    drug_key: str,
+    info: dict,
+    other_meds: list[tuple[str, str]],
+    table: InteractionTable | None = None,
+    context_words: set[str] = frozenset(),
+) -> tuple[str, list[tuple[str, str, str]]]:
+    """
+    Decide one medication's FDA entry without an LLM where the answer is obvious.
+    drug_key is its canonical name; other_meds are (display name, canonical name)
+    of everything else the patient takes; context_words are the content words of the
+    patient's history (excerpts.relevance_terms).
+
+    - ("keep", hits) when its interaction text names another drug the patient takes;
+      hits are (other drug, severity, excerpt), most severe first
+    - ("drop", []) when it names none of them and references no drug classes or
+      history words
+    - ("ask", []) otherwise (no interaction section, no other medications, or class
+      references / conditions, alcohol or food to weigh against the history)
+    """
+    if "error" in info:
+        return "keep", []
+    section = [t for t in info.get("interactions", ["N/A"]) if t and t != "N/A"]
+    if not section:
+        return "ask", []
+    own = ingredients(drug_key)
+    others: dict[str, str] = {}
+    for display, key in other_meds:
+        for ingredient in ingredients(key) - own:
+            others.setdefault(ingredient, display)
+    if not others:
+        return "ask", []
+
+    profiles = [table.profile(d) for d in own] if table is not None else [None]
+    if all(p is not None for p in profiles):
+        found = table.pairs(own, others)
+        mentions_classes = any(p["mentions_classes"] for p in profiles)
+    else:
+        terms: dict[str, set[str]] = {}
+        for ingredient, display in others.items():
+            for term in (ingredient, strip_strength(display)):
+                terms.setdefault(term, set()).add(ingredient)
+        found, mentions_classes = mentions(section, terms)
+
+    if found:
+        hits = sorted(
+            ((others[o], sev, excerpt) for o, (sev, excerpt) in found.items() if o in others),
+            key=lambda h: SEVERITIES.index(h[1]),
+        )
+        return "keep", hits
+    if mentions_classes or mentions_words(section, context_words):
+        return "ask", []
+    return "drop", []
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Build the local drug-interaction matrix from the label index.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p_build = sub.add_parser("build", help="parse drug_interactions sections of every indexed label")
+    p_build.add_argument("--index", default=os.getenv("FDA_LABEL_INDEX", "fda_label_index.db"))
+    p_build.add_argument("--db", default=os.getenv("FDA_INTERACTIONS_DB", "fda_interactions.db"))
+    args = parser.parse_args(argv)
+
+    from label_index import LabelIndex
+
+    if not os.path.isfile(args.index):
+        parser.error(f"label index not found: {args.index} (build it with label_index.py ingest)")
+    index = LabelIndex(args.index)
+    table = InteractionTable(args.db)
+    try:
+        written = build(table, index)
+    finally:
+        table.close()
+        index.close()
+    print(f"Wrote {written} interaction pairs to {args.db}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,203 @@
+"""
+Background jobs for slow LLM work (AI summaries, contraindication analysis), so HTTP
+requests only submit and poll instead of holding a connection open while Gemini runs.
+
+A job's id is derived from its kind and inputs, so submitting the same work again joins
+the existing job instead of queueing a duplicate. Jobs wait in a bounded in-process queue
+drained by JOBS_WORKERS workers; when the queue is full, submit raises JobQueueFull.
+Job records (status, then result or error) live in a TTLCache, or in SQLite when
+JOB_STORE_DB is set so finished results survive restarts and are visible to every
+worker process sharing the file.
+"""
+import asyncio
+import os
+import time
+from typing import Any, Awaitable, Callable
+
+from cache import SQLiteCache, TTLCache, stable_hash
+
+JOBS_WORKERS = int(os.getenv("JOBS_WORKERS", "4"))
+JOBS_QUEUE_SIZE = int(os.getenv("JOBS_QUEUE_SIZE", "100"))
+# Finished job records are kept this long (seconds)
+JOB_RESULT_TTL = float(os.getenv("JOB_RESULT_TTL", "3600"))
+JOB_STORE_SIZE = int(os.getenv("JOB_STORE_SIZE", "1024"))
+JOB_STORE_DB = os.getenv("JOB_STORE_DB", "")
+
+QUEUED, RUNNING, DONE, FAILED = "queued", "running", "done", "failed"
+
+
+class JobQueueFull(Exception):
+    """The job queue is at JOBS_QUEUE_SIZE; the caller should retry later."""
+
+
+def job_id(kind: str, params: Any) -> str:
+    return stable_hash("job", kind, params)[:32]
+
+
+def open_store(path: str = JOB_STORE_DB) -> TTLCache | SQLiteCache:
+    """SQLiteCache at path when set, else an in-memory TTLCache."""
+    return SQLiteCache(path, "jobs") if path else TTLCache(JOB_STORE_SIZE, JOB_RESULT_TTL)
+
+
+class JobQueue:
+    """
+    Bounded queue of jobs run by a fixed pool of workers. handlers maps a job kind to
+    an async function taking the job's params and returning a JSON-serializable result.
+    """
+
+    def __init__(
+        self,
+        handlers: dict[str, Callable[[dict], Awaitable[Any]]],
+        store: TTLCache | SQLiteCache | None = None,
+        workers: int = JOBS_WORKERS,
+        maxsize: int = JOBS_QUEUE_SIZE,
+    ):
+        self.handlers = handlers
+        self.store = store if store is not None else open_store()
+        self.workers = max(1, workers)
+        self.maxsize = max(1, maxsize)
+        self._queue: asyncio.Queue | None = None
+        self._tasks: list[asyncio.Task] = []
+        # Jobs not finished yet, with an event set when they finish
+        self._active: dict[str, tuple[dict, asyncio.Event]] = {}
+        self.counts = {"submitted": 0, "deduplicated": 0, "rejected": 0, "done": 0, "failed": 0}
+
+    @property
+    def running(self) -> bool:
+        return bool(self._tasks)
+
+    def start(self) -> None:
+        if self._tasks:
+            return
+        self._queue = asyncio.Queue(self.maxsize)
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self) -> None:
+        tasks, self._tasks = self._tasks, []
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._queue = None
+        # Record unfinished jobs as failed so a shared store doesn't report them running forever
+        active, self._active = self._active, {}
+        for job, done in active.values():
+            job.update(status=FAILED, error="Server shut down before the job finished", finished_at=time.time())
+            done.set()
+            try:
+                await self._save(job)
+            except Exception:
+                pass
+
+    # ---- store -------------------------------------------------------------------
+
+    async def _load(self, jid: str) -> dict | None:
+        if isinstance(self.store, SQLiteCache):
+            return await asyncio.to_thread(self.store.get, jid)
+        return self.store.get(jid)
+
+    async def _save(self, job: dict) -> None:
+        if isinstance(self.store, SQLiteCache):
+            await asyncio.to_thread(self.store.set, job["id"], job, JOB_RESULT_TTL)
+        else:
+            self.store.set(job["id"], job)
+
+    # ---- API -----------------------------------------------------------------------
+
+    async def submit(self, kind: str, params: dict) -> dict:
+        """
+        Queue a job (starting the workers if the app lifespan didn't). Returns the job
+        record; an identical job that is queued or running here, or finished successfully,
+        is returned as is. Raises JobQueueFull when the queue is at capacity.
+        """
+        if kind not in self.handlers:
+            raise ValueError(f"Unknown job kind: {kind!r}")
+        self.start()
+        jid = job_id(kind, params)
+        existing = await self.get(jid)
+        # A stored queued/running record without a local job belongs to a process that died
+        if existing is not None and (jid in self._active or existing["status"] == DONE):
+            self.counts["deduplicated"] += 1
+            return existing
+        job = {
+            "id": jid,
+            "kind": kind,
+            "status": QUEUED,
+            "submitted_at": time.time(),
+            "started_at": None,
+            "finished_at": None,
+            "result": None,
+            "error": None,
+        }
+        try:
+            self._queue.put_nowait((job, params))
+        except asyncio.QueueFull:
+            self.counts["rejected"] += 1
+            raise JobQueueFull(f"Job queue is full ({self.maxsize} waiting); retry shortly")
+        self._active[jid] = (job, asyncio.Event())
+        self.counts["submitted"] += 1
+        await self._save(job)
+        return job
+
+    async def get(self, jid: str) -> dict | None:
+        active = self._active.get(jid)
+        if active is not None:
+            return active[0]
+        return await self._load(jid)
+
+    async def wait(self, jid: str, timeout: float | None = None) -> dict | None:
+        """
+        The job once finished (or as it stands when timeout passes); None if unknown.
+        Jobs run by another process sharing the store are polled every second.
+        """
+        active = self._active.get(jid)
+        if active is not None:
+            try:
+                await asyncio.wait_for(active[1].wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+            return active[0]
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            job = await self._load(jid)
+            if job is None or job["status"] in (DONE, FAILED):
+                return job
+            if deadline is not None and time.monotonic() >= deadline:
+                return job
+            await asyncio.sleep(1 if deadline is None else max(0.0, min(1.0, deadline - time.monotonic())))
+
+    # ---- workers -------------------------------------------------------------------
+
+    async def _worker(self) -> None:
+        while True:
+            job, params = await self._queue.get()
+            job.update(status=RUNNING, started_at=time.time())
+            try:
+                await self._save(job)
+                result = await self.handlers[job["kind"]](params)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                job.update(status=FAILED, error=str(getattr(e, "detail", "") or e) or type(e).__name__)
+                self.counts["failed"] += 1
+            else:
+                job.update(status=DONE, result=result)
+                self.counts["done"] += 1
+            job["finished_at"] = time.time()
+            try:
+                await self._save(job)
+            except Exception as e:
+                job.update(status=FAILED, result=None, error=f"Could not store result: {e}")
+            _, done = self._active.pop(job["id"], (None, None))
+            if done is not None:
+                done.set()
+
+    def stats(self) -> dict:
+        return {
+            "running": self.running,
+            "workers": self.workers,
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "active": len(self._active),
+            "max_queued": self.maxsize,
+            "store": "sqlite" if isinstance(self.store, SQLiteCache) else "memory",
+            **self.counts,
+        }
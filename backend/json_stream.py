@@ -0,0 +1,116 @@
+import json
+from typing import Any, Iterator
+
+_WS = " \t\r\n"
+
+
+class StreamedObjectParser:
+    """
+    Incremental parser for a JSON object with one large array field, e.g. a FHIR
+    Bundle's "entry" or an FDA bulk file's "results". Feed text chunks as they arrive;
+    each element of the streamed array comes back as ("item", element) and every other
+    top-level field as ("field", (key, value)). Memory is bounded by the largest single
+    element rather than the whole document.
+    """
+
+    def __init__(self, stream_key: str):
+        self.stream_key = stream_key
+        self._decoder = json.JSONDecoder()
+        self._buf = ""
+        self._pos = 0
+        self._state = "start"
+        self._key: str | None = None
+        self._closed = False
+
+    def feed(self, text: str) -> list[tuple[str, Any]]:
+        self._buf = self._buf[self._pos:] + text
+        self._pos = 0
+        return list(self._events())
+
+    def close(self) -> list[tuple[str, Any]]:
+        """Signal end of input; raises ValueError if the document is incomplete."""
+        self._closed = True
+        events = list(self._events())
+        if self._state != "done":
+            raise ValueError(f"Truncated JSON document (state={self._state})")
+        return events
+
+    def _skip_ws(self) -> bool:
+        while self._pos < len(self._buf) and self._buf[self._pos] in _WS:
+            self._pos += 1
+        return self._pos < len(self._buf)
+
+    def _decode(self) -> tuple[bool, Any]:
+        """Decode one value at _pos; (False, None) if more input is needed."""
+        try:
+            value, end = self._decoder.raw_decode(self._buf, self._pos)
+        except json.JSONDecodeError:
+            if self._closed:
+                raise ValueError(f"Invalid JSON at offset {self._pos}")
+            return False, None
+        # A number (or literal) is only complete once a delimiter follows it;
+        # "1." or "12" at the end of a chunk may continue in the next one
+        if not self._closed and not isinstance(value, (dict, list, str)):
+            if end == len(self._buf) or self._buf[end] not in _WS + ",]}":
+                return False, None
+        self._pos = end
+        return True, value
+
+    def _expect(self, char: str) -> None:
+        raise ValueError(f"Expected {char!r} at offset {self._pos}, got {self._buf[self._pos]!r}")
+
+    def _events(self) -> Iterator[tuple[str, Any]]:
+        while self._state != "done" and self._skip_ws():
+            char = self._buf[self._pos]
+            if self._state == "start":
+                if char != "{":
+                    self._expect("{")
+                self._pos += 1
+                self._state = "key"
+            elif self._state == "key_or_end":
+                if char not in ",}":
+                    self._expect(", or }")
+                self._pos += 1
+                self._state = "key" if char == "," else "done"
+            elif self._state == "key":
+                if char == "}" and self._key is None:
+                    # empty object
+                    self._pos += 1
+                    self._state = "done"
+                    continue
+                ok, key = self._decode()
+                if not ok:
+                    return
+                if not isinstance(key, str):
+                    self._expect('"')
+                self._key = key
+                self._state = "colon"
+            elif self._state == "colon":
+                if char != ":":
+                    self._expect(":")
+                self._pos += 1
+                self._state = "value"
+            elif self._state == "value":
+                if self._key == self.stream_key and char == "[":
+                    self._pos += 1
+                    self._state = "items"
+                    continue
+                ok, value = self._decode()
+                if not ok:
+                    return
+                yield "field", (self._key, value)
+                self._state = "key_or_end"
+            elif self._state in ("items", "items_sep"):
+                if char == "]":
+                    self._pos += 1
+                    self._state = "key_or_end"
+                    continue
+                if char == "," and self._state == "items_sep":
+                    self._pos += 1
+                    self._state = "items"
+                    continue
+                ok, item = self._decode()
+                if not ok:
+                    return
+                yield "item", item
+                self._state = "items_sep"
@@ -0,0 +1,370 @@
+"""
+Offline OpenFDA drug label index built from the bulk drug/label download.
+
+Build it once (or nightly) and point FDA_LABEL_INDEX at the file:
+
+    python label_index.py ingest drug-label-0001-of-0013.json.zip ... --db labels_index.db
+    python label_index.py ingest --all --db labels_index.db   # download every partition
+
+openfda.get_drug_info / search_drugs answer from the index first and only fall back
+to the live API when a name isn't in it.
+"""
+import argparse
+import io
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+import zipfile
+import zlib
+from typing import Iterable, Iterator
+
+import httpx
+
+from json_stream import StreamedObjectParser
+
+DOWNLOAD_INDEX_URL = "https://api.fda.gov/download.json"
+
+# Only the label sections the backend reads are kept, to keep the index small
+LABEL_FIELDS = (
+    "id",
+    "set_id",
+    "effective_time",
+    "active_ingredient",
+    "purpose",
+    "warnings",
+    "dosage_and_administration",
+    "adverse_reactions",
+    "drug_interactions",
+    "indications_and_usage",
+)
+OPENFDA_FIELDS = ("brand_name", "generic_name", "substance_name", "manufacturer_name", "route", "product_type")
+NAME_FIELDS = ("brand_name", "generic_name", "substance_name")
+
+BATCH_SIZE = 500
+_READ_SIZE = 1 << 20
+
+
+class LabelIndex:
+    """
+    SQLite index of trimmed FDA label records. Names from openfda.brand_name,
+    generic_name and substance_name are indexed exactly (upper-cased);
+    active_ingredient text goes into an FTS5 table for phrase matches.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.executescript(
+                """
+                CREATE TABLE IF NOT EXISTS labels (
+                    id INTEGER PRIMARY KEY,
+                    set_id TEXT UNIQUE NOT NULL,
+                    effective_time TEXT,
+                    has_interactions INTEGER NOT NULL DEFAULT 0,
+                    record BLOB NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS label_names (
+                    name TEXT NOT NULL,
+                    field TEXT NOT NULL,
+                    label_id INTEGER NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS label_names_name ON label_names (name, field);
+                CREATE INDEX IF NOT EXISTS label_names_label ON label_names (label_id);
+                CREATE VIRTUAL TABLE IF NOT EXISTS label_ingredients USING fts5 (active_ingredient);
+                """
+            )
+
+    # ---- reads -------------------------------------------------------------
+
+    def lookup(self, drug_name: str) -> dict | None:
+        """
+        Best label for a brand or generic name, mirroring the live query order:
+        brand_name, generic_name, substance_name, then active_ingredient text.
+        Among several labels, prefer ones with a drug_interactions section, then the newest.
+        """
+        name = _norm(drug_name)
+        if not name:
+            return None
+        with self._lock:
+            for field in NAME_FIELDS:
+                row = self._conn.execute(
+                    """SELECT l.record FROM label_names n JOIN labels l ON l.id = n.label_id
+                       WHERE n.name = ? AND n.field = ?
+                       ORDER BY l.has_interactions DESC, l.effective_time DESC LIMIT 1""",
+                    (name, field),
+                ).fetchone()
+                if row:
+                    return _unpack(row[0])
+            row = self._conn.execute(
+                """SELECT l.record FROM label_ingredients f JOIN labels l ON l.id = f.rowid
+                   WHERE label_ingredients MATCH ?
+                   ORDER BY l.has_interactions DESC, l.effective_time DESC LIMIT 1""",
+                (_fts_phrase(name),),
+            ).fetchone()
+        return _unpack(row[0]) if row else None
+
+    def search_brand(self, q: str, limit: int = 5) -> list[dict]:
+        """Labels whose brand name equals or starts with q, one per brand name."""
+        name = _norm(q)
+        if not name:
+            return []
+        prefix_end = name[:-1] + chr(ord(name[-1]) + 1)
+        with self._lock:
+            rows = self._conn.execute(
+                """SELECT n.name, l.record FROM label_names n JOIN labels l ON l.id = n.label_id
+                   WHERE n.field = 'brand_name' AND n.name >= ? AND n.name < ?
+                   GROUP BY n.name
+                   ORDER BY n.name != ?, length(n.name), n.name
+                   LIMIT ?""",
+                (name, prefix_end, name, limit),
+            ).fetchall()
+        return [_unpack(record) for _, record in rows]
+
+    def names(self, fields: Iterable[str] = NAME_FIELDS) -> Iterator[tuple[str, str]]:
+        """Yield every distinct (field, NAME) pair in the index."""
+        fields = tuple(fields)
+        placeholders = ",".join("?" for _ in fields)
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT DISTINCT field, name FROM label_names WHERE field IN ({placeholders})",
+                fields,
+            ).fetchall()
+        yield from rows
+
+    def name_counts(self, fields: Iterable[str] = NAME_FIELDS) -> Iterator[tuple[str, str, int]]:
+        """Yield (field, NAME, number of labels) for every distinct name, e.g. for typeahead ranking."""
+        fields = tuple(fields)
+        placeholders = ",".join("?" for _ in fields)
+        with self._lock:
+            rows = self._conn.execute(
+                f"""SELECT field, name, COUNT(*) FROM label_names WHERE field IN ({placeholders})
+                    GROUP BY field, name""",
+                fields,
+            ).fetchall()
+        yield from rows
+
+    def brand_generics(self) -> Iterator[tuple[str, str]]:
+        """Yield (BRAND, GENERIC) for each brand name, with its most common generic name."""
+        with self._lock:
+            rows = self._conn.execute(
+                """SELECT b.name, g.name, COUNT(*) AS n
+                   FROM label_names b JOIN label_names g ON g.label_id = b.label_id
+                   WHERE b.field = 'brand_name' AND g.field = 'generic_name'
+                   GROUP BY b.name, g.name
+                   ORDER BY b.name, n DESC"""
+            ).fetchall()
+        last = None
+        for brand, generic, _ in rows:
+            if brand != last:
+                last = brand
+                yield brand, generic
+
+    def records(self) -> Iterator[dict]:
+        """Yield every stored label record (used by offline jobs built on the index)."""
+        last_id = 0
+        while True:
+            with self._lock:
+                rows = self._conn.execute(
+                    "SELECT id, record FROM labels WHERE id > ? ORDER BY id LIMIT ?",
+                    (last_id, BATCH_SIZE),
+                ).fetchall()
+            if not rows:
+                return
+            for label_id, record in rows:
+                yield _unpack(record)
+            last_id = rows[-1][0]
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM labels").fetchone()[0]
+
+    # ---- writes ------------------------------------------------------------
+
+    def add_many(self, results: Iterable[dict]) -> int:
+        """Insert or replace label records, keeping the newest version per set_id."""
+        count = 0
+        with self._lock, self._conn:
+            for result in results:
+                if self._add(result):
+                    count += 1
+        return count
+
+    def _add(self, result: dict) -> bool:
+        record = _trim(result)
+        set_id = record.get("set_id") or record.get("id")
+        if not set_id:
+            return False
+        effective_time = record.get("effective_time") or ""
+        existing = self._conn.execute(
+            "SELECT id, effective_time FROM labels WHERE set_id = ?", (set_id,)
+        ).fetchone()
+        if existing and (existing[1] or "") > effective_time:
+            return False
+        if existing:
+            label_id = existing[0]
+            self._conn.execute("DELETE FROM label_names WHERE label_id = ?", (label_id,))
+            self._conn.execute("DELETE FROM label_ingredients WHERE rowid = ?", (label_id,))
+            self._conn.execute(
+                "UPDATE labels SET effective_time = ?, has_interactions = ?, record = ? WHERE id = ?",
+                (effective_time, int(bool(record.get("drug_interactions"))), _pack(record), label_id),
+            )
+        else:
+            label_id = self._conn.execute(
+                "INSERT INTO labels (set_id, effective_time, has_interactions, record) VALUES (?, ?, ?, ?)",
+                (set_id, effective_time, int(bool(record.get("drug_interactions"))), _pack(record)),
+            ).lastrowid
+        openfda = record.get("openfda", {})
+        names = {
+            (_norm(value), field)
+            for field in NAME_FIELDS
+            for value in openfda.get(field, [])
+            if _norm(value)
+        }
+        self._conn.executemany(
+            "INSERT INTO label_names (name, field, label_id) VALUES (?, ?, ?)",
+            [(name, field, label_id) for name, field in names],
+        )
+        ingredients = " ".join(record.get("active_ingredient", []))
+        if ingredients:
+            self._conn.execute(
+                "INSERT INTO label_ingredients (rowid, active_ingredient) VALUES (?, ?)",
+                (label_id, ingredients),
+            )
+        return True
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+def _norm(name: str) -> str:
+    return " ".join((name or "").split()).upper()
+
+
+def _fts_phrase(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
+
+def _trim(result: dict) -> dict:
+    record = {k: result[k] for k in LABEL_FIELDS if k in result}
+    openfda = result.get("openfda", {})
+    record["openfda"] = {k: openfda[k] for k in OPENFDA_FIELDS if k in openfda}
+    return record
+
+
+def _pack(record: dict) -> bytes:
+    return zlib.compress(json.dumps(record, separators=(",", ":")).encode())
+
+
+def _unpack(blob: bytes) -> dict:
+    return json.loads(zlib.decompress(blob))
+
+
+# ---- bulk file streaming ---------------------------------------------------
+
+
+def iter_results(stream: io.TextIOBase) -> Iterator[dict]:
+    """
+    Stream the objects of the top-level "results" array of an FDA bulk JSON file
+    one at a time, so memory stays bounded by the largest single label.
+    """
+    parser = StreamedObjectParser("results")
+    while True:
+        chunk = stream.read(_READ_SIZE)
+        if not chunk:
+            break
+        for kind, value in parser.feed(chunk):
+            if kind == "item":
+                yield value
+    for kind, value in parser.close():
+        if kind == "item":
+            yield value
+
+
+def _open_bulk_file(path: str) -> Iterator[io.TextIOBase]:
+    if zipfile.is_zipfile(path):
+        with zipfile.ZipFile(path) as zf:
+            for member in zf.namelist():
+                if member.endswith(".json"):
+                    with zf.open(member) as raw:
+                        yield io.TextIOWrapper(raw, encoding="utf-8")
+    else:
+        with open(path, encoding="utf-8") as f:
+            yield f
+
+
+def _download(url: str, client: httpx.Client) -> str:
+    """Stream a partition to a temp file (zip needs random access). Caller deletes it."""
+    fd, path = tempfile.mkstemp(suffix=".json.zip")
+    with os.fdopen(fd, "wb") as out, client.stream("GET", url) as response:
+        response.raise_for_status()
+        for chunk in response.iter_bytes():
+            out.write(chunk)
+    return path
+
+
+def partition_urls(client: httpx.Client) -> list[str]:
+    response = client.get(DOWNLOAD_INDEX_URL)
+    response.raise_for_status()
+    partitions = response.json()["results"]["drug"]["label"]["partitions"]
+    return [p["file"] for p in partitions]
+
+
+def ingest(index: LabelIndex, sources: Iterable[str], log=print) -> int:
+    """Ingest local files or URLs (.json or .json.zip) into index. Returns labels written."""
+    total = 0
+    with httpx.Client(timeout=httpx.Timeout(60.0, connect=10.0), follow_redirects=True) as client:
+        for source in sources:
+            is_url = source.startswith(("http://", "https://"))
+            path = _download(source, client) if is_url else source
+            try:
+                written = 0
+                for stream in _open_bulk_file(path):
+                    batch = []
+                    for result in iter_results(stream):
+                        batch.append(result)
+                        if len(batch) >= BATCH_SIZE:
+                            written += index.add_many(batch)
+                            batch = []
+                    written += index.add_many(batch)
+                total += written
+                log(f"{source}: {written} labels")
+            finally:
+                if is_url:
+                    os.remove(path)
+    return total
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Build the offline OpenFDA drug label index.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p_ingest = sub.add_parser("ingest", help="stream bulk drug/label files into the index")
+    p_ingest.add_argument("sources", nargs="*", help="local .json/.json.zip files or URLs")
+    p_ingest.add_argument("--all", action="store_true", help="download every drug/label partition")
+    p_ingest.add_argument("--db", default=os.getenv("FDA_LABEL_INDEX", "fda_label_index.db"))
+    args = parser.parse_args(argv)
+
+    sources = list(args.sources)
+    if args.all:
+        with httpx.Client(timeout=30.0) as client:
+            sources += partition_urls(client)
+    if not sources:
+        parser.error("give at least one source or --all")
+
+    index = LabelIndex(args.db)
+    try:
+        total = ingest(index, sources)
+    finally:
+        index.close()
+    print(f"Indexed {total} labels into {args.db}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
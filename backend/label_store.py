@@ -0,0 +1,72 @@
+import json
+import sqlite3
+import threading
+import time
+
+
+class LabelStore:
+    """
+    SQLite-backed store of normalized FDA label dicts (the get_drug_info shape),
+    keyed by normalized drug name, with the fetch time and upstream ETag.
+    Calls are blocking; async callers should go through asyncio.to_thread.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                """CREATE TABLE IF NOT EXISTS drug_labels (
+                    key TEXT PRIMARY KEY,
+                    info TEXT NOT NULL,
+                    fetched_at REAL NOT NULL,
+                    etag TEXT
+                )"""
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS drug_labels_fetched_at ON drug_labels (fetched_at)"
+            )
+
+    def get(self, key: str) -> dict | None:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT info, fetched_at, etag FROM drug_labels WHERE key = ?", (key,)
+            ).fetchone()
+        if row is None:
+            return None
+        return {"info": json.loads(row[0]), "fetched_at": row[1], "etag": row[2]}
+
+    def put(self, key: str, info: dict, etag: str | None = None, fetched_at: float | None = None) -> None:
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO drug_labels (key, info, fetched_at, etag) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(info), fetched_at or time.time(), etag),
+            )
+
+    def touch(self, key: str, fetched_at: float | None = None) -> None:
+        """Mark an entry fresh again (e.g. after a 304 Not Modified)."""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE drug_labels SET fetched_at = ? WHERE key = ?",
+                (fetched_at or time.time(), key),
+            )
+
+    def recent(self, limit: int) -> list[tuple[str, dict]]:
+        """Most recently fetched entries first, for warming the memory cache."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT key, info FROM drug_labels ORDER BY fetched_at DESC LIMIT ?", (limit,)
+            ).fetchall()
+        return [(key, json.loads(info)) for key, info in rows]
+
+    def infos(self) -> list[dict]:
+        """Every stored label dict."""
+        with self._lock:
+            rows = self._conn.execute("SELECT info FROM drug_labels").fetchall()
+        return [json.loads(info) for (info,) in rows]
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
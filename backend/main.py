@@ -1,24 +1,131 @@
 from dotenv import load_dotenv
 import os
 from mangum import Mangum
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from openfda import  get_drug_info
-from gemini import generate_text, filter_and_summarize_contraindications
+from openfda import (
+    get_drug_info,
+    get_drug_info_many,
+    start_client,
+    close_client,
+    cache_stats,
+    warm_cache,
+    load_drug_names,
+    load_synonyms,
+    suggest_drugs,
+    drug_name_index,
+    normalize_drug_name,
+    add_label_listener,
+)
+from gemini import (
+    generate_text_async,
+    stream_text_async,
+    filter_and_summarize_contraindications_async,
+    filter_and_summarize_contraindications_batch_async,
+    batch_counts as gemini_batch_counts,
+    gemini_limiter,
+    invalidate_patient_contraindications,
+    contraindication_cache,
+    GEMINI_MODEL,
+    NO_SUMMARY_TEXT,
+    PLACEHOLDER_TEXTS,
+)
+from budget import shared_context
+from cache import TTLCache, SingleFlight, stable_hash
+from fhir import close_client as close_fhir_client
+from patients import repository, PATIENT_SEED_SAMPLE_DATA
+from patient_search import build_index
+from interactions import InteractionTable, triage
+from excerpts import excerpt_sections, relevance_terms
+from precompute import PrecomputeScheduler, PRECOMPUTE_ENABLED
+from resilience import CircuitOpenError, upstream_stats
+from jobs import JobQueue, JobQueueFull, DONE, FAILED
 from sample_data import sample_data
 import asyncio
+import json
+import time
+from contextlib import asynccontextmanager
 from datetime import datetime, timezone
 
 _load_env = os.path.join(os.path.dirname(__file__), ".env")
 if os.path.isfile(_load_env):
     load_dotenv(_load_env)
 
+# Per-patient OpenFDA fan-out: max lookups in flight and per-lookup deadline (seconds)
+FDA_LOOKUP_CONCURRENCY = int(os.getenv("FDA_LOOKUP_CONCURRENCY", "6"))
+FDA_LOOKUP_TIMEOUT = float(os.getenv("FDA_LOOKUP_TIMEOUT", "8"))
+
+# AI summary cache: keyed by request content + today's date (the prompt decides "overdue" from it)
+SUMMARY_CACHE_TTL = float(os.getenv("SUMMARY_CACHE_TTL", "3600"))
+SUMMARY_CACHE_SIZE = int(os.getenv("SUMMARY_CACHE_SIZE", "1024"))
+
+# Token budget for the FDA label excerpts in one contraindications prompt (all entries together)
+CONTRAINDICATION_EXCERPT_TOKENS = int(os.getenv("CONTRAINDICATION_EXCERPT_TOKENS", "1500"))
+
+# Finished contraindication lists per patient, keyed by a fingerprint of the chart.
+# Results computed while Gemini was unavailable are kept only briefly.
+CONTRAINDICATION_RESULT_TTL = float(os.getenv("CONTRAINDICATION_RESULT_TTL", "86400"))
+CONTRAINDICATION_RESULT_SIZE = int(os.getenv("CONTRAINDICATION_RESULT_SIZE", "4096"))
+CONTRAINDICATION_DEGRADED_TTL = float(os.getenv("CONTRAINDICATION_DEGRADED_TTL", "60"))
+# End-to-end deadline (seconds, 0 = none) for a contraindications request. Past it the
+# request gets the best answer at hand, marked provisional, while Gemini finishes in the
+# background; prior results stay usable for CONTRAINDICATION_STALE_TTL.
+CONTRAINDICATION_DEADLINE = float(os.getenv("CONTRAINDICATION_DEADLINE", "8"))
+CONTRAINDICATION_STALE_TTL = float(os.getenv("CONTRAINDICATION_STALE_TTL", str(7 * 86400)))
+# Patients per POST /contraindications/batch request
+CONTRAINDICATION_BATCH_MAX_PATIENTS = int(os.getenv("CONTRAINDICATION_BATCH_MAX_PATIENTS", "200"))
+
+# Optional local interaction matrix built by `python interactions.py build`
+FDA_INTERACTIONS_DB = os.getenv("FDA_INTERACTIONS_DB", "")
+
+summary_cache = TTLCache(SUMMARY_CACHE_SIZE, SUMMARY_CACHE_TTL)
+_summary_flight = SingleFlight()
+contraindication_results = TTLCache(CONTRAINDICATION_RESULT_SIZE, CONTRAINDICATION_RESULT_TTL)
+_contraindication_flight = SingleFlight()
+# Last Gemini-filtered result per patient, with the medication list it was computed for
+contraindication_prior = TTLCache(CONTRAINDICATION_RESULT_SIZE, CONTRAINDICATION_STALE_TTL)
+# Locally triaged entries of in-flight computations, available before Gemini answers
+_contraindication_local: dict[str, asyncio.Future] = {}
+# Running batch computations, referenced so they finish even when their caller is gone
+_contraindication_batches: set[asyncio.Task] = set()
+contraindication_deadline_counts = {"on_time": 0, "prior": 0, "local": 0}
+interaction_table = (
+    InteractionTable(FDA_INTERACTIONS_DB) if FDA_INTERACTIONS_DB and os.path.isfile(FDA_INTERACTIONS_DB) else None
+)
+# How contraindication entries were decided: locally (kept/dropped) or by Gemini
+triage_counts = {"kept": 0, "dropped": 0, "llm": 0}
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # One pooled OpenFDA client per process (kept across invocations under Mangum)
+    start_client()
+    await warm_cache()
+    await load_synonyms()
+    await load_drug_names()
+    if PRECOMPUTE_ENABLED:
+        precompute_scheduler.start()
+    job_queue.start()
+    try:
+        yield
+    finally:
+        # Under Mangum this runs after every invocation on a loop that is reused by the
+        # next one; queued jobs and precompute work, and the clients their requests are
+        # in flight on, must survive it
+        if not _lambda_invocation:
+            await job_queue.stop()
+            await precompute_scheduler.stop()
+            await close_client()
+            await close_fhir_client()
+
 
 app = FastAPI(
     title="Metricare API",
     description="Backend API for Metricare patient dashboard",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan,
 )
 
 app.add_middleware(
@@ -27,8 +134,15 @@ app.add_middleware(
     allow_credentials=False,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "X-Provisional"],
 )
 
+# Typeahead index; follows repository writes (seeding, bulk ingest) from here on
+patient_index = build_index(repository)
+
+if PATIENT_SEED_SAMPLE_DATA:
+    repository.seed(sample_data)
+
 
 
 class SummaryRequest(BaseModel):
@@ -39,30 +153,33 @@ class SummaryRequest(BaseModel):
     contraindications: list[dict] = []
 
 
-def _initials(name: str) -> str:
-    parts = (name or "").strip().split()
-    if not parts:
-        return "?"
-    if len(parts) == 1:
-        return (parts[0][:2]).upper()
-    return (parts[0][0] + parts[-1][0]).upper()
+@app.get("/patients")
+def list_patients(response: Response, cursor: str | None = None, limit: int | None = None):
+    """
+    One page of patients sorted by id; the next page's cursor is in the X-Next-Cursor
+    header. `limit` defaults to PATIENTS_DEFAULT_PAGE (100) and is capped at
+    PATIENTS_MAX_PAGE. Callers that omit it still get the whole list from stores no
+    bigger than the default page (the sample data), and a bounded first page otherwise.
+    """
+    try:
+        rows, next_cursor = repository.list_page(cursor, limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return rows
 
 
-@app.get("/patients")
-def list_patients():
-    out = []
-    for pid, p in sample_data.items():
-        name = p.get("name") or "Unknown"
-        dob = p.get("patientDOB") or ""
-        out.append({"id": pid, "name": name, "dob": dob, "initials": _initials(name)})
-    out.sort(key=lambda item: item["id"])
-    return out
+@app.get("/patients/search")
+def search_patients(q: str = "", limit: int = 10):
+    """Ranked typeahead matches on name, id and DOB (prefix, whole-word and one-typo)."""
+    return patient_index.search(q, limit)
 
 
 @app.get("/patient/{patient_id}")
 def get_patient(patient_id: str):
-    if patient_id in sample_data:
-        p = sample_data[patient_id]
+    p = repository.get(patient_id)
+    if p is not None:
         return {
             "name": p.get("name", "Unknown"),
             "patientid": p.get("patientid", patient_id),
@@ -74,16 +191,18 @@ def get_patient(patient_id: str):
 
 @app.get("/patient/{patient_id}/history")
 def get_patient_history(patient_id: str):
-    if patient_id in sample_data:
-        return sample_data[patient_id].get("patient_history", [])
+    p = repository.get(patient_id)
+    if p is not None:
+        return p.get("patient_history", [])
     return []
 
 
 
 @app.get("/patient/{patient_id}/medications")
 def get_patient_medications(patient_id: str):
-    if patient_id in sample_data:
-        return sample_data[patient_id].get("current_medications", [])
+    p = repository.get(patient_id)
+    if p is not None:
+        return p.get("current_medications", [])
     return []
 
 
@@ -91,15 +210,156 @@ def get_patient_medications(patient_id: str):
 
 @app.get("/patient/{patient_id}/family_history")
 def get_patient_family_history(patient_id: str):
-    if patient_id in sample_data:
-        return sample_data[patient_id].get("family_history", [])
+    p = repository.get(patient_id)
+    if p is not None:
+        return p.get("family_history", [])
     return []
 
+
+def _raw_contraindication(drug_name: str, info: dict) -> dict:
+    if "error" in info:
+        return {
+            "type": "diagnostic",
+            "label": drug_name,
+            "severity": "UNKNOWN",
+            "items": ["No FDA data available for this drug."],
+            "description": None,
+        }
+
+    interactions = info.get("interactions", ["N/A"])
+    warnings = info.get("warnings", ["N/A"])
+
+    # Full section text; get_contraindications cuts it down to relevant excerpts
+    items = interactions if interactions != ["N/A"] else warnings
+
+    return {
+        "type": "diagnostic",
+        "label": drug_name,
+        "severity": "UNKNOWN",
+        "items": items,
+        "description": None,
+    }
+
+
+def _contraindications_key(patient_id: str, record: dict | None) -> str:
+    """Changes whenever anything in the chart the contraindication result depends on changes."""
+    record = record or {}
+    return stable_hash(
+        patient_id,
+        record.get("name"),
+        record.get("current_medications", []),
+        record.get("patient_history", []),
+        record.get("family_history", []),
+    )
+
+
 @app.get("/patient/{patient_id}/contraindications")
-async def get_contraindications(patient_id: str):
+async def get_contraindications(patient_id: str, response: Response):
+    """
+    Contraindications relevant for this patient, from contraindication_results when
+    precomputed (or computed recently), otherwise computed now. A result returned at
+    the CONTRAINDICATION_DEADLINE before Gemini finished carries X-Provisional: true.
+    """
+    results, provisional = await _contraindications_within_deadline(patient_id)
+    if provisional:
+        response.headers["X-Provisional"] = "true"
+    return results
+
+
+async def _contraindications_within_deadline(patient_id: str) -> tuple[list[dict], bool]:
+    """
+    (results, provisional). When the computation misses the deadline, answers with the
+    patient's prior result if it was for the same medication list, else the locally
+    triaged FDA entries (unfiltered where Gemini would have decided); the computation
+    keeps running and fills contraindication_results for the next request.
+    """
+    record = repository.get(patient_id)
+    key = _contraindications_key(patient_id, record)
+    cached = contraindication_results.get(key)
+    if cached is not None:
+        return cached, False
+    flight = asyncio.ensure_future(
+        _contraindication_flight.do(key, lambda: _compute_contraindications(patient_id, key))
+    )
+    if CONTRAINDICATION_DEADLINE <= 0:
+        return await flight, False
+    try:
+        done, _ = await asyncio.wait({flight}, timeout=CONTRAINDICATION_DEADLINE)
+        if not done:
+            prior = contraindication_prior.get(patient_id)
+            if prior is not None and prior["medications"] == _medications_key(record):
+                contraindication_deadline_counts["prior"] += 1
+                return prior["results"], True
+            local = _contraindication_local.get(key)
+            if local is not None:
+                # Still fetching labels (bounded by FDA_LOOKUP_TIMEOUT) or already triaged
+                await asyncio.wait({flight, local}, return_when=asyncio.FIRST_COMPLETED)
+                if not flight.done() and local.done() and not local.cancelled():
+                    contraindication_deadline_counts["local"] += 1
+                    return local.result(), True
+        results = await flight
+        contraindication_deadline_counts["on_time"] += 1
+        return results, False
+    finally:
+        # Only this request's wait; the shared computation is shielded and carries on
+        flight.cancel()
+
+
+def _medications_key(record: dict | None) -> str:
+    return stable_hash((record or {}).get("current_medications", []))
+
+
+def _merge_decided(decided: list[tuple[str, dict]], filtered: list[dict]) -> list[dict]:
+    """Medication order, with Gemini's picks (a subsequence of the "ask" entries) slotted back in."""
+    results = []
+    pending = iter(filtered)
+    pick = next(pending, None)
+    for decision, entry in decided:
+        if decision == "keep":
+            results.append(entry)
+        elif decision == "ask" and pick is not None and pick.get("label") == entry["label"]:
+            results.append(pick)
+            pick = next(pending, None)
+    return [
+        r for r in results
+        if r.get("description") != "No significant drug interaction risks for this patient."
+    ]
+
+
+async def _compute_contraindications(patient_id: str, key: str) -> list[dict]:
+    """
+    Pulls the patient's medications, looks up each one in the OpenFDA API, then
+    keeps only contraindications relevant for this patient. Entries whose label
+    plainly names (or plainly doesn't name) a co-medication are decided locally;
+    only the ambiguous rest goes to Gemini. The locally decided list is published in
+    _contraindication_local while Gemini runs.
+    """
+    local = _contraindication_local[key] = asyncio.get_running_loop().create_future()
+    try:
+        return await _compute_contraindications_stages(patient_id, key, local)
+    finally:
+        if _contraindication_local.get(key) is local:
+            del _contraindication_local[key]
+        local.cancel()
+
+
+async def _compute_contraindications_stages(patient_id: str, key: str, local: asyncio.Future) -> list[dict]:
+    prepared = await _prepare_contraindications(patient_id)
+    local.set_result(_merge_decided(prepared["decided"], prepared["ambiguous"]))
+
+    filtered = []
+    if prepared["ambiguous"]:
+        try:
+            filtered = await filter_and_summarize_contraindications_async(**_gemini_request(prepared, patient_id))
+        except Exception:
+            filtered = prepared["ambiguous"]
+    return _finish_contraindications(patient_id, key, prepared, filtered)
+
+
+async def _prepare_contraindications(patient_id: str) -> dict:
     """
-    Pulls the patient's medications, looks up each one in the OpenFDA API,
-    then uses Gemini to return only contraindications relevant for this patient.
+    Everything up to the Gemini call: the patient's FDA entries, triaged ("keep" /
+    "drop" / "ask") and, for the ambiguous ones, cut down to relevant excerpts.
     """
     patient = get_patient(patient_id)
     medications = get_patient_medications(patient_id)
@@ -116,53 +376,326 @@ async def get_contraindications(patient_id: str):
     )
     medication_names = [m.get("label") for m in medications]
 
-    raw_results = []
-    for med in medications:
-        drug_name = med["label"]
-        info = await get_drug_info(drug_name)
+    infos = await get_drug_info_many(
+        [med["label"] for med in medications],
+        concurrency=FDA_LOOKUP_CONCURRENCY,
+        timeout=FDA_LOOKUP_TIMEOUT,
+    )
+    keys = [normalize_drug_name(name) for name in medication_names]
+    terms = relevance_terms(medication_names, [history_text, family_text])
+    decided: list[tuple[str, dict]] = []
+    for i, (med, info) in enumerate(zip(medications, infos)):
+        others = [(medication_names[j], keys[j]) for j in range(len(medications)) if j != i]
+        decision, hits = triage(keys[i], info, others, interaction_table, terms[1])
+        entry = _raw_contraindication(med["label"], info)
+        if decision == "keep" and hits:
+            entry = {
+                **entry,
+                "severity": hits[0][1],
+                "items": [f"With {other}: {excerpt}" for other, _, excerpt in hits[:4]],
+            }
+        decided.append((decision, entry))
+    ambiguous = [entry for decision, entry in decided if decision == "ask"]
+    if ambiguous:
+        excerpts = excerpt_sections(
+            [entry["items"] for entry in ambiguous],
+            terms,
+            CONTRAINDICATION_EXCERPT_TOKENS,
+            labels=[entry["label"] for entry in ambiguous],
+        )
+        for entry, items in zip(ambiguous, excerpts):
+            entry["items"] = items
+    for decision, _ in decided:
+        triage_counts[{"keep": "kept", "drop": "dropped", "ask": "llm"}[decision]] += 1
+
+    return {
+        "patient_name": patient["name"],
+        "medication_names": medication_names,
+        "history_text": history_text,
+        "family_text": family_text,
+        "decided": decided,
+        "ambiguous": ambiguous,
+    }
+
+
+def _gemini_request(prepared: dict, patient_id: str) -> dict:
+    """Arguments for the Gemini filter (single or batch) for a prepared patient."""
+    return {
+        "patient_name": prepared["patient_name"],
+        "medication_names": prepared["medication_names"],
+        "history_text": prepared["history_text"],
+        "family_text": prepared["family_text"],
+        "raw_results": prepared["ambiguous"],
+        "patient_id": patient_id,
+    }
+
+
+def _finish_contraindications(patient_id: str, key: str, prepared: dict, filtered: list[dict]) -> list[dict]:
+    """Merge Gemini's picks with the local decisions and cache the result."""
+    results = _merge_decided(prepared["decided"], filtered)
+
+    # Unfiltered because Gemini failed: serve it, but retry soon
+    degraded = bool(prepared["ambiguous"]) and filtered is prepared["ambiguous"]
+    contraindication_results.set(
+        key, results, ttl=CONTRAINDICATION_DEGRADED_TTL if degraded else None, tag=patient_id
+    )
+    if not degraded:
+        contraindication_prior.set(
+            patient_id,
+            {"medications": _medications_key(repository.get(patient_id)), "results": results},
+            tag=patient_id,
+        )
+    return results
 
-        if "error" in info:
-            raw_results.append({
-                "type": "diagnostic",
-                "label": drug_name,
-                "severity": "UNKNOWN",
-                "items": ["No FDA data available for this drug."],
-                "description": None,
-            })
-            continue
 
-        interactions = info.get("interactions", ["N/A"])
-        warnings = info.get("warnings", ["N/A"])
+async def analyze_contraindications_batch(patient_ids: list[str], force: bool = False) -> dict[str, list[dict]]:
+    """
+    Contraindications for many patients, with the Gemini work for all of them packed
+    into as few calls as the batch token budget allows. Results already in
+    contraindication_results are reused unless force is set; everything computed is
+    cached as if requested one patient at a time. Returns {patient_id: results}.
+    """
+    out: dict[str, list[dict]] = {}
+    todo: dict[str, str] = {}
+    for patient_id in dict.fromkeys(patient_ids):
+        key = _contraindications_key(patient_id, repository.get(patient_id))
+        cached = None if force else contraindication_results.get(key)
+        if cached is not None:
+            out[patient_id] = cached
+        else:
+            todo[patient_id] = key
+
+    # Each patient goes through _contraindication_flight like a single request: one already
+    # being computed is joined, the rest are claimed here and computed together
+    loop = asyncio.get_running_loop()
+    context = shared_context()
+    claimed: dict[str, asyncio.Future] = {}
+    joined: dict[str, asyncio.Future] = {}
+    for patient_id, key in todo.items():
+        slot = loop.create_future()
+        fut, started = _contraindication_flight.start(key, lambda slot=slot: slot, context=context)
+        (claimed if started else joined)[patient_id] = fut
+    if claimed:
+        # Shielded like SingleFlight work: single requests may have joined these patients, so
+        # the computation outlives this caller (e.g. a disconnected batch client)
+        task = loop.create_task(_compute_contraindications_batch(claimed, todo), context=context)
+        _contraindication_batches.add(task)
+        task.add_done_callback(_contraindication_batches.discard)
+        await asyncio.shield(task)
+    for patient_id, fut in claimed.items():
+        out[patient_id] = fut.result()
+    for patient_id, fut in joined.items():
+        out[patient_id] = await asyncio.shield(fut)
+    return out
 
-        items = interactions if interactions != ["N/A"] else warnings
-        items = [i[:200] for i in items]
 
-        raw_results.append({
-            "type": "diagnostic",
-            "label": drug_name,
-            "severity": "UNKNOWN",
-            "items": items,
-            "description": None,
-        })
+async def _compute_contraindications_batch(slots: dict[str, asyncio.Future], keys: dict[str, str]) -> None:
+    """_compute_contraindications for the patients in slots, resolving each slot with its result."""
+    loop = asyncio.get_running_loop()
+    # Published before the FDA stage, as in _compute_contraindications, so a request joining
+    # during it can wait for the local triage instead of the whole batch
+    locals_ = {pid: loop.create_future() for pid in slots}
+    for patient_id, local in locals_.items():
+        _contraindication_local[keys[patient_id]] = local
+
+    async def prepare(patient_id: str) -> dict:
+        prepared = await _prepare_contraindications(patient_id)
+        locals_[patient_id].set_result(_merge_decided(prepared["decided"], prepared["ambiguous"]))
+        return prepared
 
     try:
-        results = await asyncio.to_thread(
-            filter_and_summarize_contraindications,
-            patient["name"],
-            medication_names,
-            history_text,
-            family_text,
-            raw_results,
+        # FDA lookups for the whole batch run concurrently; the label cache dedupes shared drugs
+        prepared = dict(zip(slots, await asyncio.gather(*(prepare(pid) for pid in slots))))
+        asking = [pid for pid in slots if prepared[pid]["ambiguous"]]
+        try:
+            filtered = await filter_and_summarize_contraindications_batch_async(
+                [_gemini_request(prepared[pid], pid) for pid in asking]
+            )
+        except Exception:
+            filtered = [prepared[pid]["ambiguous"] for pid in asking]
+        picks = dict(zip(asking, filtered))
+        for patient_id, slot in slots.items():
+            slot.set_result(
+                _finish_contraindications(patient_id, keys[patient_id], prepared[patient_id], picks.get(patient_id, []))
+            )
+    except BaseException as e:
+        for slot in slots.values():
+            if slot.done():
+                continue
+            if isinstance(e, asyncio.CancelledError):
+                slot.cancel()
+            else:
+                slot.set_exception(e)
+        raise
+    finally:
+        for patient_id, local in locals_.items():
+            if _contraindication_local.get(keys[patient_id]) is local:
+                del _contraindication_local[keys[patient_id]]
+            local.cancel()
+
+
+def _medication_drug_keys(patient_id: str) -> set[str]:
+    return {
+        normalize_drug_name(m.get("label", ""))
+        for m in get_patient_medications(patient_id)
+        if m.get("label")
+    }
+
+
+async def _precompute_contraindications(patient_id: str, force: bool) -> tuple[set[str], bool]:
+    """PrecomputeScheduler compute step: fill contraindication_results unless already current."""
+    record = repository.get(patient_id)
+    if record is None:
+        return set(), False
+    drug_keys = _medication_drug_keys(patient_id)
+    key = _contraindications_key(patient_id, record)
+    if not force and key in contraindication_results:
+        return drug_keys, False
+    await _contraindication_flight.do(key, lambda: _compute_contraindications(patient_id, key))
+    return drug_keys, True
+
+
+async def _precompute_contraindications_batch(items: list[tuple[str, bool]]) -> dict[str, tuple[set[str], bool]]:
+    """_precompute_contraindications for several patients, sharing Gemini calls."""
+    outcomes: dict[str, tuple[set[str], bool]] = {}
+    due = []
+    for patient_id, force in items:
+        record = repository.get(patient_id)
+        if record is None:
+            outcomes[patient_id] = (set(), False)
+            continue
+        computed = force or _contraindications_key(patient_id, record) not in contraindication_results
+        outcomes[patient_id] = (_medication_drug_keys(patient_id), computed)
+        if computed:
+            due.append(patient_id)
+    if due:
+        await analyze_contraindications_batch(due, force=True)
+    return outcomes
+
+
+precompute_scheduler = PrecomputeScheduler(
+    repository, _precompute_contraindications, compute_batch=_precompute_contraindications_batch
+)
+repository.add_listener(precompute_scheduler.on_patient_change)
+add_label_listener(precompute_scheduler.on_label_change)
+
+
+class BatchContraindicationsRequest(BaseModel):
+    patient_ids: list[str]
+    force: bool = False
+
+
+@app.post("/contraindications/batch")
+async def batch_contraindications(request: BatchContraindicationsRequest):
+    """
+    Contraindications for up to CONTRAINDICATION_BATCH_MAX_PATIENTS patients at once,
+    keyed by patient id. Cached results are reused unless force is set; the rest share
+    batched Gemini calls. No deadline applies: results are never provisional.
+    """
+    if len(request.patient_ids) > CONTRAINDICATION_BATCH_MAX_PATIENTS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"At most {CONTRAINDICATION_BATCH_MAX_PATIENTS} patient ids per batch",
         )
-    except Exception:
-        results = raw_results
+    return await analyze_contraindications_batch(request.patient_ids, request.force)
 
-    results = [
-        r for r in results
-        if r.get("description") != "No significant drug interaction risks for this patient."
-    ]
 
-    return results
+@app.get("/patient/{patient_id}/dashboard")
+async def get_patient_dashboard(patient_id: str, stream: bool = False):
+    """
+    Everything one dashboard needs in a single call: patient, history, medications,
+    family history, contraindications and the AI summary, built server-side.
+    FDA/Gemini contraindication work starts immediately and the summary runs as soon as
+    it finishes. With ?stream=true each section is sent as an SSE event (named after the
+    section) as soon as it is ready, then a `done` event with timing. Contraindications
+    returned at the deadline are followed by a `provisional` event naming the section.
+    """
+    if stream:
+        return StreamingResponse(
+            _dashboard_events(patient_id),
+            media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        )
+    out = {"errors": []}
+    async for section, data in _dashboard_sections(patient_id):
+        if section == "error":
+            out["errors"].append(data)
+        else:
+            out[section] = data
+    return out
+
+
+async def _dashboard_sections(patient_id: str):
+    """Yield (section, payload) pairs in the order they become available."""
+    contra_task = asyncio.create_task(_contraindications_within_deadline(patient_id))
+    try:
+        patient = get_patient(patient_id)
+        history = get_patient_history(patient_id)
+        medications = get_patient_medications(patient_id)
+        family = get_patient_family_history(patient_id)
+        yield "patient", patient
+        yield "history", history
+        yield "medications", medications
+        yield "family_history", family
+
+        contraindications, provisional = await contra_task
+        yield "contraindications", contraindications
+        if provisional:
+            yield "provisional", {"sections": ["contraindications"]}
+
+        try:
+            summary = await generate_patient_summary(
+                _summary_request(patient, history, medications, family, contraindications)
+            )
+        except HTTPException as e:
+            yield "error", {"section": "summary", "detail": e.detail}
+            yield "summary", []
+        else:
+            yield "summary", summary
+    finally:
+        contra_task.cancel()
+
+
+async def _dashboard_events(patient_id: str):
+    started = time.monotonic()
+    async for section, data in _dashboard_sections(patient_id):
+        yield _sse(section, data if isinstance(data, dict) else {"data": data})
+    yield _sse("done", {"total_ms": round(1000 * (time.monotonic() - started), 1)})
+
+
+def _summary_request(
+    patient: dict,
+    history: list[dict],
+    medications: list[dict],
+    family: list[dict],
+    contraindications: list[dict],
+) -> SummaryRequest:
+    """The POST /patient/summary body the frontend used to assemble from the other endpoints."""
+    return SummaryRequest(
+        patient_name=patient.get("name", "Unknown"),
+        history=[
+            {"label": h.get("label", ""), "date": h.get("date", ""), "items": h.get("items", [])}
+            for h in history
+        ],
+        medications=[{"label": m.get("label", ""), "items": m.get("items", [])} for m in medications],
+        family_history=[
+            {"label": f.get("label", ""), "relation": f.get("relation", ""), "conditions": f.get("conditions", [])}
+            for f in family
+        ],
+        contraindications=[
+            {"label": c.get("label", ""), "severity": c.get("severity", ""), "items": c.get("items", [])}
+            for c in contraindications
+        ],
+    )
+
+
+@app.delete("/patient/{patient_id}/contraindications/cache")
+def invalidate_contraindications(patient_id: str):
+    """Forget cached Gemini contraindication results for this patient (e.g. after a chart change)."""
+    invalidated = invalidate_patient_contraindications(patient_id)
+    invalidated += contraindication_results.invalidate_tag(patient_id)
+    contraindication_prior.invalidate_tag(patient_id)
+    return {"patient_id": patient_id, "invalidated": invalidated}
 
 
 @app.post("/patient/summary")
@@ -171,8 +704,85 @@ async def generate_patient_summary(request: SummaryRequest):
     Sends patient history, medications, family history, and contraindications
     to Gemini and returns an AI summary that considers all of these.
     Identifies follow-ups/visits due now and returns them bolded (**text**) in the summary.
+    Identical requests on the same day are served from summary_cache (placeholder
+    text is not cached), and concurrent identical requests share a single Gemini call.
     """
     now = datetime.now(timezone.utc)
+    key = stable_hash(GEMINI_MODEL, request.model_dump(), now.strftime("%Y-%m-%d"))
+    cached = summary_cache.get(key)
+    if cached is None:
+        cached = await _summary_flight.do(key, lambda: _generate_summary(key, request, now))
+    return [{"type": "diagnostic", "summary": cached}]
+
+
+async def _generate_summary(key: str, request: SummaryRequest, now: datetime) -> str:
+    prompt = _summary_prompt(request, now)
+    try:
+        summary = await generate_text_async(prompt, 0.3)
+    except CircuitOpenError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Gemini error: {str(e)}")
+    if summary not in PLACEHOLDER_TEXTS:
+        summary_cache.set(key, summary)
+    return summary
+
+
+@app.post("/patient/summary/stream")
+async def stream_patient_summary(request: SummaryRequest):
+    """
+    Same summary as POST /patient/summary, streamed as Server-Sent Events while Gemini
+    generates it: `token` events carry {"text": ...}, then a final `done` event carries
+    timing metadata (or an `error` event). Completed summaries fill summary_cache;
+    placeholder text (no API key, empty answer) is never cached.
+    """
+    now = datetime.now(timezone.utc)
+    key = stable_hash(GEMINI_MODEL, request.model_dump(), now.strftime("%Y-%m-%d"))
+    return StreamingResponse(
+        _summary_events(key, request, now),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+async def _summary_events(key: str, request: SummaryRequest, now: datetime):
+    started = time.monotonic()
+    cached = summary_cache.get(key)
+    if cached is not None:
+        yield _sse("token", {"text": cached})
+        elapsed = round(1000 * (time.monotonic() - started), 1)
+        yield _sse("done", {"cached": True, "model": GEMINI_MODEL, "ttft_ms": elapsed, "total_ms": elapsed})
+        return
+
+    first_token_ms = None
+    parts = []
+    try:
+        async for text in stream_text_async(_summary_prompt(request, now), 0.3):
+            if first_token_ms is None:
+                first_token_ms = round(1000 * (time.monotonic() - started), 1)
+            parts.append(text)
+            yield _sse("token", {"text": text})
+    except Exception as e:
+        yield _sse("error", {"detail": f"Gemini error: {str(e)}"})
+        return
+
+    summary = "".join(parts) or NO_SUMMARY_TEXT
+    if summary not in PLACEHOLDER_TEXTS:
+        summary_cache.set(key, summary)
+    yield _sse("done", {
+        "cached": False,
+        "model": GEMINI_MODEL,
+        "ttft_ms": first_token_ms,
+        "total_ms": round(1000 * (time.monotonic() - started), 1),
+        "chars": len(summary),
+    })
+
+
+def _summary_prompt(request: SummaryRequest, now: datetime) -> str:
     current_date_time = now.strftime("%B %d, %Y") 
     current_date_iso = now.strftime("%Y-%m-%d")  
 
@@ -217,13 +827,127 @@ Potential Contraindications / Interactions:
 {contra_text or "(none)"}
 """
 
+    return prompt
+
+async def _summary_job(params: dict) -> list[dict]:
+    return await generate_patient_summary(SummaryRequest(**params["request"]))
+
+
+async def _contraindications_job(params: dict) -> list[dict]:
+    """Cached or freshly computed contraindications, however long Gemini takes."""
+    patient_id = params["patient_id"]
+    key = _contraindications_key(patient_id, repository.get(patient_id))
+    cached = contraindication_results.get(key)
+    if cached is not None:
+        return cached
+    return await _contraindication_flight.do(key, lambda: _compute_contraindications(patient_id, key))
+
+
+job_queue = JobQueue({"summary": _summary_job, "contraindications": _contraindications_job})
+
+
+def _job_view(job: dict, with_result: bool = False) -> dict:
+    out = {k: v for k, v in job.items() if with_result or k != "result"}
+    out["links"] = {
+        "status": f"/jobs/{job['id']}",
+        "result": f"/jobs/{job['id']}/result",
+        "events": f"/jobs/{job['id']}/events",
+    }
+    return out
+
+
+async def _submit_job(kind: str, params: dict) -> dict:
     try:
-        # Run blocking Gemini call in a thread so the event loop stays responsive
-        summary = await asyncio.to_thread(generate_text, prompt, 0.3)
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Gemini error: {str(e)}")
+        job = await job_queue.submit(kind, params)
+    except JobQueueFull as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "5"})
+    return _job_view(job)
+
+
+@app.post("/jobs/summary", status_code=202)
+async def submit_summary_job(request: SummaryRequest):
+    """
+    Queue the POST /patient/summary work and return at once with the job (id, status
+    and links to poll). Identical requests on the same day share one job.
+    """
+    day = datetime.now(timezone.utc).strftime("%Y-%m-%d")
+    return await _submit_job("summary", {"request": request.model_dump(), "day": day, "model": GEMINI_MODEL})
+
+
+@app.post("/jobs/contraindications/{patient_id}", status_code=202)
+async def submit_contraindications_job(patient_id: str):
+    """
+    Queue the full (never provisional) contraindication analysis for a patient. Submits
+    for an unchanged chart share one job.
+    """
+    chart = _contraindications_key(patient_id, repository.get(patient_id))
+    return await _submit_job("contraindications", {"patient_id": patient_id, "chart": chart})
+
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    """Job status: queued, running, done or failed (with error), without the result."""
+    job = await job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found or expired")
+    return _job_view(job)
+
+
+@app.get("/jobs/{job_id}/result")
+async def get_job_result(job_id: str, response: Response):
+    """The job's result once done; 202 with the job status while it is still queued or running."""
+    job = await job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found or expired")
+    if job["status"] == FAILED:
+        raise HTTPException(status_code=500, detail=job["error"])
+    if job["status"] != DONE:
+        response.status_code = 202
+        return _job_view(job)
+    return job["result"]
+
+
+@app.get("/jobs/{job_id}/events")
+async def stream_job_events(job_id: str):
+    """
+    Server-Sent Events for one job: a `status` event now, then a `done` event carrying
+    the finished job and its result. Comment lines keep idle connections open.
+    """
+    job = await job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found or expired")
+    return StreamingResponse(
+        _job_events(job_id, job),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+async def _job_events(job_id: str, job: dict):
+    yield _sse("status", _job_view(job))
+    while job["status"] not in (DONE, FAILED):
+        job = await job_queue.wait(job_id, timeout=15) or job
+        if job["status"] not in (DONE, FAILED):
+            yield ": keepalive\n\n"
+    yield _sse("done", _job_view(job, with_result=True))
+
+
+@app.get("/drugs/search")
+async def search_drug_names(q: str, limit: int = 10):
+    """Brand/generic name typeahead from the local name index (live FDA search only on a miss)."""
+    return await suggest_drugs(q, max(1, min(limit, 50)))
+
+
+@app.get("/drugs/{drug_name}")
+async def get_drug(drug_name: str):
+    try:
+        info = await get_drug_info(drug_name)
+    except CircuitOpenError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    if "error" in info:
+        raise HTTPException(status_code=404, detail=info["error"])
+    return info
 
-    return [{"type": "diagnostic", "summary": summary}]
 
 @app.get("/")
 def root():
@@ -233,7 +957,41 @@ def root():
 def health():
     return {"status": "healthy"}
 
+@app.get("/metrics")
+def metrics():
+    return {
+        "fda_label_cache": cache_stats(),
+        "contraindication_cache": contraindication_cache.stats(),
+        "summary_cache": {**summary_cache.stats(), "coalesced": _summary_flight.coalesced},
+        "gemini": {**gemini_limiter.stats(), "batch": dict(gemini_batch_counts)},
+        "upstreams": upstream_stats(),
+        "jobs": job_queue.stats(),
+        "patient_index": {"size": len(patient_index)},
+        "drug_name_index": {"size": len(drug_name_index)},
+        "contraindication_triage": dict(triage_counts),
+        "contraindication_results": {
+            **contraindication_results.stats(),
+            "coalesced": _contraindication_flight.coalesced,
+            "deadline": dict(contraindication_deadline_counts),
+        },
+        "precompute": precompute_scheduler.stats(),
+    }
+
 
 
 
-handler = Mangum(app)
\ No newline at end of file
+# Set once the Lambda handler has run: lifespan shutdown then marks the end of an
+# invocation, not of the process
+_lambda_invocation = False
+_mangum = Mangum(app, lifespan="auto")
+
+
+def handler(event, context):
+    """
+    Lambda entry point. Background jobs and precompute keep their queues between
+    invocations and advance whenever the instance is handling a request (for a job,
+    e.g. while GET /jobs/{id}/events waits on it).
+    """
+    global _lambda_invocation
+    _lambda_invocation = True
+    return _mangum(event, context)
\ No newline at end of file
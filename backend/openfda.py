@@ -1,10 +1,121 @@
+import asyncio
 import httpx
 import os
+import re
+import time
 from urllib.parse import quote
+from budget import spend
+from resilience import CircuitOpenError, Upstream
+from cache import TTLCache, SingleFlight
+from label_store import LabelStore
+from label_index import LabelIndex
+from drug_search import DrugNameIndex
+from drug_names import DrugSynonyms, ingredient_key, strip_strength
 
 API_KEY = os.getenv("FDA_API_KEY", "HBemGDPxGZhBuGSVayX6c9dCSUfcv6INh0C71ETM")
 BASE_URL = "https://api.fda.gov/drug/label.json"
 
+# Shared client tuning (connection pool, keep-alive, timeouts, optional HTTP/2)
+FDA_TIMEOUT = float(os.getenv("FDA_TIMEOUT", "10"))
+FDA_CONNECT_TIMEOUT = float(os.getenv("FDA_CONNECT_TIMEOUT", "5"))
+FDA_MAX_CONNECTIONS = int(os.getenv("FDA_MAX_CONNECTIONS", "20"))
+FDA_MAX_KEEPALIVE = int(os.getenv("FDA_MAX_KEEPALIVE", "10"))
+FDA_KEEPALIVE_EXPIRY = float(os.getenv("FDA_KEEPALIVE_EXPIRY", "30"))
+FDA_HTTP2 = os.getenv("FDA_HTTP2", "").lower() in ("1", "true", "yes")
+
+# Retries, circuit breaker and hedging for every FDA request (FDA_RETRIES, FDA_BREAKER_FAILURES,
+# FDA_BREAKER_RESET, FDA_HEDGE, ...; see resilience.py). GETs are idempotent, so hedging is on.
+fda_upstream = Upstream("fda", "FDA", hedge=True)
+
+# Label cache: positive hits live FDA_CACHE_TTL seconds, "not found" results FDA_CACHE_NEGATIVE_TTL
+FDA_CACHE_SIZE = int(os.getenv("FDA_CACHE_SIZE", "512"))
+FDA_CACHE_TTL = float(os.getenv("FDA_CACHE_TTL", "86400"))
+FDA_CACHE_NEGATIVE_TTL = float(os.getenv("FDA_CACHE_NEGATIVE_TTL", "900"))
+
+# Optional on-disk label store (set FDA_LABEL_DB to a SQLite path to enable).
+# Entries older than FDA_STORE_MAX_AGE are served and revalidated in the background.
+FDA_LABEL_DB = os.getenv("FDA_LABEL_DB", "")
+FDA_STORE_MAX_AGE = float(os.getenv("FDA_STORE_MAX_AGE", "604800"))
+FDA_WARM_LIMIT = int(os.getenv("FDA_WARM_LIMIT", "500"))
+
+# Optional offline index built by `python label_index.py ingest` (live API stays the fallback)
+FDA_LABEL_INDEX = os.getenv("FDA_LABEL_INDEX", "")
+
+# Drug synonyms (brand/generic -> ingredient key); set FDA_SYNONYM_DB to persist them
+FDA_SYNONYM_DB = os.getenv("FDA_SYNONYM_DB", "")
+
+# Batched lookups: names per OR-query, max request URL length, results fetched per name
+FDA_BATCH_SIZE = int(os.getenv("FDA_BATCH_SIZE", "10"))
+FDA_BATCH_MAX_URL = int(os.getenv("FDA_BATCH_MAX_URL", "2000"))
+FDA_BATCH_RESULTS_PER_DRUG = int(os.getenv("FDA_BATCH_RESULTS_PER_DRUG", "5"))
+FDA_MAX_LIMIT = 1000  # API cap on limit=
+
+_client: httpx.AsyncClient | None = None
+label_cache = TTLCache(FDA_CACHE_SIZE, FDA_CACHE_TTL)
+_label_flight = SingleFlight()
+label_store = LabelStore(FDA_LABEL_DB) if FDA_LABEL_DB else None
+_revalidating: dict[str, asyncio.Task] = {}
+label_index = LabelIndex(FDA_LABEL_INDEX) if FDA_LABEL_INDEX and os.path.isfile(FDA_LABEL_INDEX) else None
+drug_name_index = DrugNameIndex()
+drug_synonyms = DrugSynonyms(FDA_SYNONYM_DB)
+_label_listeners = []
+
+
+def _http2_available() -> bool:
+    try:
+        import h2  # noqa: F401  (httpx needs the h2 package for HTTP/2)
+    except ImportError:
+        return False
+    return True
+
+
+def _new_client() -> httpx.AsyncClient:
+    return httpx.AsyncClient(
+        timeout=httpx.Timeout(FDA_TIMEOUT, connect=FDA_CONNECT_TIMEOUT),
+        limits=httpx.Limits(
+            max_connections=FDA_MAX_CONNECTIONS,
+            max_keepalive_connections=FDA_MAX_KEEPALIVE,
+            keepalive_expiry=FDA_KEEPALIVE_EXPIRY,
+        ),
+        http2=FDA_HTTP2 and _http2_available(),
+    )
+
+
+def get_client() -> httpx.AsyncClient:
+    """
+    Return the shared OpenFDA client, creating it on first use.
+    Normally opened by the app lifespan (start_client); the lazy path covers scripts
+    and any caller that runs outside the app.
+    """
+    global _client
+    if _client is None or _client.is_closed:
+        _client = _new_client()
+    return _client
+
+
+def start_client() -> httpx.AsyncClient:
+    return get_client()
+
+
+async def close_client() -> None:
+    """Close the shared client. Safe to call repeatedly; the app skips it between Lambda invocations."""
+    global _client
+    for task in list(_revalidating.values()):
+        task.cancel()
+    client, _client = _client, None
+    if client is not None and not client.is_closed:
+        await client.aclose()
+
+
+async def _get(url: str, headers: dict | None = None) -> httpx.Response:
+    """GET an FDA URL under fda_upstream (retries on 429/5xx, breaker, hedging), charged to any rate budget."""
+
+    async def once() -> httpx.Response:
+        await spend("fda")
+        return await get_client().get(url, headers=headers)
+
+    return await fda_upstream.call(once)
+
 
 def _build_url(search: str, limit: int = 5) -> str:
     """
@@ -18,42 +129,352 @@ def _build_url(search: str, limit: int = 5) -> str:
 
 async def search_drugs(q: str) -> dict:
     """
-    Search for drugs by brand name using OpenFDA API.
+    Search for drugs by brand name, from the offline label index when it has
+    matches, otherwise the OpenFDA API. Same response shape either way.
     """
-    url = _build_url(f"openfda.brand_name:{q}", limit=5)
-    async with httpx.AsyncClient(timeout=10.0) as client:
-        response = await client.get(url)
+    if label_index is not None:
+        results = await asyncio.to_thread(label_index.search_brand, q, 5)
+        if results:
+            return {
+                "meta": {"results": {"skip": 0, "limit": 5, "total": len(results)}},
+                "results": results,
+            }
+    response = await _get(_build_url(f"openfda.brand_name:{q}", limit=5))
     return response.json()
 
 
+async def suggest_drugs(q: str, limit: int = 10) -> dict:
+    """
+    Typeahead over brand and generic names from drug_name_index. Only when nothing
+    local matches is the live API asked; its hits are indexed for the next keystroke.
+    """
+    results = drug_name_index.search(q, limit)
+    if results or len((q or "").strip()) < 3:
+        return {"source": "local", "results": results}
+    try:
+        data = await search_drugs(q)
+    except (httpx.HTTPError, CircuitOpenError):
+        return {"source": "local", "results": []}
+    for result in data.get("results", []):
+        drug_name_index.add_label(_label_fields(result))
+    return {"source": "live", "results": drug_name_index.search(q, limit)}
+
+
+async def load_drug_names() -> int:
+    """Fill drug_name_index from the offline index and the label store. Returns names added."""
+    if len(drug_name_index):
+        return 0
+
+    def collect() -> int:
+        added = 0
+        if label_index is not None:
+            kinds = {"brand_name": "brand", "generic_name": "generic", "substance_name": "generic"}
+            added += drug_name_index.add_many(
+                (name, kinds[field], n) for field, name, n in label_index.name_counts()
+            )
+        if label_store is not None:
+            for info in label_store.infos():
+                names = info.get("name", {})
+                added += drug_name_index.add_many(
+                    (name, kind, 1)
+                    for kind in ("brand", "generic")
+                    for name in names.get(kind, [])
+                    if name and name != "N/A"
+                )
+        return added
+
+    return await asyncio.to_thread(collect)
+
+
+async def load_synonyms() -> int:
+    """
+    Seed drug_synonyms from the offline index's brand/generic pairs. Skipped once the
+    synonym store has entries (delete FDA_SYNONYM_DB to rebuild). Returns aliases added.
+    """
+    if label_index is None or len(drug_synonyms):
+        return 0
+
+    def collect() -> int:
+        generics = {generic for _, generic in label_index.names(("generic_name",))}
+        added = drug_synonyms.add_many((g, ingredient_key(g)) for g in generics)
+        return added + drug_synonyms.add_many(
+            (brand, ingredient_key(generic)) for brand, generic in label_index.brand_generics()
+        )
+
+    return await asyncio.to_thread(collect)
+
+
+def add_label_listener(callback) -> None:
+    """callback(key) runs when a cached label is replaced by different content (e.g. on revalidation)."""
+    _label_listeners.append(callback)
+
+
+def normalize_drug_name(drug_name: str) -> str:
+    """
+    Cache key for a drug name: its canonical ingredient key, so "Zestril",
+    "LISINOPRIL" and "lisinopril 10mg" share one entry.
+    """
+    return drug_synonyms.canonical(drug_name)
+
+
+def cache_stats() -> dict:
+    return {**label_cache.stats(), "coalesced": _label_flight.coalesced}
+
+
 async def get_drug_info(drug_name: str) -> dict:
     """
     Get detailed information about a specific drug by brand or generic name.
+    Served from label_cache when possible; concurrent misses for the same name
+    share one upstream request.
+    """
+    key = normalize_drug_name(drug_name)
+    cached = label_cache.get(key)
+    if cached is not None:
+        return cached
+    name = strip_strength(drug_name)
+    return await _label_flight.do(key, lambda: _load_label(key, name))
 
-    FDA harmonizes generic names as UPPERCASE. We search both openfda fields
-    and the raw active_ingredient field as a fallback.
 
-    Note: URL is built manually — httpx encodes '+' as '%2B' in params dicts,
-    which breaks FDA's boolean +OR+ operator.
+async def warm_cache(limit: int = FDA_WARM_LIMIT) -> int:
+    """Load the most recently fetched labels from label_store into memory. Returns the count."""
+    if label_store is None or len(label_cache):
+        return 0
+    rows = await asyncio.to_thread(label_store.recent, limit)
+    for key, info in reversed(rows):
+        label_cache.set(key, info)
+    return len(rows)
+
+
+async def get_drug_info_many(
+    drug_names: list[str],
+    concurrency: int = 4,
+    timeout: float | None = None,
+) -> list[dict]:
     """
+    get_drug_info for a whole medication list, in input order.
+
+    Names not already cached locally are resolved with a few OR-ed searches
+    (split by FDA_BATCH_SIZE / FDA_BATCH_MAX_URL) and matched back per name;
+    anything a batch doesn't resolve falls back to a single get_drug_info.
+    `concurrency` caps upstream requests in flight and `timeout` is the deadline
+    per upstream request; a failed or late lookup comes back as {"error": ...}.
+    """
+    keys = [normalize_drug_name(n) for n in drug_names]
+    found: dict[str, dict] = {}
+    pending: dict[str, str] = {}
+    for key, name in zip(keys, drug_names):
+        if key in found or key in pending:
+            continue
+        cached = label_cache.get(key)
+        if cached is not None:
+            found[key] = cached
+        else:
+            pending[key] = strip_strength(name)
+
+    for key, name in list(pending.items()):
+        info = await _load_local(key, name)
+        if info is not None:
+            found[key] = info
+            del pending[key]
+
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+
+    async def limited(coro):
+        async with semaphore:
+            try:
+                return await asyncio.wait_for(coro, timeout)
+            except Exception:
+                return None
+
+    chunks = _batch_chunks(list(pending.items()))
+    for matched in await asyncio.gather(*(limited(_fetch_batch(chunk)) for chunk in chunks)):
+        for key, info in (matched or {}).items():
+            found[key] = info
+            pending.pop(key, None)
+
+    singles = await asyncio.gather(*(limited(get_drug_info(name)) for name in pending.values()))
+    for key, info in zip(pending, singles):
+        if info is not None:
+            found[key] = info
+
+    return [
+        found.get(key) or {"error": f"FDA lookup failed for '{name}'"}
+        for key, name in zip(keys, drug_names)
+    ]
+
+
+def _name_clause(drug_name: str) -> str:
     name_upper = drug_name.upper()
-    search = (
+    return (
         f'openfda.brand_name:"{drug_name}"'
         f'+OR+openfda.generic_name:"{name_upper}"'
         f'+OR+active_ingredient:"{name_upper}"'
     )
 
-    url = _build_url(search, limit=1)
 
-    async with httpx.AsyncClient(timeout=10.0) as client:
-        response = await client.get(url)
+def _batch_chunks(items: list[tuple[str, str]]) -> list[list[tuple[str, str]]]:
+    """Split (key, name) pairs so each OR-query stays under the size and URL-length caps."""
+    base = len(_build_url("", limit=FDA_MAX_LIMIT))
+    chunks: list[list[tuple[str, str]]] = []
+    current: list[tuple[str, str]] = []
+    length = base
+    for item in items:
+        clause_len = len(quote(_name_clause(item[1]), safe="+:()")) + len("+OR+")
+        if current and (len(current) >= FDA_BATCH_SIZE or length + clause_len > FDA_BATCH_MAX_URL):
+            chunks.append(current)
+            current, length = [], base
+        current.append(item)
+        length += clause_len
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+async def _fetch_batch(chunk: list[tuple[str, str]]) -> dict[str, dict]:
+    """One OR-ed search for several names; returns {key: info} for the names it resolved."""
+    search = "+OR+".join(_name_clause(name) for _, name in chunk)
+    limit = min(FDA_MAX_LIMIT, len(chunk) * FDA_BATCH_RESULTS_PER_DRUG)
+    response = await _get(_build_url(search, limit=limit))
+    if response.status_code == 404:
+        # None of the names has a label
+        out = {key: {"error": f"No information found for '{name}'"} for key, name in chunk}
+    elif response.status_code != 200:
+        return {}
+    else:
+        results = response.json().get("results") or []
+        out = {}
+        for key, name in chunk:
+            result = _match_label(name, results)
+            if result is not None:
+                out[key] = _label_fields(result)
+    for key, info in out.items():
+        await _remember(key, info, response.status_code)
+    return out
+
+
+def _match_label(drug_name: str, results: list[dict]) -> dict | None:
+    """Pick the result a single-name query would most likely return: exact brand, exact generic, then any mention."""
+    name_upper = drug_name.upper()
+    word = re.compile(r"\b" + re.escape(name_upper) + r"\b")
+
+    def names(result: dict, field: str) -> list[str]:
+        return [n.upper() for n in result.get("openfda", {}).get(field, [])]
+
+    for field in ("brand_name", "generic_name"):
+        for result in results:
+            if name_upper in names(result, field):
+                return result
+    for result in results:
+        text = " ".join(
+            names(result, "brand_name") + names(result, "generic_name") + result.get("active_ingredient", [])
+        ).upper()
+        if word.search(text):
+            return result
+    return None
+
+
+async def _load_local(key: str, drug_name: str) -> dict | None:
+    """Label from the on-disk store or offline index, without touching the network."""
+    if label_store is not None:
+        row = await asyncio.to_thread(label_store.get, key)
+        if row is not None:
+            label_cache.set(key, row["info"])
+            if time.time() - row["fetched_at"] > FDA_STORE_MAX_AGE:
+                _schedule_revalidation(key, drug_name, row["etag"])
+            return row["info"]
+    if label_index is not None:
+        result = await asyncio.to_thread(label_index.lookup, drug_name)
+        if result is not None:
+            info = _label_fields(result)
+            label_cache.set(key, info)
+            drug_name_index.add_label(info)
+            drug_synonyms.learn_label(info)
+            return info
+    return None
+
+
+async def _load_label(key: str, drug_name: str) -> dict:
+    info = await _load_local(key, drug_name)
+    if info is not None:
+        return info
+    return await _fetch_and_cache(key, drug_name)
+
+
+def _schedule_revalidation(key: str, drug_name: str, etag: str | None) -> None:
+    if key in _revalidating:
+        return
+    task = asyncio.create_task(_revalidate(key, drug_name, etag))
+    _revalidating[key] = task
+    task.add_done_callback(lambda _: _revalidating.pop(key, None))
+
+
+async def _revalidate(key: str, drug_name: str, etag: str | None) -> None:
+    try:
+        await _fetch_and_cache(key, drug_name, etag)
+    except Exception:
+        pass  # keep serving the stored copy; the next stale read retries
+
+
+async def _fetch_and_cache(key: str, drug_name: str, etag: str | None = None) -> dict | None:
+    info, status, new_etag = await _fetch_drug_info(drug_name, etag)
+    if info is None:
+        # 304 Not Modified: the stored label is still current
+        if label_store is not None:
+            await asyncio.to_thread(label_store.touch, key)
+        return None
+    await _remember(key, info, status, new_etag)
+    return info
+
+
+async def _remember(key: str, info: dict, status: int, etag: str | None = None) -> None:
+    if "error" not in info:
+        drug_name_index.add_label(info)
+        # Also file the label under its ingredient key, where other spellings will look
+        keys = {key, drug_synonyms.learn_label(info) or key}
+        changed = [k for k in keys if label_cache.peek(k) not in (None, info)]
+        for k in keys:
+            label_cache.set(k, info)
+        for k in changed:
+            for callback in _label_listeners:
+                callback(k)
+        if label_store is not None:
+            for k in keys:
+                await asyncio.to_thread(label_store.put, k, info, etag)
+    elif status in (200, 404):
+        # Genuine "no such label"; rate limits and 5xx are not cached
+        label_cache.set(key, info, ttl=FDA_CACHE_NEGATIVE_TTL)
+
+
+async def _fetch_drug_info(drug_name: str, etag: str | None = None) -> tuple[dict | None, int, str | None]:
+    """
+    Fetch and normalize a label straight from the FDA API.
+    Returns the label dict (or {"error": ...}), the upstream status code and ETag.
+    With etag set the request is conditional and a 304 comes back as (None, 304, etag).
+
+    FDA harmonizes generic names as UPPERCASE. We search both openfda fields
+    and the raw active_ingredient field as a fallback.
+
+    Note: URL is built manually — httpx encodes '+' as '%2B' in params dicts,
+    which breaks FDA's boolean +OR+ operator.
+    """
+    url = _build_url(_name_clause(drug_name), limit=1)
+
+    headers = {"If-None-Match": etag} if etag else None
+    response = await _get(url, headers=headers)
+    if response.status_code == 304:
+        return None, 304, etag
 
     data = response.json()
+    new_etag = response.headers.get("etag")
 
     if "error" in data or not data.get("results"):
-        return {"error": f"No information found for '{drug_name}'"}
+        return {"error": f"No information found for '{drug_name}'"}, response.status_code, new_etag
+
+    return _label_fields(data["results"][0]), response.status_code, new_etag
+
 
-    result = data["results"][0]
+def _label_fields(result: dict) -> dict:
+    """Normalize one FDA label record (live or indexed) into the get_drug_info shape."""
     openfda = result.get("openfda", {})
 
     return {
@@ -0,0 +1,224 @@
+"""
+In-memory typeahead index over patient name, id and date of birth for /patients/search.
+
+Every token is kept in a sorted list (prefix matches are a bisect plus a short scan)
+and in a single-deletion neighbourhood map (typo matches are a handful of dict
+lookups), so a query never walks the roster. The index subscribes to
+patients.repository and updates one patient at a time as records change.
+"""
+import bisect
+import heapq
+import os
+import re
+import threading
+from datetime import datetime
+
+from patients import list_row
+
+PATIENT_SEARCH_MAX_LIMIT = int(os.getenv("PATIENT_SEARCH_MAX_LIMIT", "50"))
+# Tokens shorter than this only match exactly or by prefix, never as typos
+PATIENT_SEARCH_FUZZY_MIN = int(os.getenv("PATIENT_SEARCH_FUZZY_MIN", "4"))
+# Upper bound on index tokens one short prefix may expand to
+_MAX_PREFIX_EXPANSION = 500
+
+_TOKEN_RE = re.compile(r"[0-9a-z]+(?:[-/.][0-9a-z]+)*")
+_DATE_FORMATS = ("%B %d, %Y", "%b %d, %Y", "%B %d %Y", "%b %d %Y", "%Y-%m-%d", "%m/%d/%Y", "%d.%m.%Y")
+
+EXACT_SCORE = 3.0
+PREFIX_SCORE = 2.0
+FUZZY_SCORE = 1.0
+ID_BONUS = 5.0
+
+
+def tokenize(text: str) -> list[str]:
+    """Lower-cased word tokens; compound tokens (BIO-2023, 05/21/1989) also yield their parts."""
+    tokens = []
+    for token in _TOKEN_RE.findall((text or "").casefold()):
+        tokens.append(token)
+        parts = re.split(r"[-/.]", token)
+        if len(parts) > 1:
+            tokens.extend(p for p in parts if p)
+    return tokens
+
+
+def parse_date(text: str) -> str | None:
+    """ISO date for a DOB in any of the formats used by the stores and typed by users."""
+    text = " ".join((text or "").split())
+    for fmt in _DATE_FORMATS:
+        try:
+            return datetime.strptime(text, fmt).date().isoformat()
+        except ValueError:
+            continue
+    return None
+
+
+def _deletes(token: str) -> set[str]:
+    return {token[:i] + token[i + 1:] for i in range(len(token))}
+
+
+def _within_one_edit(a: str, b: str) -> bool:
+    """Damerau (optimal string alignment) distance <= 1."""
+    if a == b:
+        return True
+    la, lb = len(a), len(b)
+    if abs(la - lb) > 1:
+        return False
+    i = 0
+    while i < min(la, lb) and a[i] == b[i]:
+        i += 1
+    if la == lb:
+        if a[i + 1:] == b[i + 1:]:
+            return True
+        return i + 1 < la and a[i] == b[i + 1] and a[i + 1] == b[i] and a[i + 2:] == b[i + 2:]
+    if la > lb:
+        return a[i + 1:] == b[i:]
+    return a[i:] == b[i + 1:]
+
+
+def _row_tokens(row: dict) -> set[str]:
+    tokens = set(tokenize(row["name"])) | set(tokenize(row["id"])) | set(tokenize(row["dob"]))
+    iso = parse_date(row["dob"])
+    if iso:
+        year, month, day = iso.split("-")
+        tokens |= {iso, f"{month}/{day}/{year}"}
+    return tokens
+
+
+class PatientSearchIndex:
+    """Token index of /patients list rows with prefix, exact and single-typo matching."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._rows: dict[str, dict] = {}
+        self._tokens_by_patient: dict[str, set[str]] = {}
+        self._postings: dict[str, set[str]] = {}
+        self._sorted: list[str] = []
+        self._neighbours: dict[str, set[str]] = {}
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def update(self, patient_id: str, record: dict | None) -> None:
+        """Index (or, with record=None, drop) one patient. Matches PatientRepository listeners."""
+        with self._lock:
+            self._remove(patient_id)
+            if record is not None:
+                self._add(list_row(patient_id, record))
+
+    def add_rows(self, rows) -> None:
+        """Bulk load; the sorted token list is rebuilt once at the end instead of per insert."""
+        with self._lock:
+            for row in rows:
+                self._remove(row["id"])
+                self._add(row, insort=False)
+            self._sorted = sorted(self._postings)
+
+    def _add(self, row: dict, insort: bool = True) -> None:
+        pid = row["id"]
+        tokens = _row_tokens(row)
+        self._rows[pid] = row
+        self._tokens_by_patient[pid] = tokens
+        for token in tokens:
+            postings = self._postings.get(token)
+            if postings is None:
+                postings = self._postings[token] = set()
+                if insort:
+                    bisect.insort(self._sorted, token)
+                if len(token) >= PATIENT_SEARCH_FUZZY_MIN:
+                    for d in _deletes(token):
+                        self._neighbours.setdefault(d, set()).add(token)
+            postings.add(pid)
+
+    def _remove(self, patient_id: str) -> None:
+        self._rows.pop(patient_id, None)
+        for token in self._tokens_by_patient.pop(patient_id, ()):
+            postings = self._postings.get(token)
+            if postings is None:
+                continue
+            postings.discard(patient_id)
+            if postings:
+                continue
+            del self._postings[token]
+            i = bisect.bisect_left(self._sorted, token)
+            if i < len(self._sorted) and self._sorted[i] == token:
+                del self._sorted[i]
+            if len(token) >= PATIENT_SEARCH_FUZZY_MIN:
+                for d in _deletes(token):
+                    bucket = self._neighbours.get(d)
+                    if bucket is not None:
+                        bucket.discard(token)
+                        if not bucket:
+                            del self._neighbours[d]
+
+    # ---- queries -----------------------------------------------------------
+
+    def _prefixed(self, prefix: str) -> list[str]:
+        i = bisect.bisect_left(self._sorted, prefix)
+        out = []
+        while i < len(self._sorted) and self._sorted[i].startswith(prefix) and len(out) < _MAX_PREFIX_EXPANSION:
+            out.append(self._sorted[i])
+            i += 1
+        return out
+
+    def _typos(self, token: str) -> set[str]:
+        if len(token) < PATIENT_SEARCH_FUZZY_MIN:
+            return set()
+        candidates = set(self._neighbours.get(token, ()))
+        for d in _deletes(token):
+            if d in self._postings:
+                candidates.add(d)
+            candidates |= self._neighbours.get(d, set())
+        return {c for c in candidates if c != token and _within_one_edit(token, c)}
+
+    def _match(self, token: str) -> dict[str, float]:
+        """Best score per patient for one query token."""
+        scores: dict[str, float] = {}
+
+        def credit(tokens, score):
+            for t in tokens:
+                for pid in self._postings.get(t, ()):
+                    if scores.get(pid, 0.0) < score:
+                        scores[pid] = score
+
+        credit(self._typos(token), FUZZY_SCORE)
+        # Shorter completions rank higher: "jo" is closer to "john" than to "johnson"
+        for t in self._prefixed(token):
+            credit((t,), EXACT_SCORE if t == token else PREFIX_SCORE + len(token) / len(t) / 2)
+        return scores
+
+    def search(self, q: str, limit: int = 10) -> list[dict]:
+        """
+        Patients matching every token of q (as a whole word, word prefix, or one typo
+        away), best first. A query that reads as a date also matches the DOB.
+        """
+        limit = max(1, min(limit, PATIENT_SEARCH_MAX_LIMIT))
+        query = " ".join((q or "").split()).casefold()
+        if not query:
+            return []
+        iso = parse_date(query)
+        tokens = [iso] if iso else list(dict.fromkeys(_TOKEN_RE.findall(query)))
+        if not tokens:
+            return []
+        with self._lock:
+            totals: dict[str, float] | None = None
+            for token in tokens:
+                scores = self._match(token)
+                if totals is None:
+                    totals = scores
+                else:
+                    totals = {pid: totals[pid] + s for pid, s in scores.items() if pid in totals}
+                if not totals:
+                    return []
+            for pid in totals:
+                if pid.casefold() == query:
+                    totals[pid] += ID_BONUS
+            ranked = heapq.nsmallest(limit, totals, key=lambda pid: (-totals[pid], self._rows[pid]["name"], pid))
+            return [self._rows[pid] for pid in ranked]
+
+
+def build_index(repository) -> PatientSearchIndex:
+    """Index every patient in repository and keep the index in sync with later writes."""
+    index = PatientSearchIndex()
+    repository.add_listener(index.update)
+    index.add_rows(repository.iter_rows())
+    return index
@@ -0,0 +1,233 @@
+import base64
+import bisect
+import json
+import os
+import sqlite3
+import threading
+from typing import Iterable
+
+# Patient store backend: "memory" (default) or "sqlite" (PATIENT_DB path).
+# PATIENT_SEED_SAMPLE_DATA loads sample_data into an empty store at startup.
+PATIENT_STORE = os.getenv("PATIENT_STORE", "memory")
+PATIENT_DB = os.getenv("PATIENT_DB", "patients.db")
+PATIENT_SEED_SAMPLE_DATA = os.getenv("PATIENT_SEED_SAMPLE_DATA", "true").lower() in ("1", "true", "yes")
+# GET /patients page size when the caller gives no limit, and the largest it may ask for
+PATIENTS_DEFAULT_PAGE = int(os.getenv("PATIENTS_DEFAULT_PAGE", "100"))
+PATIENTS_MAX_PAGE = int(os.getenv("PATIENTS_MAX_PAGE", "500"))
+
+
+def _initials(name: str) -> str:
+    parts = (name or "").strip().split()
+    if not parts:
+        return "?"
+    if len(parts) == 1:
+        return (parts[0][:2]).upper()
+    return (parts[0][0] + parts[-1][0]).upper()
+
+
+def list_row(patient_id: str, record: dict) -> dict:
+    """The /patients row for a record, computed once at write time."""
+    name = record.get("name") or "Unknown"
+    dob = record.get("patientDOB") or ""
+    return {"id": patient_id, "name": name, "dob": dob, "initials": _initials(name)}
+
+
+def encode_cursor(patient_id: str) -> str:
+    return base64.urlsafe_b64encode(patient_id.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> str:
+    """The patient id in a cursor from encode_cursor; ValueError for anything else."""
+    padded = cursor + "=" * (-len(cursor) % 4)
+    try:
+        patient_id = base64.b64decode(padded.encode(), altchars=b"-_", validate=True).decode()
+    except (ValueError, UnicodeDecodeError):
+        raise ValueError(f"Invalid cursor: {cursor!r}")
+    # Only what encode_cursor produced: non-canonical spellings and empty ids are rejected
+    if not patient_id or encode_cursor(patient_id) != cursor:
+        raise ValueError(f"Invalid cursor: {cursor!r}")
+    return patient_id
+
+
+class MemoryPatientBackend:
+    """Records in a dict, with a sorted id list and precomputed list rows."""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._records: dict[str, dict] = {}
+        self._rows: dict[str, dict] = {}
+        self._ids: list[str] = []
+
+    def get(self, patient_id: str) -> dict | None:
+        return self._records.get(patient_id)
+
+    def upsert_many(self, records: dict[str, dict]) -> None:
+        with self._lock:
+            for pid, record in records.items():
+                if pid not in self._records:
+                    bisect.insort(self._ids, pid)
+                self._records[pid] = record
+                self._rows[pid] = list_row(pid, record)
+
+    def delete(self, patient_id: str) -> bool:
+        with self._lock:
+            if self._records.pop(patient_id, None) is None:
+                return False
+            self._rows.pop(patient_id, None)
+            i = bisect.bisect_left(self._ids, patient_id)
+            if i < len(self._ids) and self._ids[i] == patient_id:
+                del self._ids[i]
+            return True
+
+    def page(self, after: str | None, limit: int | None) -> list[dict]:
+        with self._lock:
+            start = bisect.bisect_right(self._ids, after) if after is not None else 0
+            end = len(self._ids) if limit is None else start + limit
+            return [self._rows[pid] for pid in self._ids[start:end]]
+
+    def count(self) -> int:
+        return len(self._ids)
+
+    def close(self) -> None:
+        pass
+
+
+class SQLitePatientBackend:
+    """Records as JSON in SQLite; list rows are columns, paged by primary key."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                """CREATE TABLE IF NOT EXISTS patients (
+                    id TEXT PRIMARY KEY,
+                    name TEXT NOT NULL,
+                    dob TEXT NOT NULL,
+                    initials TEXT NOT NULL,
+                    record TEXT NOT NULL
+                )"""
+            )
+
+    def get(self, patient_id: str) -> dict | None:
+        with self._lock:
+            row = self._conn.execute("SELECT record FROM patients WHERE id = ?", (patient_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def upsert_many(self, records: dict[str, dict]) -> None:
+        rows = []
+        for pid, record in records.items():
+            r = list_row(pid, record)
+            rows.append((pid, r["name"], r["dob"], r["initials"], json.dumps(record)))
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO patients (id, name, dob, initials, record) VALUES (?, ?, ?, ?, ?)",
+                rows,
+            )
+
+    def delete(self, patient_id: str) -> bool:
+        with self._lock, self._conn:
+            return self._conn.execute("DELETE FROM patients WHERE id = ?", (patient_id,)).rowcount > 0
+
+    def page(self, after: str | None, limit: int | None) -> list[dict]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, name, dob, initials FROM patients WHERE id > ? ORDER BY id LIMIT ?",
+                (after if after is not None else "", -1 if limit is None else limit),
+            ).fetchall()
+        return [{"id": pid, "name": name, "dob": dob, "initials": initials} for pid, name, dob, initials in rows]
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM patients").fetchone()[0]
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+class PatientRepository:
+    """
+    Patient records (the sample_data / fhir.get_patient_info shape) behind a pluggable
+    backend, with list rows precomputed on write and cursor pagination by id.
+    """
+
+    def __init__(self, backend):
+        self.backend = backend
+        self._listeners = []
+
+    @classmethod
+    def from_env(cls) -> "PatientRepository":
+        if PATIENT_STORE == "sqlite":
+            return cls(SQLitePatientBackend(PATIENT_DB))
+        if PATIENT_STORE != "memory":
+            raise ValueError(f"Unknown PATIENT_STORE: {PATIENT_STORE!r} (use 'memory' or 'sqlite')")
+        return cls(MemoryPatientBackend())
+
+    def add_listener(self, callback) -> None:
+        """callback(patient_id, record_or_None) runs after every write (None = deleted)."""
+        self._listeners.append(callback)
+
+    def get(self, patient_id: str) -> dict | None:
+        return self.backend.get(patient_id)
+
+    def upsert(self, patient_id: str, record: dict) -> None:
+        self.upsert_many({patient_id: record})
+
+    def upsert_many(self, records: dict[str, dict]) -> None:
+        if not records:
+            return
+        self.backend.upsert_many(records)
+        for pid, record in records.items():
+            for callback in self._listeners:
+                callback(pid, record)
+
+    def delete(self, patient_id: str) -> bool:
+        deleted = self.backend.delete(patient_id)
+        if deleted:
+            for callback in self._listeners:
+                callback(patient_id, None)
+        return deleted
+
+    def list_page(self, cursor: str | None = None, limit: int | None = None) -> tuple[list[dict], str | None]:
+        """
+        One page of list rows sorted by id, starting after `cursor`. Returns the rows
+        and the cursor for the next page (None at the end). limit defaults to
+        PATIENTS_DEFAULT_PAGE and is capped at PATIENTS_MAX_PAGE; use iter_rows to
+        read the whole store.
+        """
+        after = decode_cursor(cursor) if cursor else None
+        limit = max(1, min(PATIENTS_DEFAULT_PAGE if limit is None else limit, PATIENTS_MAX_PAGE))
+        rows = self.backend.page(after, limit + 1)
+        if len(rows) > limit:
+            rows = rows[:limit]
+            return rows, encode_cursor(rows[-1]["id"])
+        return rows, None
+
+    def iter_rows(self, batch_size: int = 500) -> Iterable[dict]:
+        """Every list row in id order, read a page at a time."""
+        after = None
+        while True:
+            rows = self.backend.page(after, batch_size)
+            if not rows:
+                return
+            yield from rows
+            after = rows[-1]["id"]
+
+    def iter_ids(self, batch_size: int = 500) -> Iterable[str]:
+        """Every patient id in order, read a page at a time."""
+        for row in self.iter_rows(batch_size):
+            yield row["id"]
+
+    def count(self) -> int:
+        return self.backend.count()
+
+    def seed(self, records: dict[str, dict]) -> None:
+        """Load records only when the store is empty (e.g. sample_data on first start)."""
+        if self.count() == 0:
+            self.upsert_many(records)
+
+
+repository = PatientRepository.from_env()
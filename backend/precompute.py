@@ -0,0 +1,249 @@
+"""
+Background precompute of patient contraindications, so opening a dashboard is a
+cache hit instead of an FDA + Gemini round trip.
+
+Started from the FastAPI lifespan when PRECOMPUTE_ENABLED is set. A sweeper walks the
+patient store every PRECOMPUTE_SWEEP_INTERVAL seconds; repository writes and FDA label
+changes queue the affected patients straight away. Workers take patients in priority
+order (appointment today, changed, appointment soon, routine sweep) and charge every
+upstream call they make to the FDA and Gemini rate budgets (see budget.py). With a
+compute_batch function, a worker takes up to PRECOMPUTE_BATCH_SIZE queued patients at
+once so their Gemini work shares calls.
+
+Appointments are read from an optional "appointments" list (ISO dates or datetimes,
+or dicts with "date" / "start") or "next_appointment" field on the patient record.
+"""
+import asyncio
+import itertools
+import os
+from datetime import date, timedelta
+
+from budget import RateBudget, use_budgets
+
+PRECOMPUTE_ENABLED = os.getenv("PRECOMPUTE_ENABLED", "false").lower() in ("1", "true", "yes")
+PRECOMPUTE_WORKERS = int(os.getenv("PRECOMPUTE_WORKERS", "2"))
+PRECOMPUTE_SWEEP_INTERVAL = float(os.getenv("PRECOMPUTE_SWEEP_INTERVAL", "3600"))
+PRECOMPUTE_LOOKAHEAD_DAYS = int(os.getenv("PRECOMPUTE_LOOKAHEAD_DAYS", "2"))
+PRECOMPUTE_FDA_PER_MINUTE = float(os.getenv("PRECOMPUTE_FDA_PER_MINUTE", "60"))
+PRECOMPUTE_GEMINI_PER_MINUTE = float(os.getenv("PRECOMPUTE_GEMINI_PER_MINUTE", "10"))
+PRECOMPUTE_BATCH_SIZE = int(os.getenv("PRECOMPUTE_BATCH_SIZE", "10"))
+
+PRIORITY_TODAY = 0
+PRIORITY_CHANGED = 1
+PRIORITY_SOON = 2
+PRIORITY_SWEEP = 3
+
+
+def _appointment_dates(record: dict) -> list[date]:
+    values = list(record.get("appointments") or [])
+    if record.get("next_appointment"):
+        values.append(record["next_appointment"])
+    dates = []
+    for value in values:
+        if isinstance(value, dict):
+            value = value.get("date") or value.get("start")
+        try:
+            dates.append(date.fromisoformat(str(value)[:10]))
+        except ValueError:
+            continue
+    return dates
+
+
+def appointment_priority(record: dict | None, today: date | None = None) -> int:
+    """PRIORITY_TODAY / PRIORITY_SOON from the record's appointments, else PRIORITY_SWEEP."""
+    if not record:
+        return PRIORITY_SWEEP
+    today = today or date.today()
+    dates = _appointment_dates(record)
+    if today in dates:
+        return PRIORITY_TODAY
+    if any(today < d <= today + timedelta(days=PRECOMPUTE_LOOKAHEAD_DAYS) for d in dates):
+        return PRIORITY_SOON
+    return PRIORITY_SWEEP
+
+
+class PrecomputeScheduler:
+    """
+    Priority queue of patient ids drained by a bounded worker pool.
+
+    compute(patient_id, force) returns (drug keys the result depends on, whether it
+    recomputed): without force it may skip a patient whose cached result is still
+    valid. The keys let a later label change requeue exactly the affected patients.
+    compute_batch([(patient_id, force), ...]), when given, does the same for several
+    patients and returns {patient_id: (drug keys, recomputed)}.
+    """
+
+    def __init__(
+        self,
+        repository,
+        compute,
+        workers: int = PRECOMPUTE_WORKERS,
+        budgets: dict | None = None,
+        compute_batch=None,
+        batch_size: int = PRECOMPUTE_BATCH_SIZE,
+    ):
+        self.repository = repository
+        self.compute = compute
+        self.compute_batch = compute_batch
+        self.batch_size = max(1, batch_size)
+        self.workers = max(1, workers)
+        self.budgets = budgets if budgets is not None else {
+            "fda": RateBudget(PRECOMPUTE_FDA_PER_MINUTE),
+            "gemini": RateBudget(PRECOMPUTE_GEMINI_PER_MINUTE),
+        }
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._queue: asyncio.PriorityQueue | None = None
+        self._tasks: list[asyncio.Task] = []
+        self._pending: dict[str, int] = {}
+        self._forced: set[str] = set()
+        self._patients_by_drug: dict[str, set[str]] = {}
+        self._drugs_by_patient: dict[str, set[str]] = {}
+        self._seq = itertools.count()
+        self.completed = 0
+        self.skipped = 0
+        self.failed = 0
+        self.last_error: str | None = None
+
+    @property
+    def running(self) -> bool:
+        return bool(self._tasks)
+
+    def start(self) -> None:
+        if self._tasks:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._queue = asyncio.PriorityQueue()
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        self._tasks.append(asyncio.create_task(self._sweeper()))
+
+    async def stop(self) -> None:
+        tasks, self._tasks = self._tasks, []
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._queue, self._loop = None, None
+        self._pending.clear()
+        self._forced.clear()
+
+    # ---- queueing ------------------------------------------------------------
+
+    def enqueue(self, patient_id: str, priority: int = PRIORITY_SWEEP, force: bool = False) -> None:
+        """Queue a patient (event-loop thread only); a queued patient only ever moves up."""
+        if self._queue is None:
+            return
+        if force:
+            self._forced.add(patient_id)
+        current = self._pending.get(patient_id)
+        if current is not None and current <= priority:
+            return
+        self._pending[patient_id] = priority
+        self._queue.put_nowait((priority, next(self._seq), patient_id))
+
+    def _enqueue_threadsafe(self, patient_id: str, priority: int, force: bool) -> None:
+        loop = self._loop
+        if loop is None or loop.is_closed():
+            return
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is loop:
+            self.enqueue(patient_id, priority, force)
+        else:
+            loop.call_soon_threadsafe(self.enqueue, patient_id, priority, force)
+
+    def on_patient_change(self, patient_id: str, record: dict | None) -> None:
+        """PatientRepository listener (may run on any thread)."""
+        if record is None:
+            for key in self._drugs_by_patient.pop(patient_id, ()):
+                self._patients_by_drug.get(key, set()).discard(patient_id)
+            return
+        priority = min(PRIORITY_CHANGED, appointment_priority(record))
+        self._enqueue_threadsafe(patient_id, priority, False)
+
+    def on_label_change(self, drug_key: str) -> None:
+        """openfda label listener: recompute every patient whose result used this label."""
+        for patient_id in list(self._patients_by_drug.get(drug_key, ())):
+            self._enqueue_threadsafe(patient_id, PRIORITY_CHANGED, True)
+
+    # ---- tasks -----------------------------------------------------------------
+
+    async def _sweeper(self) -> None:
+        while True:
+            today = date.today()
+
+            def scan() -> list[tuple[str, int]]:
+                return [
+                    (pid, appointment_priority(self.repository.get(pid), today))
+                    for pid in self.repository.iter_ids()
+                ]
+
+            try:
+                for patient_id, priority in await asyncio.to_thread(scan):
+                    self.enqueue(patient_id, priority)
+            except Exception as e:
+                self.last_error = f"sweep: {e!r}"
+            await asyncio.sleep(PRECOMPUTE_SWEEP_INTERVAL)
+
+    def _take(self, item: tuple[int, int, str]) -> tuple[str, bool] | None:
+        """(patient_id, force) for a dequeued entry, or None if a higher-priority entry superseded it."""
+        priority, _, patient_id = item
+        if self._pending.get(patient_id) != priority:
+            return None
+        del self._pending[patient_id]
+        force = patient_id in self._forced
+        self._forced.discard(patient_id)
+        return patient_id, force
+
+    async def _worker(self) -> None:
+        use_budgets(self.budgets)
+        while True:
+            first = self._take(await self._queue.get())
+            if first is None:
+                continue
+            batch = [first]
+            while self.compute_batch is not None and len(batch) < self.batch_size and not self._queue.empty():
+                taken = self._take(self._queue.get_nowait())
+                if taken is not None:
+                    batch.append(taken)
+            try:
+                if len(batch) > 1:
+                    outcomes = await self.compute_batch(batch)
+                else:
+                    outcomes = {first[0]: await self.compute(*first)}
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.failed += len(batch)
+                self.last_error = f"{', '.join(pid for pid, _ in batch)}: {e!r}"
+                continue
+            for patient_id, _ in batch:
+                if patient_id not in outcomes:
+                    self.failed += 1
+                    continue
+                drug_keys, computed = outcomes[patient_id]
+                if computed:
+                    self.completed += 1
+                else:
+                    self.skipped += 1
+                self._track(patient_id, set(drug_keys))
+
+    def _track(self, patient_id: str, drug_keys: set[str]) -> None:
+        for key in self._drugs_by_patient.get(patient_id, set()) - drug_keys:
+            self._patients_by_drug.get(key, set()).discard(patient_id)
+        for key in drug_keys:
+            self._patients_by_drug.setdefault(key, set()).add(patient_id)
+        self._drugs_by_patient[patient_id] = drug_keys
+
+    def stats(self) -> dict:
+        return {
+            "running": self.running,
+            "workers": self.workers,
+            "batch_size": self.batch_size if self.compute_batch is not None else 1,
+            "queued": len(self._pending),
+            "completed": self.completed,
+            "skipped": self.skipped,
+            "failed": self.failed,
+            "last_error": self.last_error,
+            "budgets": {name: b.stats() for name, b in self.budgets.items()},
+        }
@@ -0,0 +1,238 @@
+"""
+Shared protection for upstream calls (OpenFDA, Gemini): a circuit breaker per upstream,
+bounded retries with jittered exponential backoff on 429 / 5xx / transport errors, and
+optional hedging (a second identical request once the first has run past the upstream's
+observed p95 latency). Every Upstream registers itself so /metrics can report them all.
+
+Settings are per upstream, read from <PREFIX>_RETRIES, <PREFIX>_BACKOFF_BASE,
+<PREFIX>_BACKOFF_MAX, <PREFIX>_BREAKER_FAILURES, <PREFIX>_BREAKER_RESET and <PREFIX>_HEDGE.
+"""
+import asyncio
+import os
+import random
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable
+
+import httpx
+
+RETRY_STATUSES = frozenset((429, 500, 502, 503, 504))
+# Latency samples kept per upstream, and how many are needed before hedging starts
+LATENCY_WINDOW = 200
+HEDGE_MIN_SAMPLES = 20
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+_upstreams: dict[str, "Upstream"] = {}
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling an upstream whose breaker is open."""
+
+    def __init__(self, upstream: str, retry_in: float):
+        super().__init__(f"{upstream} unavailable (circuit open, retry in {retry_in:.0f}s)")
+        self.upstream = upstream
+        self.retry_in = retry_in
+
+
+def is_transient_error(exc: BaseException) -> bool:
+    """Timeouts, connection failures and API errors carrying a 429 / 5xx code."""
+    # google.api_core errors (Gemini) carry the HTTP status as .code
+    code = getattr(exc, "code", None)
+    if isinstance(code, int) and code in RETRY_STATUSES:
+        return True
+    return isinstance(exc, (httpx.TransportError, asyncio.TimeoutError, ConnectionError))
+
+
+def is_transient_response(response: Any) -> bool:
+    """An HTTP response worth retrying (rate limited or server error)."""
+    return getattr(response, "status_code", None) in RETRY_STATUSES
+
+
+def _retry_after(response: Any) -> float | None:
+    headers = getattr(response, "headers", None)
+    try:
+        return float(headers.get("retry-after")) if headers is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+class Upstream:
+    """
+    Breaker, retry and hedging policy for one upstream service.
+
+    The breaker opens after `breaker_failures` consecutive failed calls (a call fails
+    once its retries are spent on transient errors) and fails calls fast with
+    CircuitOpenError for `breaker_reset` seconds; then one probe call, without
+    retries, is let through (half-open) and its outcome closes or reopens it.
+    Non-transient exceptions (bad requests, bugs) count neither way.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        prefix: str,
+        retries: int = 2,
+        backoff_base: float = 0.25,
+        backoff_max: float = 4.0,
+        breaker_failures: int = 5,
+        breaker_reset: float = 30.0,
+        hedge: bool = False,
+    ):
+        def env(key: str, default):
+            return type(default)(os.getenv(f"{prefix}_{key}", str(default)))
+
+        self.name = name
+        self.retries = env("RETRIES", retries)
+        self.backoff_base = env("BACKOFF_BASE", backoff_base)
+        self.backoff_max = env("BACKOFF_MAX", backoff_max)
+        self.breaker_failures = env("BREAKER_FAILURES", breaker_failures)
+        self.breaker_reset = env("BREAKER_RESET", breaker_reset)
+        self.hedge = os.getenv(f"{prefix}_HEDGE", str(hedge)).lower() in ("1", "true", "yes")
+        self.state = CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        # Token of the half-open probe call in flight, so only that call can release it
+        self._probe: object | None = None
+        self._latencies: deque[float] = deque(maxlen=LATENCY_WINDOW)
+        self.counts = {
+            "calls": 0, "succeeded": 0, "failed": 0, "retries": 0,
+            "rejected": 0, "opened": 0, "hedged": 0, "hedge_won": 0,
+        }
+        _upstreams[name] = self
+
+    # ---- breaker ---------------------------------------------------------------
+
+    def _admit(self) -> tuple[bool, object | None]:
+        """Whether a call may go out now, and its probe token when it is the half-open probe."""
+        if self.state == OPEN:
+            if time.monotonic() - self._opened_at < self.breaker_reset:
+                return False, None
+            self.state, self._probe = HALF_OPEN, None
+        if self.state == HALF_OPEN:
+            if self._probe is not None:
+                return False, None
+            self._probe = object()
+            return True, self._probe
+        return True, None
+
+    def _on_success(self, latency: float) -> None:
+        self._latencies.append(latency)
+        self._failures = 0
+        self.state, self._probe = CLOSED, None
+
+    def _on_failure(self) -> None:
+        self._failures += 1
+        if self.state == HALF_OPEN or self._failures >= self.breaker_failures:
+            if self.state != OPEN:
+                self.counts["opened"] += 1
+            self.state, self._opened_at, self._probe = OPEN, time.monotonic(), None
+
+    def _reject(self) -> CircuitOpenError:
+        self.counts["rejected"] += 1
+        return CircuitOpenError(self.name, max(0.0, self.breaker_reset - (time.monotonic() - self._opened_at)))
+
+    # ---- calls -------------------------------------------------------------------
+
+    def p95(self) -> float | None:
+        if len(self._latencies) < HEDGE_MIN_SAMPLES:
+            return None
+        ordered = sorted(self._latencies)
+        return ordered[int(0.95 * (len(ordered) - 1))]
+
+    async def call(self, fn: Callable[[], Awaitable[Any]], retry_result: Callable[[Any], bool] = is_transient_response) -> Any:
+        """
+        Await fn() under this upstream's policy. fn must be safe to call more than once
+        (it is retried and, with hedging on, may run twice at the same time).
+        A result for which retry_result is true (e.g. a 503 response) and transient
+        exceptions are retried; once retries run out the last such result is returned,
+        or the last exception raised. Raises CircuitOpenError without calling fn while
+        the breaker is open.
+        """
+        admitted, probe = self._admit()
+        if not admitted:
+            raise self._reject()
+        self.counts["calls"] += 1
+        try:
+            return await self._call(fn, retry_result, probe is not None)
+        finally:
+            # A probe that ended without an outcome (cancelled, or a non-transient error)
+            # lets the next call probe instead; no other call can release it
+            if probe is not None and self._probe is probe:
+                self._probe = None
+
+    async def _call(self, fn: Callable[[], Awaitable[Any]], retry_result: Callable[[Any], bool], probe: bool) -> Any:
+        attempt = 0
+        while True:
+            started = time.monotonic()
+            try:
+                result = await self._attempt(fn, retry_result)
+            except Exception as e:
+                if not is_transient_error(e):
+                    # Not the upstream failing (a bad request, a bug): neither success nor failure
+                    raise
+                result, error = None, e
+            else:
+                if not retry_result(result):
+                    self._on_success(time.monotonic() - started)
+                    self.counts["succeeded"] += 1
+                    return result
+                error = None
+            if attempt >= self.retries or probe or self.state == OPEN:
+                # One failure per call, however many attempts it made
+                self._on_failure()
+                self.counts["failed"] += 1
+                if error is not None:
+                    raise error
+                return result
+            attempt += 1
+            self.counts["retries"] += 1
+            # Full jitter; a server-sent Retry-After is honoured up to backoff_max
+            delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+            wait = _retry_after(result)
+            if wait is not None:
+                delay = max(delay, min(wait, self.backoff_max))
+            await asyncio.sleep(delay)
+
+    async def _attempt(self, fn: Callable[[], Awaitable[Any]], retry_result: Callable[[Any], bool]) -> Any:
+        """One try; with hedging on, a second copy starts if the first outlives p95."""
+        threshold = self.p95() if self.hedge else None
+        if threshold is None:
+            return await fn()
+        first = asyncio.ensure_future(fn())
+        tasks = {first}
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=threshold)
+            if done:
+                return first.result()
+            self.counts["hedged"] += 1
+            second = asyncio.ensure_future(fn())
+            tasks = {first, second}
+            while tasks:
+                done, tasks = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    # Prefer a usable answer; fall back to whichever failure came last
+                    if task.exception() is None and not retry_result(task.result()):
+                        if task is second:
+                            self.counts["hedge_won"] += 1
+                        return task.result()
+            return first.result() if first.exception() is None else second.result()
+        finally:
+            # Also reached when the caller is cancelled while waiting, hedged or not
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+
+    def stats(self) -> dict:
+        p95 = self.p95()
+        return {
+            "state": self.state,
+            "consecutive_failures": self._failures,
+            "p95_ms": round(1000 * p95, 1) if p95 is not None else None,
+            "hedge": self.hedge,
+            **self.counts,
+        }
+
+
+def upstream_stats() -> dict:
+    return {name: u.stats() for name, u in _upstreams.items()}
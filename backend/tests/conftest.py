@@ -0,0 +1,14 @@
+import os
+import sys
+
+# Backend modules import each other flat (`from cache import ...`), as when run from backend/
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Keep tests off the network and off any developer .env (load_dotenv never overrides these)
+for _key in (
+    "GEMINI_API_KEY", "GEMINI_CACHE_DB", "FDA_LABEL_DB", "FDA_LABEL_INDEX", "FDA_SYNONYM_DB",
+    "FDA_INTERACTIONS_DB", "FHIR_CACHE_DB", "JOB_STORE_DB",
+):
+    os.environ[_key] = ""
+os.environ["PATIENT_STORE"] = "memory"
+os.environ["PRECOMPUTE_ENABLED"] = "false"
@@ -0,0 +1,26 @@
+from cache import TTLCache
+
+
+def test_peek_leaves_lru_order_alone():
+    cache = TTLCache(2, 60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.peek("a") == 1
+    cache.set("c", 3)
+    # "a" was only peeked at, so it is still the least recently used
+    assert "a" not in cache and cache.peek("b") == 2
+    assert cache.peek("missing", "default") == "default"
+
+
+def test_get_counts_hits_misses_evictions_and_expirations():
+    cache = TTLCache(2, 60)
+    cache.set("a", 1)
+    cache.set("negative", {"error": "none"}, ttl=0)
+    assert cache.get("a") == 1
+    assert cache.get("negative") is None
+    cache.set("b", 2)
+    cache.set("c", 3)
+    assert cache.get("a") is None
+    assert cache.stats() == {
+        "size": 2, "maxsize": 2, "hits": 1, "misses": 2, "evictions": 1, "expirations": 1,
+    }
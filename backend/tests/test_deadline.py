@@ -0,0 +1,100 @@
+import asyncio
+
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+from cache import TTLCache
+
+
+@pytest.fixture
+def contraindications(monkeypatch):
+    """Patient whose one FDA entry needs Gemini; gemini_delay sets how long Gemini takes."""
+    monkeypatch.setattr(main, "contraindication_results", TTLCache(64, 60))
+    monkeypatch.setattr(main, "contraindication_prior", TTLCache(64, 60))
+    monkeypatch.setattr(main, "contraindication_deadline_counts", {"on_time": 0, "prior": 0, "local": 0})
+    monkeypatch.setattr(main, "CONTRAINDICATION_DEADLINE", 0.05)
+    patient_id = next(iter(main.repository.iter_ids()))
+    entry = {"label": "Warfarin", "severity": "", "items": ["raw label text"]}
+    state = {"gemini_delay": 0.0, "gemini_calls": 0}
+
+    async def prepare(pid):
+        ask = dict(entry)
+        return {
+            "patient_name": "P", "medication_names": ["Warfarin"], "history_text": "", "family_text": "",
+            "decided": [("ask", ask)], "ambiguous": [ask],
+        }
+
+    async def gemini(**kwargs):
+        state["gemini_calls"] += 1
+        await asyncio.sleep(state["gemini_delay"])
+        return [{**entry, "severity": "SEVERE", "items": ["filtered"]}]
+
+    monkeypatch.setattr(main, "_prepare_contraindications", prepare)
+    monkeypatch.setattr(main, "filter_and_summarize_contraindications_async", gemini)
+    return patient_id, state
+
+
+def test_answer_within_deadline_is_final(contraindications):
+    patient_id, _ = contraindications
+    results, provisional = asyncio.run(main._contraindications_within_deadline(patient_id))
+    assert not provisional and results[0]["items"] == ["filtered"]
+    assert main.contraindication_deadline_counts["on_time"] == 1
+
+
+def test_missed_deadline_serves_local_triage_then_the_finished_result(contraindications):
+    patient_id, state = contraindications
+    state["gemini_delay"] = 0.2
+
+    async def scenario():
+        first = await main._contraindications_within_deadline(patient_id)
+        # Gemini carries on in the background and fills the result cache
+        await asyncio.sleep(0.3)
+        second = await main._contraindications_within_deadline(patient_id)
+        return first, second
+
+    (results, provisional), (later, later_provisional) = asyncio.run(scenario())
+    assert provisional and results[0]["items"] == ["raw label text"]
+    assert not later_provisional and later[0]["items"] == ["filtered"]
+    assert state["gemini_calls"] == 1
+    assert main.contraindication_deadline_counts["local"] == 1
+
+
+def test_missed_deadline_prefers_prior_result_for_same_medications(contraindications):
+    patient_id, state = contraindications
+    record = main.repository.get(patient_id)
+    main.contraindication_prior.set(
+        patient_id, {"medications": main._medications_key(record), "results": ["previous answer"]}
+    )
+    state["gemini_delay"] = 0.2
+
+    async def scenario():
+        result = await main._contraindications_within_deadline(patient_id)
+        await asyncio.sleep(0.3)
+        return result
+
+    assert asyncio.run(scenario()) == (["previous answer"], True)
+    assert main.contraindication_deadline_counts["prior"] == 1
+
+
+def test_prior_result_for_other_medications_is_not_reused(contraindications):
+    patient_id, state = contraindications
+    main.contraindication_prior.set(patient_id, {"medications": "stale", "results": ["previous answer"]})
+    state["gemini_delay"] = 0.2
+
+    async def scenario():
+        result = await main._contraindications_within_deadline(patient_id)
+        await asyncio.sleep(0.3)
+        return result
+
+    results, provisional = asyncio.run(scenario())
+    assert provisional and results != ["previous answer"]
+
+
+def test_provisional_header(contraindications):
+    patient_id, state = contraindications
+    state["gemini_delay"] = 0.2
+    client = TestClient(main.app)
+    response = client.get(f"/patient/{patient_id}/contraindications")
+    assert response.status_code == 200
+    assert response.headers["X-Provisional"] == "true"
@@ -0,0 +1,67 @@
+import pytest
+
+from drug_names import DrugSynonyms, display_name, ingredient_key, strip_strength
+
+
+@pytest.mark.parametrize("name, expected", [
+    ("Lisinopril 10 MG Oral Tablet", "lisinopril"),
+    ("lisinopril 10 MG Oral Tablet [Zestril]", "lisinopril"),
+    ("metformin HCl 500 mg", "metformin"),
+    ("Losartan Potassium 50 MG Oral Tablet", "losartan"),
+    ("Metoprolol succinate ER 25 mg", "metoprolol"),
+    ("Naproxen sodium", "naproxen"),
+    ("potassium chloride 20 mEq", "potassium chloride"),
+    ("vitamin b12", "vitamin b12"),
+    ("Oral Solution", "oral solution"),
+])
+def test_strip_strength(name, expected):
+    assert strip_strength(name) == expected
+
+
+@pytest.mark.parametrize("name, expected", [
+    # The salt is the drug: nothing precedes it that could be the moiety
+    ("Calcium carbonate", "calcium carbonate"),
+    ("Magnesium oxide", "magnesium oxide"),
+    ("Ferrous sulfate 325 mg", "ferrous sulfate"),
+    ("Sodium bicarbonate", "sodium bicarbonate"),
+    ("zinc sulfate", "zinc sulfate"),
+    # A hyphenated number is part of the name, not a strength
+    ("Omega-3", "omega-3"),
+    ("Omega-3 fatty acids 1 g capsule", "omega-3 fatty acids"),
+    # #N designates a different product (acetaminophen with codeine), not a strength
+    ("Tylenol #3", "tylenol #3"),
+    ("Tylenol with Codeine #4", "tylenol with codeine #4"),
+    ("Tylenol #3 300 mg / 30 mg tablet", "tylenol #3"),
+])
+def test_strip_strength_keeps_salt_and_mineral_drugs(name, expected):
+    assert strip_strength(name) == expected
+
+
+def test_combination_strengths_are_stripped():
+    assert strip_strength("hydrocodone bitartrate and acetaminophen 5-325 mg") == "hydrocodone bitartrate and acetaminophen"
+
+
+def test_display_name_keeps_original_casing():
+    assert display_name("Ferrous Sulfate 325 MG Oral Tablet") == "Ferrous Sulfate"
+    assert display_name("Metformin HCl 500 mg") == "Metformin"
+
+
+def test_ingredient_key_sorts_combination_ingredients():
+    assert ingredient_key("Sitagliptin and Metformin Hydrochloride") == "metformin / sitagliptin"
+
+
+def test_synonyms_map_brand_to_ingredient(tmp_path):
+    path = str(tmp_path / "synonyms.db")
+    synonyms = DrugSynonyms(path)
+    key = synonyms.learn_label({"name": {"generic": ["LISINOPRIL"], "brand": ["Zestril"]}})
+    synonyms.close()
+    reopened = DrugSynonyms(path)
+    assert key == "lisinopril"
+    assert reopened.canonical("ZESTRIL 10 mg tablet") == "lisinopril"
+    assert reopened.canonical("Calcium carbonate") == "calcium carbonate"
+
+
+def test_numbered_products_keep_their_own_key():
+    synonyms = DrugSynonyms()
+    assert synonyms.canonical("Tylenol #3") != synonyms.canonical("Tylenol")
+    assert synonyms.canonical("Tylenol with Codeine #4") != synonyms.canonical("Tylenol with Codeine #3")
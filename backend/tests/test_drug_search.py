@@ -0,0 +1,32 @@
+from drug_search import DrugNameIndex
+
+
+def test_drug_index_ranks_whole_name_prefix_then_popularity():
+    index = DrugNameIndex()
+    index.add_many([
+        ("Aspirin", "generic", 40),
+        ("Aspirin and Extended-Release Dipyridamole", "generic", 2),
+        ("Bayer Aspirin", "brand", 10),
+        ("Aspercreme", "brand", 5),
+    ])
+    index.add_label({"name": {"brand": ["ASPIRIN"], "generic": ["N/A"]}})
+    names = [(r["name"], r["kind"]) for r in index.search("aspi")]
+    assert names[0] == ("Aspirin", "generic")
+    assert ("Aspirin and Extended-Release Dipyridamole", "generic") in names
+    # Word-prefix matches come after whole-name prefixes
+    assert names[-1] == ("Bayer Aspirin", "brand")
+    assert [r["name"] for r in index.search("aspirin", limit=2)] == ["Aspirin", "ASPIRIN"]
+    assert index.search("") == []
+
+
+def test_words_inside_a_name_are_searchable_and_duplicates_merge():
+    index = DrugNameIndex()
+    assert index.add_many([("Acetaminophen and Codeine", "generic", 3), ("Codeine", "generic", 1)]) == 2
+    assert index.add_many([("ACETAMINOPHEN  AND CODEINE", "generic", 7)]) == 0
+    index.add("Codeine", "brand")
+    assert len(index) == 3
+    results = index.search("cod")
+    assert [(r["name"], r["kind"]) for r in results] == [
+        ("Codeine", "brand"), ("Codeine", "generic"), ("Acetaminophen and Codeine", "generic"),
+    ]
+    assert results[-1]["labels"] == 7
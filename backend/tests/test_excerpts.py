@@ -0,0 +1,45 @@
+from excerpts import approx_tokens, excerpt_sections, relevance_terms
+
+TERMS = relevance_terms(["Warfarin 5 MG", "Aspirin 81 MG"], ["- Visit (2024): hypertension"])
+
+ASPIRIN = [
+    "Aspirin may be taken with or without food in most adults. "
+    "Concomitant use with warfarin increases the risk of bleeding; monitor closely. "
+    "Store the tablets at room temperature away from moisture and light."
+]
+WARFARIN = [
+    "Keep this and all medicines out of the reach of children at all times. "
+    "NSAIDs such as aspirin may cause fatal bleeding when combined with this drug."
+]
+
+
+def _tokens(sections):
+    return sum(approx_tokens(s) for entry in sections for s in entry)
+
+
+def test_best_sentences_first_then_the_rest_of_the_budget_in_label_order():
+    out = excerpt_sections([ASPIRIN, WARFARIN], TERMS, 1000, labels=["Aspirin 81 MG", "Warfarin 5 MG"])
+    assert out[0] == ["Concomitant use with warfarin increases the risk of bleeding; monitor closely."]
+    assert out[1] == ["NSAIDs such as aspirin may cause fatal bleeding when combined with this drug."]
+
+    # Without labels a drug scores on mentions of itself, pulling in its low-value sentences
+    unlabeled = excerpt_sections([ASPIRIN], TERMS, 1000)
+    assert unlabeled[0][0].startswith("Aspirin may be taken")
+
+
+def test_every_entry_gets_its_best_sentence_within_the_budget():
+    sections = [ASPIRIN, WARFARIN, ["Use with caution with CYP3A4 inhibitors such as ketoconazole and warfarin."]]
+    labels = ["Aspirin 81 MG", "Warfarin 5 MG", "Simvastatin 20 MG"]
+    budget = 30
+    out = excerpt_sections(sections, TERMS, budget, labels=labels)
+    assert all(out)
+    assert _tokens(out) <= budget
+    assert out[0][0].startswith("Concomitant use with warfarin")
+    assert out[1][0].startswith("NSAIDs such as aspirin")
+
+
+def test_entry_without_a_usable_sentence_falls_back_to_its_text_within_the_budget():
+    out = excerpt_sections([["See full prescribing information."], ["N/A " * 300]], TERMS, 20)
+    assert out[0] == ["See full prescribing information."]
+    assert out[1] and _tokens(out) <= 20
+    assert excerpt_sections([[]], TERMS, 20) == [[]]
@@ -0,0 +1,133 @@
+import asyncio
+import json
+
+import httpx
+import pytest
+
+import fhir
+import fhir_bulk
+from cache import TTLCache
+from patients import repository
+from sample_data import sample_data
+
+BASE = "https://fhir.test"
+
+
+def _ndjson(*resources):
+    return "\n".join(json.dumps(r) for r in resources) + "\n"
+
+
+def _patient(pid, given, family):
+    return {"resourceType": "Patient", "id": pid, "birthDate": "1970-01-01", "name": [{"given": [given], "family": family}]}
+
+
+def _medication(rid, pid, text):
+    return {
+        "resourceType": "MedicationStatement", "id": rid, "status": "active",
+        "subject": {"reference": f"Patient/{pid}"}, "medicationCodeableConcept": {"text": text},
+    }
+
+
+def _condition(rid, pid, text):
+    return {"resourceType": "Condition", "id": rid, "subject": {"reference": f"Patient/{pid}"}, "code": {"text": text}}
+
+
+@pytest.fixture
+def ingest(monkeypatch):
+    # A one-entry sync cache: every patient but the last one touched is evicted
+    monkeypatch.setattr(fhir, "patient_cache", TTLCache(1, 60))
+    monkeypatch.setattr(fhir, "_patient_db", None)
+    monkeypatch.setattr(fhir_bulk, "FHIR_BULK_BATCH_SIZE", 2)
+
+    def run(files: dict[str, str]):
+        def handler(request: httpx.Request) -> httpx.Response:
+            return httpx.Response(200, text=files[request.url.path.rsplit("/", 1)[-1]])
+
+        manifest = {
+            "transactionTime": "2026-01-01T00:00:00Z",
+            # Listed out of order on purpose: Patient files are applied first
+            "output": [{"type": t, "url": f"{BASE}/files/{t}"} for t in reversed(list(files))],
+        }
+
+        async def go():
+            async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+                return await fhir_bulk.ingest_manifest(client, manifest, log=lambda *_: None)
+
+        return asyncio.run(go())
+
+    yield run
+    for pid in [pid for pid in repository.iter_ids() if pid.startswith("bulk-")]:
+        repository.delete(pid)
+
+
+def test_ndjson_export_is_streamed_into_the_repository(ingest):
+    counts = ingest({
+        "Patient": _ndjson(_patient("bulk-1", "Ada", "Lovelace"), _patient("bulk-2", "Alan", "Turing"), _patient("bulk-3", "Grace", "Hopper")),
+        "Condition": _ndjson(_condition("c1", "bulk-1", "Hypertension")),
+        "MedicationStatement": _ndjson(
+            _medication("m1", "bulk-1", "Lisinopril 10 MG Oral Tablet"),
+            _medication("m2", "bulk-2", "Metformin 500 mg"),
+            _medication("m3", "bulk-1", "Aspirin 81 mg"),
+        ),
+    })
+    assert counts == {"Patient": 3, "Condition": 1, "MedicationStatement": 3}
+    first = repository.get("bulk-1")
+    assert first["name"] == "Ada Lovelace" and first["patientDOB"] == "1970-01-01"
+    assert [h["label"] for h in first["patient_history"]] == ["Hypertension"]
+    assert [m["label"] for m in first["current_medications"]] == ["Lisinopril", "Aspirin"]
+    assert repository.get("bulk-2")["name"] == "Alan Turing"
+    assert repository.get("bulk-3")["name"] == "Grace Hopper"
+
+
+def test_evicted_sync_state_falls_back_to_the_stored_record(ingest):
+    ingest({"Patient": _ndjson(_patient("bulk-4", "Katherine", "Johnson"), _patient("bulk-5", "Mary", "Jackson"))})
+    ingest({"MedicationStatement": _ndjson(_medication("m4", "bulk-4", "Warfarin 5 mg"))})
+    record = repository.get("bulk-4")
+    assert record["name"] == "Katherine Johnson"
+    assert [m["label"] for m in record["current_medications"]] == ["Warfarin"]
+
+
+def test_resent_resource_replaces_the_rebuilt_entry(ingest):
+    ingest({"Patient": _ndjson(_patient("bulk-6", "Edsger", "Dijkstra"))})
+    ingest({"Condition": _ndjson(_condition("c6", "bulk-6", "Asthma"))})
+    fhir.patient_cache.clear()
+    ingest({"Condition": _ndjson(_condition("c6", "bulk-6", "Asthma"))})
+    assert [h["label"] for h in repository.get("bulk-6")["patient_history"]] == ["Asthma"]
+
+
+def test_record_round_trips_through_from_record():
+    builder = fhir.PatientRecordBuilder("p")
+    for resource in (
+        _patient("p", "Ada", "Lovelace"),
+        _condition("c", "p", "Diabetes"),
+        _medication("m", "p", "Metformin HCl 500 mg"),
+    ):
+        builder.add(resource)
+    record = builder.to_dict()
+    assert fhir.PatientRecordBuilder.from_record("p", record).to_dict() == record
+
+
+def test_placeholders_are_replaced_without_rescanning_the_chart():
+    record = {"name": "Ada", "patient_history": [{"label": f"old {i}"} for i in range(3)], "source": "fhir"}
+    builder = fhir.PatientRecordBuilder.from_record("p", record)
+    for i in range(5000):
+        builder.add(_condition(f"c{i}", "p", f"new {i}"))
+    builder.add(_condition("c-old", "p", "old 1"))
+    assert len(builder.patient_history) == 5003
+    # Placeholders survive a save/load cycle and are still matched after it
+    builder = fhir.PatientRecordBuilder.from_state(builder.to_state())
+    builder.add(_condition("c-old0", "p", "old 0"))
+    assert "old 0" not in [v[0] for k, v in builder.patient_history.items() if k.startswith("_record")]
+    assert len(builder.patient_history) == 5003
+
+
+def test_records_from_other_sources_are_never_rebuilt():
+    patient_id, record = next(iter(sample_data.items()))
+    assert fhir.PatientRecordBuilder.from_record(patient_id, record) is None
+
+
+def test_ingest_leaves_non_fhir_patients_unchanged(ingest):
+    patient_id, record = next(iter(sample_data.items()))
+    repository.upsert(patient_id, record)
+    ingest({"Patient": _ndjson(_patient("bulk-7", "Barbara", "Liskov"))})
+    assert repository.get(patient_id) == record
@@ -0,0 +1,122 @@
+import asyncio
+
+import httpx
+import pytest
+
+import fhir
+from cache import TTLCache
+
+
+def _bundle(*resources):
+    return {"resourceType": "Bundle", "type": "searchset", "entry": [{"resource": r} for r in resources]}
+
+
+@pytest.fixture
+def server(monkeypatch):
+    monkeypatch.setattr(fhir, "patient_cache", TTLCache(16, 60))
+    monkeypatch.setattr(fhir, "_patient_db", None)
+    requests = []
+    responses = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        requests.append(request)
+        return responses.pop(0)
+
+    client = httpx.Client(transport=httpx.MockTransport(handler))
+    monkeypatch.setattr(fhir, "_sync_client", client)
+    yield requests, responses
+    client.close()
+
+
+def test_blocking_sync_fetches_once_then_sends_conditional_deltas(server):
+    requests, responses = server
+    responses.append(httpx.Response(200, json=_bundle(
+        {"resourceType": "Patient", "id": "p1", "name": [{"given": ["Ada"], "family": "Lovelace"}]},
+        {"resourceType": "Condition", "id": "c1", "code": {"text": "Asthma"}},
+    ), headers={"etag": 'W/"1"', "date": "Thu, 01 Jan 2026 12:00:00 GMT"}))
+    first = fhir.get_patient_info("p1")
+    assert first["name"] == "Ada Lovelace"
+
+    # Within FHIR_SYNC_MIN_INTERVAL the cached chart is served without a request
+    assert fhir.get_patient_info("p1") == first
+    assert len(requests) == 1
+
+    responses.append(httpx.Response(200, json=_bundle(
+        {"resourceType": "Condition", "id": "c2", "code": {"text": "Hypertension"}},
+    )))
+    entry = fhir.sync_patient_blocking("p1", force=True)
+    delta = requests[-1]
+    assert delta.headers["if-none-match"] == 'W/"1"'
+    assert delta.url.params["_since"] == "2026-01-01T11:59:00Z"
+    labels = [h["label"] for h in fhir.PatientRecordBuilder.from_state(entry["state"]).to_dict()["patient_history"]]
+    assert labels == ["Asthma", "Hypertension"]
+
+    responses.append(httpx.Response(304))
+    assert fhir.sync_patient_blocking("p1", force=True)["state"] == entry["state"]
+
+
+def test_blocking_and_async_sync_share_the_cache(server):
+    _, responses = server
+    responses.append(httpx.Response(200, json=_bundle({"resourceType": "Patient", "id": "p2", "birthDate": "1990-02-02"})))
+    fhir.get_patient_info("p2")
+    # A fresh entry: the async path answers from it without touching the network
+    assert asyncio.run(fhir.get_patient_info_async("p2"))["patientDOB"] == "1990-02-02"
+
+
+def _paged(next_url, *resources):
+    bundle = _bundle(*resources)
+    bundle["link"] = [{"relation": "self", "url": "x"}, {"relation": "next", "url": next_url}]
+    return bundle
+
+
+def test_blocking_sync_cut_short_by_max_pages_does_not_advance(server, monkeypatch):
+    requests, responses = server
+    monkeypatch.setattr(fhir, "FHIR_MAX_PAGES", 1)
+    responses.append(httpx.Response(200, json=_paged(
+        "https://fhir.test/page2", {"resourceType": "Condition", "id": "c1", "code": {"text": "Asthma"}},
+    ), headers={"etag": 'W/"1"', "date": "Thu, 01 Jan 2026 12:00:00 GMT"}))
+    entry = fhir.sync_patient_blocking("p3")
+    assert len(requests) == 1
+    # The pages fetched are kept, but the next sync pulls the same changes again
+    assert entry["state"]["patient_history"]
+    assert entry["last_sync"] is None and entry["etag"] is None
+
+    responses.append(httpx.Response(200, json=_bundle(
+        {"resourceType": "Condition", "id": "c2", "code": {"text": "Hypertension"}},
+    ), headers={"etag": 'W/"2"', "date": "Thu, 01 Jan 2026 13:00:00 GMT"}))
+    entry = fhir.sync_patient_blocking("p3", force=True)
+    assert "_since" not in requests[-1].url.params and "if-none-match" not in requests[-1].headers
+    assert entry["last_sync"] == "2026-01-01T12:59:00Z" and entry["etag"] == 'W/"2"'
+
+
+def test_async_iterator_follows_next_links_and_reports_truncation(monkeypatch):
+    pages = {
+        "https://fhir.test/Patient/p4/$everything": _paged(
+            "https://fhir.test/page2", {"resourceType": "Patient", "id": "p4"}
+        ),
+        "https://fhir.test/page2": _paged(
+            "https://fhir.test/page3", {"resourceType": "Condition", "id": "c1"}
+        ),
+    }
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        return httpx.Response(200, json=pages[str(request.url.copy_with(query=None))])
+
+    async def collect(info):
+        fhir._client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        try:
+            return [r["id"] async for r in fhir.iter_bundle_resources(
+                "https://fhir.test/Patient/p4/$everything", {"_count": 1}, None, info
+            )]
+        finally:
+            await fhir.close_client()
+
+    monkeypatch.setattr(fhir, "FHIR_MAX_PAGES", 2)
+    info = {}
+    assert asyncio.run(collect(info)) == ["p4", "c1"]
+    assert info["status"] == 200 and info["truncated"] is True
+
+    pages["https://fhir.test/page2"] = _bundle({"resourceType": "Condition", "id": "c1"})
+    info = {}
+    assert asyncio.run(collect(info)) == ["p4", "c1"]
+    assert "truncated" not in info
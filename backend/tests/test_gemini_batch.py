@@ -0,0 +1,118 @@
+import asyncio
+import json
+import re
+from types import SimpleNamespace
+
+import pytest
+
+import gemini
+from cache import TTLCache
+
+
+def _request(name, *drugs):
+    return {
+        "patient_name": name,
+        "medication_names": list(drugs),
+        "history_text": "",
+        "family_text": "",
+        "raw_results": [{"label": d, "severity": "", "items": [f"{d} label text"]} for d in drugs],
+        "patient_id": name.lower(),
+    }
+
+
+@pytest.fixture
+def model(monkeypatch):
+    """A fake Gemini: answers[patient name] is what it says for that patient, call by call."""
+    monkeypatch.setattr(gemini, "GEMINI_API_KEY", "test")
+    monkeypatch.setattr(gemini, "contraindication_cache", TTLCache(64, 60))
+    monkeypatch.setattr(gemini, "_contraindication_db", None)
+    monkeypatch.setattr(gemini, "batch_counts", {"calls": 0, "patients": 0, "retried": 0, "unfiltered": 0})
+    answers: dict[str, list] = {}
+    prompts: list[list[str]] = []
+
+    async def generate(prompt, temperature=None):
+        names = re.findall(r"=== (P\d+) ===\nPatient: (.+)", prompt)
+        prompts.append([name for _, name in names])
+        reply = {}
+        for label, name in names:
+            script = answers.get(name, [])
+            answer = script.pop(0) if len(script) > 1 else (script[0] if script else None)
+            if answer is not None:
+                reply[label] = answer
+        return SimpleNamespace(text="```json\n" + json.dumps(reply) + "\n```")
+
+    monkeypatch.setattr(gemini, "_generate_async", generate)
+    return answers, prompts
+
+
+def run(requests):
+    return asyncio.run(gemini.filter_and_summarize_contraindications_batch_async(requests))
+
+
+def test_each_patient_gets_only_its_own_answer(model):
+    answers, prompts = model
+    answers["Ann"] = [{"1": {"severity": "severe", "items": ["Avoid with warfarin."]}}]
+    answers["Bob"] = [{"0": {"severity": "LOW", "items": ["No significant drug interaction risks for this patient."]}}]
+    ann, bob = _request("Ann", "aspirin", "warfarin"), _request("Bob", "metformin")
+
+    out = run([ann, bob])
+
+    assert prompts == [["Ann", "Bob"]]
+    assert out[0] == [{**ann["raw_results"][1], "severity": "SEVERE", "items": ["Avoid with warfarin."]}]
+    assert [r["label"] for r in out[1]] == ["metformin"]
+    assert gemini.batch_counts["calls"] == 1 and gemini.batch_counts["patients"] == 2
+
+
+def test_answer_with_another_patients_indices_is_retried_alone(model):
+    answers, prompts = model
+    # Bob has one entry; index 1 can only have come from Ann's list
+    answers["Ann"] = [{"0": {"severity": "LOW", "items": ["ok"]}}]
+    answers["Bob"] = [{"1": {"severity": "SEVERE", "items": ["mixed up"]}}, {"0": {"severity": "MODERATE", "items": ["fine"]}}]
+
+    out = run([_request("Ann", "aspirin", "warfarin"), _request("Bob", "metformin")])
+
+    assert prompts == [["Ann", "Bob"], ["Bob"]]
+    assert out[1][0]["items"] == ["fine"]
+    assert gemini.batch_counts["retried"] == 1
+
+
+def test_patient_never_answered_gets_raw_results(model):
+    answers, _ = model
+    answers["Ann"] = [{"0": {"severity": "LOW", "items": ["ok"]}}]
+    bob = _request("Bob", "metformin")
+
+    out = run([_request("Ann", "aspirin"), bob])
+
+    assert out[1] is bob["raw_results"]
+    assert gemini.batch_counts["unfiltered"] == 1
+
+
+def test_unparseable_reply_retries_every_patient(model, monkeypatch):
+    _, prompts = model
+    calls = []
+
+    async def garbage(prompt, temperature=None):
+        calls.append(prompt)
+        return SimpleNamespace(text="not json")
+
+    monkeypatch.setattr(gemini, "_generate_async", garbage)
+    requests = [_request("Ann", "aspirin"), _request("Bob", "metformin")]
+    out = run(requests)
+    assert len(calls) == 1 + gemini.GEMINI_BATCH_RETRIES
+    assert [o is r["raw_results"] for o, r in zip(out, requests)] == [True, True]
+
+
+def test_batches_respect_the_patient_limit_and_skip_cached(model, monkeypatch):
+    answers, prompts = model
+    monkeypatch.setattr(gemini, "GEMINI_BATCH_MAX_PATIENTS", 2)
+    for name in ("Ann", "Bob", "Cy"):
+        answers[name] = [{"0": {"severity": "LOW", "items": [name]}}]
+    requests = [_request(n, "aspirin") for n in ("Ann", "Bob", "Cy")]
+
+    first = run(requests)
+    assert sorted(len(p) for p in prompts) == [1, 2]
+    assert [r[0]["items"] for r in first] == [["Ann"], ["Bob"], ["Cy"]]
+
+    # Answers are cached per patient: a second run makes no call
+    assert run(requests) == first
+    assert len(prompts) == 2
@@ -0,0 +1,67 @@
+from interactions import InteractionTable, mentions, triage
+
+WARFARIN = {
+    "interactions": [
+        "Concomitant use with aspirin may cause an increased risk of bleeding; monitor INR closely. "
+        "Avoid use with fluconazole; fatal bleeding has been reported."
+    ]
+}
+
+
+def test_mentions_keeps_the_most_severe_sentence_per_ingredient():
+    found, classes = mentions(WARFARIN["interactions"], {"aspirin": {"aspirin"}, "fluconazole": {"fluconazole"}})
+    assert found["aspirin"][0] == "MODERATE"
+    assert found["fluconazole"] == ("SEVERE", "Avoid use with fluconazole; fatal bleeding has been reported.")
+    assert classes is False
+
+    found, classes = mentions(["Use caution with CYP3A4 inhibitors."], {"aspirin": {"aspirin"}})
+    assert found == {} and classes is True
+
+
+def test_triage_keeps_entries_naming_a_co_medication():
+    decision, hits = triage("warfarin", WARFARIN, [("Aspirin 81 MG", "aspirin"), ("Fluconazole 150 MG", "fluconazole")])
+    assert decision == "keep"
+    assert [(other, sev) for other, sev, _ in hits] == [("Fluconazole 150 MG", "SEVERE"), ("Aspirin 81 MG", "MODERATE")]
+
+
+def test_triage_drops_unrelated_entries():
+    assert triage("warfarin", WARFARIN, [("Lisinopril 10 MG", "lisinopril")]) == ("drop", [])
+
+
+def test_triage_asks_for_classes_history_words_and_single_medications():
+    classes = {"interactions": ["Use caution with CYP3A4 inhibitors."]}
+    assert triage("warfarin", classes, [("Lisinopril 10 MG", "lisinopril")]) == ("ask", [])
+
+    alcohol = {"interactions": ["Alcohol may potentiate the hypotensive effect."]}
+    others = [("Lisinopril 10 MG", "lisinopril")]
+    assert triage("warfarin", alcohol, others) == ("drop", [])
+    assert triage("warfarin", alcohol, others, context_words={"alcohol", "hypertension"}) == ("ask", [])
+
+    # A patient on one medication still has history and conditions to weigh it against
+    assert triage("warfarin", WARFARIN, []) == ("ask", [])
+    assert triage("warfarin", {"interactions": ["N/A"]}, others) == ("ask", [])
+    assert triage("warfarin", {"error": "not found"}, others) == ("keep", [])
+
+
+def test_triage_uses_the_interaction_table(tmp_path):
+    table = InteractionTable(str(tmp_path / "interactions.db"))
+    try:
+        table.replace_all(
+            {("warfarin", "aspirin"): ("MODERATE", "Aspirin increases bleeding risk.")},
+            {"warfarin": [3, 0]},
+        )
+        assert table.profile("warfarin") == {"labels": 3, "mentions_classes": False}
+        assert table.profile("aspirin") is None
+        assert table.pairs(["warfarin"], ["aspirin", "lisinopril"]) == {
+            "aspirin": ("MODERATE", "Aspirin increases bleeding risk.")
+        }
+
+        others = [("Aspirin 81 MG", "aspirin")]
+        assert triage("warfarin", WARFARIN, others, table) == (
+            "keep", [("Aspirin 81 MG", "MODERATE", "Aspirin increases bleeding risk.")]
+        )
+        others = [("Lisinopril 10 MG", "lisinopril")]
+        assert triage("warfarin", WARFARIN, others, table) == ("drop", [])
+        assert triage("warfarin", WARFARIN, others, table, {"bleeding"}) == ("ask", [])
+    finally:
+        table.close()
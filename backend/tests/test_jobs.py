@@ -0,0 +1,192 @@
+import asyncio
+import json
+
+import pytest
+
+import main
+from jobs import DONE, FAILED, JobQueue, JobQueueFull, open_store
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def test_identical_submissions_share_one_job():
+    calls = []
+
+    async def handler(params):
+        calls.append(params)
+        await asyncio.sleep(0.01)
+        return {"n": params["n"]}
+
+    async def scenario():
+        q = JobQueue({"k": handler}, workers=1)
+        first = await q.submit("k", {"n": 1})
+        second = await q.submit("k", {"n": 1})
+        done = await q.wait(first["id"], 2)
+        again = await q.submit("k", {"n": 1})
+        await q.stop()
+        return first, second, done, again, q.counts
+
+    first, second, done, again, counts = run(scenario())
+    assert first["id"] == second["id"] == again["id"]
+    assert done["status"] == DONE and done["result"] == {"n": 1}
+    assert again["status"] == DONE
+    assert len(calls) == 1
+    assert counts["deduplicated"] == 2
+
+
+def test_failed_job_records_error_and_can_be_resubmitted():
+    attempts = []
+
+    async def handler(params):
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise RuntimeError("upstream down")
+        return "ok"
+
+    async def scenario():
+        q = JobQueue({"k": handler}, workers=1)
+        job = await q.submit("k", {})
+        failed = dict(await q.wait(job["id"], 2))
+        retry = await q.submit("k", {})
+        done = await q.wait(retry["id"], 2)
+        await q.stop()
+        return failed, done
+
+    failed, done = run(scenario())
+    assert failed["status"] == FAILED and failed["error"] == "upstream down"
+    assert done["status"] == DONE and done["result"] == "ok"
+
+
+def test_full_queue_rejects_instead_of_dropping():
+    async def scenario():
+        release = asyncio.Event()
+
+        async def handler(params):
+            await release.wait()
+
+        q = JobQueue({"k": handler}, workers=1, maxsize=1)
+        await q.submit("k", {"n": 1})
+        await asyncio.sleep(0)  # the worker takes job 1
+        await q.submit("k", {"n": 2})
+        with pytest.raises(JobQueueFull):
+            await q.submit("k", {"n": 3})
+        release.set()
+        await q.stop()
+        return q.counts
+
+    assert run(scenario())["rejected"] == 1
+
+
+def test_sqlite_store_keeps_results_across_restarts(tmp_path):
+    path = str(tmp_path / "jobs.db")
+
+    async def handler(params):
+        return {"v": params["n"]}
+
+    async def scenario():
+        q = JobQueue({"k": handler}, store=open_store(path))
+        job = await q.submit("k", {"n": 5})
+        await q.wait(job["id"], 2)
+        await q.stop()
+        fresh = JobQueue({"k": handler}, store=open_store(path))
+        return await fresh.get(job["id"])
+
+    assert run(scenario())["result"] == {"v": 5}
+
+
+def _lambda_event(method, path):
+    return {
+        "version": "2.0",
+        "routeKey": "$default",
+        "rawPath": path,
+        "rawQueryString": "",
+        "headers": {"host": "example.com", "content-type": "application/json"},
+        "requestContext": {
+            "http": {"method": method, "path": path, "protocol": "HTTP/1.1", "sourceIp": "127.0.0.1", "userAgent": "t"},
+            "domainName": "example.com",
+            "stage": "$default",
+        },
+        "isBase64Encoded": False,
+        "body": "",
+    }
+
+
+@pytest.fixture
+def lambda_loop():
+    # The Lambda runtime has a current loop; asyncio.run in earlier tests leaves none
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    yield loop
+    loop.run_until_complete(main.job_queue.stop())
+    asyncio.set_event_loop(None)
+    loop.close()
+
+
+def test_jobs_survive_lambda_invocation_shutdown(monkeypatch, lambda_loop):
+    # Mangum runs lifespan startup/shutdown around every invocation on a reused loop
+    async def slow_contraindications(params):
+        await asyncio.sleep(0.2)
+        return [{"label": "x"}]
+
+    monkeypatch.setitem(main.job_queue.handlers, "contraindications", slow_contraindications)
+    patient_id = next(iter(main.repository.iter_ids()))
+
+    submitted = main.handler(_lambda_event("POST", f"/jobs/contraindications/{patient_id}"), None)
+    assert submitted["statusCode"] == 202
+    job_id = json.loads(submitted["body"])["id"]
+
+    status = json.loads(main.handler(_lambda_event("GET", f"/jobs/{job_id}"), None)["body"])
+    assert status["status"] in ("queued", "running")
+
+    # Waiting on the job inside an invocation lets the workers finish it
+    events = main.handler(_lambda_event("GET", f"/jobs/{job_id}/events"), None)["body"]
+    assert "event: done" in events
+    result = main.handler(_lambda_event("GET", f"/jobs/{job_id}/result"), None)
+    assert json.loads(result["body"]) == [{"label": "x"}]
+
+
+def test_fda_request_in_flight_survives_lambda_invocation_shutdown(monkeypatch, lambda_loop):
+    import httpx
+
+    import openfda
+
+    in_flight, closed_mid_request = [], []
+
+    async def fda(request):
+        client = openfda._client
+        in_flight.append(request.url)
+        await asyncio.sleep(0.2)
+        # A real transport fails with ReadError when its client is closed under it
+        if client is None or client.is_closed:
+            closed_mid_request.append(request.url)
+            raise httpx.ReadError("client closed", request=request)
+        return httpx.Response(200, json={"results": []})
+
+    monkeypatch.setattr(openfda, "_new_client", lambda: httpx.AsyncClient(transport=httpx.MockTransport(fda)))
+    monkeypatch.setattr(openfda, "_client", None)
+    retries = openfda.fda_upstream.counts["retries"]
+
+    async def label_lookup(params):
+        response = await openfda._get("https://fda.test/drug/label.json")
+        return response.status_code
+
+    monkeypatch.setitem(main.job_queue.handlers, "contraindications", label_lookup)
+    # Job ids are keyed on their params; a patient the test above used would reuse its job
+    patient_id = list(main.repository.iter_ids())[1]
+
+    submitted = main.handler(_lambda_event("POST", f"/jobs/contraindications/{patient_id}"), None)
+    job_id = json.loads(submitted["body"])["id"]
+    # End an invocation while the job's FDA request is still waiting on its response
+    for _ in range(50):
+        main.handler(_lambda_event("GET", f"/jobs/{job_id}"), None)
+        if in_flight:
+            break
+    assert in_flight
+    main.handler(_lambda_event("GET", f"/jobs/{job_id}"), None)
+    events = main.handler(_lambda_event("GET", f"/jobs/{job_id}/events"), None)["body"]
+
+    assert "event: done" in events
+    assert closed_mid_request == []
+    assert openfda.fda_upstream.counts["retries"] == retries
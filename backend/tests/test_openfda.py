@@ -0,0 +1,43 @@
+import asyncio
+
+import pytest
+
+import openfda
+from cache import TTLCache
+
+
+def _label(generic, brand, warning):
+    # The get_drug_info shape, from an FDA label record
+    return openfda._label_fields({
+        "openfda": {"generic_name": [generic], "brand_name": [brand], "manufacturer_name": ["Acme"]},
+        "warnings": [warning],
+        "drug_interactions": ["Avoid potassium supplements."],
+    })
+
+
+@pytest.fixture
+def labels(monkeypatch):
+    cache = TTLCache(16, 60)
+    monkeypatch.setattr(openfda, "label_cache", cache)
+    monkeypatch.setattr(openfda, "label_store", None)
+    changed = []
+    monkeypatch.setattr(openfda, "_label_listeners", [changed.append])
+    return cache, changed
+
+
+def test_remember_does_not_count_as_cache_traffic(labels):
+    cache, _ = labels
+    asyncio.run(openfda._remember("zestril", _label("LISINOPRIL", "Zestril", "angioedema"), 200))
+    assert cache.stats()["hits"] == 0 and cache.stats()["misses"] == 0
+    assert cache.peek("lisinopril") == cache.peek("zestril")
+
+
+def test_remember_reports_only_changed_labels(labels):
+    cache, changed = labels
+    asyncio.run(openfda._remember("zestril", _label("LISINOPRIL", "Zestril", "angioedema"), 200))
+    asyncio.run(openfda._remember("zestril", _label("LISINOPRIL", "Zestril", "angioedema"), 200))
+    assert changed == []
+    asyncio.run(openfda._remember("zestril", _label("LISINOPRIL", "Zestril", "angioedema; pregnancy"), 200))
+    assert sorted(changed) == ["lisinopril", "zestril"]
+    assert cache.stats()["hits"] == 0
+
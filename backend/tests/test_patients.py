@@ -0,0 +1,89 @@
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+import patients
+from patients import (
+    MemoryPatientBackend,
+    PatientRepository,
+    SQLitePatientBackend,
+    decode_cursor,
+    encode_cursor,
+)
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def repo(request, tmp_path):
+    backend = MemoryPatientBackend() if request.param == "memory" else SQLitePatientBackend(str(tmp_path / "p.db"))
+    repo = PatientRepository(backend)
+    repo.upsert_many({f"p{i:02d}": {"name": f"Patient {i}", "patientDOB": "1980-01-01"} for i in range(7)})
+    yield repo
+    backend.close()
+
+
+def test_pages_cover_every_patient_once(repo):
+    seen, cursor = [], None
+    while True:
+        rows, cursor = repo.list_page(cursor, 3)
+        seen.extend(r["id"] for r in rows)
+        if cursor is None:
+            break
+    assert seen == [f"p{i:02d}" for i in range(7)]
+
+
+def test_page_after_a_deleted_cursor_row_continues(repo):
+    rows, cursor = repo.list_page(None, 2)
+    repo.delete(rows[-1]["id"])
+    rows, _ = repo.list_page(cursor, 2)
+    assert [r["id"] for r in rows] == ["p02", "p03"]
+
+
+def test_cursor_round_trips_any_id():
+    for patient_id in ("p01", "ünïcode/ïd", "a b+c"):
+        assert decode_cursor(encode_cursor(patient_id)) == patient_id
+
+
+@pytest.mark.parametrize("cursor", ["!!!", "cA=", "cDAx!", "====", "/w"])
+def test_invalid_cursors_are_rejected(cursor):
+    with pytest.raises(ValueError):
+        decode_cursor(cursor)
+
+
+def test_invalid_cursor_is_a_400():
+    client = TestClient(main.app)
+    response = client.get("/patients", params={"cursor": "!!!", "limit": 2})
+    assert response.status_code == 400
+
+
+def test_api_pages_through_next_cursor_header():
+    client = TestClient(main.app)
+    expected = [row["id"] for row in client.get("/patients").json()]
+    seen, params = [], {"limit": 2}
+    while True:
+        response = client.get("/patients", params=params)
+        assert response.status_code == 200
+        seen.extend(row["id"] for row in response.json())
+        if "X-Next-Cursor" not in response.headers:
+            break
+        params = {"limit": 2, "cursor": response.headers["X-Next-Cursor"]}
+    assert seen == expected
+
+
+def test_page_size_defaults_and_is_capped(repo, monkeypatch):
+    monkeypatch.setattr(patients, "PATIENTS_DEFAULT_PAGE", 3)
+    monkeypatch.setattr(patients, "PATIENTS_MAX_PAGE", 5)
+    rows, cursor = repo.list_page()
+    assert [r["id"] for r in rows] == ["p00", "p01", "p02"] and cursor is not None
+    rows, cursor = repo.list_page(None, 1000)
+    assert len(rows) == 5 and cursor is not None
+
+
+def test_api_without_limit_returns_a_bounded_first_page(monkeypatch):
+    client = TestClient(main.app)
+    everything = client.get("/patients")
+    # The sample store fits in the default page: whole list, no cursor, as before
+    assert "X-Next-Cursor" not in everything.headers
+    monkeypatch.setattr(patients, "PATIENTS_DEFAULT_PAGE", 2)
+    first = client.get("/patients")
+    assert first.json() == everything.json()[:2]
+    assert "X-Next-Cursor" in first.headers
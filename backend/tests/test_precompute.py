@@ -0,0 +1,199 @@
+import asyncio
+
+import pytest
+
+import main
+from budget import RateBudget, spend, use_budgets
+from cache import SingleFlight, TTLCache
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+@pytest.fixture
+def fresh_results(monkeypatch):
+    monkeypatch.setattr(main, "contraindication_results", TTLCache(64, 60))
+    monkeypatch.setattr(main, "contraindication_prior", TTLCache(64, 60))
+
+
+def _patient_ids(n):
+    ids = list(main.repository.iter_ids())[:n]
+    assert len(ids) == n
+    return ids
+
+
+def test_foreground_caller_joining_a_background_flight_skips_its_budget():
+    async def scenario():
+        flight = SingleFlight()
+        budgets = {"fda": RateBudget(per_minute=1, burst=1)}
+        joined = asyncio.Event()
+
+        async def work():
+            await spend("fda")
+            await joined.wait()
+            # The bucket is empty: a charged call would wait a minute here
+            await spend("fda")
+            return "labels"
+
+        async def background():
+            use_budgets(budgets)
+            return await flight.do("k", work)
+
+        owner = asyncio.create_task(background())
+        await asyncio.sleep(0)
+        waiter = asyncio.create_task(flight.do("k", work))
+        await asyncio.sleep(0)
+        joined.set()
+        results = await asyncio.wait_for(asyncio.gather(owner, waiter), 2)
+        return results, budgets, flight.coalesced
+
+    results, budgets, coalesced = run(scenario())
+    assert results == ["labels", "labels"]
+    assert coalesced == 1
+    # Only the flight's copy of the budgets was waived, not the scheduler's own
+    assert set(budgets) == {"fda"} and budgets["fda"].spent == 1
+
+
+def test_background_flight_stays_on_budget_without_foreground_callers():
+    async def scenario():
+        flight = SingleFlight()
+        budgets = {"gemini": RateBudget(per_minute=1, burst=1)}
+
+        async def work():
+            await spend("gemini")
+            await spend("gemini")
+
+        use_budgets(budgets)
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(flight.do("k", work), 0.2)
+
+    run(scenario())
+
+
+def test_precompute_joins_a_running_request(monkeypatch, fresh_results):
+    (patient_id,) = _patient_ids(1)
+    calls = []
+
+    async def compute(pid, key):
+        calls.append(pid)
+        await asyncio.sleep(0.05)
+        main.contraindication_results.set(key, ["computed"])
+        return ["computed"]
+
+    monkeypatch.setattr(main, "_compute_contraindications", compute)
+
+    async def scenario():
+        request = asyncio.create_task(main._contraindications_job({"patient_id": patient_id}))
+        await asyncio.sleep(0)
+        _, computed = await main._precompute_contraindications(patient_id, True)
+        return await request, computed
+
+    result, computed = run(scenario())
+    assert result == ["computed"] and computed
+    assert calls == [patient_id]
+
+
+def test_batch_joins_running_flights_and_keeps_their_local_result(monkeypatch, fresh_results):
+    first, second = _patient_ids(2)
+    prepared_for = []
+
+    async def prepare(pid):
+        prepared_for.append(pid)
+        entry = {"label": f"drug-{pid}", "items": ["x"]}
+        return {
+            "patient_name": pid, "medication_names": [entry["label"]], "history_text": "",
+            "family_text": "", "decided": [("keep", entry)], "ambiguous": [],
+        }
+
+    monkeypatch.setattr(main, "_prepare_contraindications", prepare)
+
+    async def scenario():
+        key = main._contraindications_key(first, main.repository.get(first))
+        release = asyncio.Event()
+        local = asyncio.get_running_loop().create_future()
+        local.set_result(["provisional"])
+
+        async def single():
+            main._contraindication_local[key] = local
+            await release.wait()
+            return ["from single request"]
+
+        request = asyncio.create_task(main._contraindication_flight.do(key, single))
+        await asyncio.sleep(0)
+        batch = asyncio.create_task(main.analyze_contraindications_batch([first, second], force=True))
+        await asyncio.sleep(0.05)
+        still_local = main._contraindication_local.get(key)
+        release.set()
+        await request
+        main._contraindication_local.pop(key, None)
+        return await batch, still_local is local
+
+    out, kept_local = run(scenario())
+    assert out[first] == ["from single request"]
+    assert out[second] == [{"label": f"drug-{second}", "items": ["x"]}]
+    assert prepared_for == [second]
+    assert kept_local
+
+
+def test_single_request_survives_a_cancelled_batch(monkeypatch, fresh_results):
+    first, second = _patient_ids(2)
+
+    async def prepare(pid):
+        entry = {"label": f"drug-{pid}", "items": ["x"]}
+        return {
+            "patient_name": pid, "medication_names": [entry["label"]], "history_text": "",
+            "family_text": "", "decided": [("ask", entry)], "ambiguous": [entry],
+        }
+
+    async def slow_batch(requests):
+        await asyncio.sleep(0.1)
+        return [[{**r["raw_results"][0], "items": ["filtered"]}] for r in requests]
+
+    monkeypatch.setattr(main, "_prepare_contraindications", prepare)
+    monkeypatch.setattr(main, "filter_and_summarize_contraindications_batch_async", slow_batch)
+
+    async def scenario():
+        batch = asyncio.create_task(main.analyze_contraindications_batch([first, second]))
+        await asyncio.sleep(0.01)
+        key = main._contraindications_key(first, main.repository.get(first))
+        single = asyncio.create_task(main._contraindication_flight.do(key, lambda: None))
+        await asyncio.sleep(0)
+        batch.cancel()
+        return await asyncio.wait_for(single, 1)
+
+    assert run(scenario())[0]["items"] == ["filtered"]
+
+
+def test_request_joining_a_batch_during_fda_lookups_gets_local_triage(monkeypatch, fresh_results):
+    first, second = _patient_ids(2)
+    monkeypatch.setattr(main, "CONTRAINDICATION_DEADLINE", 0.05)
+
+    async def prepare(pid):
+        # The other patient's FDA lookups are slow; this one's are quick
+        await asyncio.sleep(0.0 if pid == first else 0.2)
+        entry = {"label": f"drug-{pid}", "items": ["raw"]}
+        return {
+            "patient_name": pid, "medication_names": [entry["label"]], "history_text": "",
+            "family_text": "", "decided": [("ask", entry)], "ambiguous": [entry],
+        }
+
+    async def slow_batch(requests):
+        await asyncio.sleep(0.3)
+        return [[{**r["raw_results"][0], "items": ["filtered"]}] for r in requests]
+
+    monkeypatch.setattr(main, "_prepare_contraindications", prepare)
+    monkeypatch.setattr(main, "filter_and_summarize_contraindications_batch_async", slow_batch)
+
+    async def scenario():
+        batch = asyncio.create_task(main.analyze_contraindications_batch([first, second]))
+        await asyncio.sleep(0)
+        started = asyncio.get_running_loop().time()
+        results, provisional = await main._contraindications_within_deadline(first)
+        elapsed = asyncio.get_running_loop().time() - started
+        await batch
+        return results, provisional, elapsed
+
+    results, provisional, elapsed = run(scenario())
+    assert provisional and results[0]["items"] == ["raw"]
+    assert elapsed < 0.2
@@ -0,0 +1,186 @@
+import asyncio
+import itertools
+
+import httpx
+import pytest
+
+from resilience import CLOSED, HALF_OPEN, OPEN, CircuitOpenError, Upstream
+
+_names = itertools.count()
+
+
+def make(**kwargs) -> Upstream:
+    kwargs.setdefault("backoff_base", 0.0)
+    kwargs.setdefault("breaker_reset", 0.05)
+    return Upstream(f"test{next(_names)}", "TEST_UNSET", **kwargs)
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def failing(counter: list):
+    async def fn():
+        counter.append(1)
+        raise httpx.ConnectError("down")
+    return fn
+
+
+async def ok():
+    return "ok"
+
+
+def test_retries_count_as_one_failure_per_call():
+    upstream = make(retries=2, breaker_failures=2)
+    attempts = []
+
+    async def scenario():
+        with pytest.raises(httpx.ConnectError):
+            await upstream.call(failing(attempts))
+        assert upstream.state == CLOSED and upstream._failures == 1
+        with pytest.raises(httpx.ConnectError):
+            await upstream.call(failing(attempts))
+
+    run(scenario())
+    assert len(attempts) == 6
+    assert upstream.state == OPEN
+    assert upstream.counts["failed"] == 2 and upstream.counts["retries"] == 4 and upstream.counts["opened"] == 1
+
+
+def test_open_breaker_fails_fast_then_probes_once():
+    upstream = make(retries=2, breaker_failures=1)
+    attempts = []
+
+    async def scenario():
+        with pytest.raises(httpx.ConnectError):
+            await upstream.call(failing(attempts))
+        with pytest.raises(CircuitOpenError):
+            await upstream.call(ok)
+        await asyncio.sleep(0.06)
+        # The half-open probe gets a single attempt and reopens the breaker
+        before = len(attempts)
+        with pytest.raises(httpx.ConnectError):
+            await upstream.call(failing(attempts))
+        assert len(attempts) == before + 1
+        assert upstream.state == OPEN
+        await asyncio.sleep(0.06)
+        assert await upstream.call(ok) == "ok"
+
+    run(scenario())
+    assert upstream.state == CLOSED
+    assert upstream.counts["rejected"] == 1 and upstream.counts["opened"] == 2
+
+
+def test_non_transient_errors_are_neither_success_nor_failure():
+    upstream = make(retries=2, breaker_failures=2)
+    calls = []
+
+    async def broken():
+        calls.append(1)
+        raise KeyError("bug")
+
+    async def scenario():
+        with pytest.raises(httpx.ConnectError):
+            await upstream.call(failing([]))
+        with pytest.raises(KeyError):
+            await upstream.call(broken)
+        # Still one failure from before: the KeyError neither reset nor added to it
+        assert upstream._failures == 1
+        with pytest.raises(httpx.ConnectError):
+            await upstream.call(failing([]))
+
+    run(scenario())
+    assert calls == [1]
+    assert upstream.state == OPEN
+
+
+def test_probe_with_non_transient_error_lets_the_next_call_probe():
+    upstream = make(retries=0, breaker_failures=1)
+
+    async def bad_request():
+        raise TypeError("bad")
+
+    async def scenario():
+        with pytest.raises(httpx.ConnectError):
+            await upstream.call(failing([]))
+        await asyncio.sleep(0.06)
+        with pytest.raises(TypeError):
+            await upstream.call(bad_request)
+        assert upstream.state == HALF_OPEN
+        return await upstream.call(ok)
+
+    assert run(scenario()) == "ok"
+    assert upstream.state == CLOSED
+
+
+def test_only_the_probe_itself_can_release_the_probe():
+    upstream = make(retries=0, breaker_failures=1)
+
+    async def scenario():
+        release = asyncio.Event()
+
+        async def slow():
+            await release.wait()
+            return "late"
+
+        # Admitted while closed, still running when the breaker goes half-open
+        bystander = asyncio.create_task(upstream.call(slow))
+        await asyncio.sleep(0)
+        with pytest.raises(httpx.ConnectError):
+            await upstream.call(failing([]))
+        await asyncio.sleep(0.06)
+        probe = asyncio.create_task(upstream.call(slow))
+        await asyncio.sleep(0)
+        assert upstream.state == HALF_OPEN
+
+        bystander.cancel()
+        await asyncio.gather(bystander, return_exceptions=True)
+        with pytest.raises(CircuitOpenError):
+            await upstream.call(ok)
+
+        # Cancelling the probe itself frees the slot for the next caller
+        probe.cancel()
+        await asyncio.gather(probe, return_exceptions=True)
+        return await upstream.call(ok)
+
+    assert run(scenario()) == "ok"
+
+
+def test_retried_result_is_returned_when_retries_run_out():
+    upstream = make(retries=1, breaker_failures=5)
+    responses = []
+
+    async def busy():
+        responses.append(httpx.Response(503))
+        return responses[-1]
+
+    result = run(upstream.call(busy))
+    assert result.status_code == 503 and len(responses) == 2
+    assert upstream._failures == 1
+
+
+def test_cancelled_caller_cancels_the_request_before_the_hedge_starts():
+    up = make(hedge=True)
+    up._latencies.extend([1.0] * 50)  # p95 of a second: the cancel lands before any hedge
+    started, cancelled = [], []
+
+    async def slow():
+        started.append(1)
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.append(1)
+            raise
+
+    async def scenario():
+        call = asyncio.create_task(up.call(slow))
+        await asyncio.sleep(0.05)
+        call.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await call
+        await asyncio.sleep(0)
+        # Checked before asyncio.run's own cleanup cancels any leftover task
+        assert started == [1] and cancelled == [1]
+
+    run(scenario())
+    assert up.counts["hedged"] == 0
@@ -0,0 +1,72 @@
+from patient_search import PatientSearchIndex, build_index, parse_date, tokenize
+from patients import MemoryPatientBackend, PatientRepository
+
+ROSTER = {
+    "BIO-2023-001": {"name": "John Smith", "patientDOB": "May 21, 1989"},
+    "BIO-2023-002": {"name": "Johnny Appleseed", "patientDOB": "1975-03-02"},
+    "BIO-2023-003": {"name": "Jane Johnson", "patientDOB": "05/21/1989"},
+    "BIO-2023-004": {"name": "Maria Garcia", "patientDOB": "1990-12-01"},
+}
+
+
+def _index():
+    repo = PatientRepository(MemoryPatientBackend())
+    repo.upsert_many(ROSTER)
+    return repo, build_index(repo)
+
+
+def _ids(rows):
+    return [r["id"] for r in rows]
+
+
+def test_tokenize_and_dates():
+    assert tokenize("BIO-2023-001") == ["bio-2023-001", "bio", "2023", "001"]
+    assert parse_date("May 21, 1989") == parse_date("05/21/1989") == "1989-05-21"
+    assert parse_date("john") is None
+
+
+def test_prefix_ranks_shorter_completion_first():
+    _, index = _index()
+    assert _ids(index.search("john")) == ["BIO-2023-001", "BIO-2023-002", "BIO-2023-003"]
+    assert _ids(index.search("jo"))[:2] == ["BIO-2023-001", "BIO-2023-002"]
+
+
+def test_every_token_must_match():
+    _, index = _index()
+    assert _ids(index.search("john smi")) == ["BIO-2023-001"]
+    assert index.search("john garcia") == []
+
+
+def test_single_typo_matches_but_two_do_not():
+    _, index = _index()
+    assert _ids(index.search("smiht")) == ["BIO-2023-001"]
+    assert _ids(index.search("garica")) == ["BIO-2023-004"]
+    assert index.search("smxyh") == []
+    # Short tokens never match as typos
+    assert index.search("jxn") == []
+
+
+def test_id_and_dob_queries():
+    _, index = _index()
+    # Sibling ids are one typo away, but the exact id ranks first
+    assert _ids(index.search("bio-2023-004"))[0] == "BIO-2023-004"
+    assert sorted(_ids(index.search("1989-05-21"))) == ["BIO-2023-001", "BIO-2023-003"]
+    assert sorted(_ids(index.search("May 21 1989"))) == ["BIO-2023-001", "BIO-2023-003"]
+
+
+def test_index_follows_repository_writes():
+    repo, index = _index()
+    repo.upsert("BIO-2023-001", {"name": "Jonathan Smythe", "patientDOB": "May 21, 1989"})
+    assert _ids(index.search("smith")) == []
+    assert _ids(index.search("smythe")) == ["BIO-2023-001"]
+    repo.delete("BIO-2023-004")
+    assert index.search("garcia") == []
+    assert len(index) == 3
+
+
+def test_limit_is_capped():
+    index = PatientSearchIndex()
+    index.add_rows({"id": f"p{i}", "name": f"Pat {i}", "dob": "", "initials": "P"} for i in range(100))
+    assert len(index.search("pat", limit=1000)) <= 50
+    assert len(index.search("pat", limit=0)) == 1
+
@@ -0,0 +1,37 @@
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+from cache import TTLCache
+
+REQUEST = {"patient_name": "Ada Lovelace", "history": [], "medications": [{"label": "Aspirin 81 MG"}]}
+
+
+@pytest.fixture
+def summaries(monkeypatch):
+    cache = TTLCache(16, 60)
+    monkeypatch.setattr(main, "summary_cache", cache)
+    return cache, TestClient(main.app)
+
+
+def test_placeholder_summaries_are_not_cached(summaries):
+    # conftest leaves GEMINI_API_KEY unset, so Gemini answers with its placeholder
+    cache, client = summaries
+    response = client.post("/patient/summary", json=REQUEST)
+    assert response.json()[0]["summary"] == main.PLACEHOLDER_TEXTS[0]
+    assert "Gemini API key" in client.post("/patient/summary/stream", json=REQUEST).text
+    assert len(cache) == 0
+
+
+def test_generated_summaries_are_cached(summaries, monkeypatch):
+    cache, client = summaries
+    calls = []
+
+    async def generate(prompt, temperature):
+        calls.append(prompt)
+        return "Stable; review aspirin at the next visit."
+
+    monkeypatch.setattr(main, "generate_text_async", generate)
+    first = client.post("/patient/summary", json=REQUEST).json()
+    assert client.post("/patient/summary", json=REQUEST).json() == first
+    assert len(calls) == 1 and len(cache) == 1
@@ -18,15 +18,32 @@ export type Patient = {
 };
 
 /**
- * Fetches the list of patients from the backend (main.py GET /patients from sample_data).
+ * Fetches patients from the backend (main.py GET /patients), sorted by id.
+ * Pass `limit` to get only the first page instead of the whole roster.
  */
-export async function fetchPatients(): Promise<Patient[]> {
+export async function fetchPatients(limit?: number): Promise<Patient[]> {
   const base = getApiBase();
-  const res = await fetch(`${base}/patients`);
+  const query = limit ? `?limit=${limit}` : "";
+  const res = await fetch(`${base}/patients${query}`);
   if (!res.ok) throw new Error("Failed to load patients");
   return (await res.json()) as Patient[];
 }
 
+/**
+ * Ranked typeahead matches on name, id or DOB (main.py GET /patients/search).
+ */
+export async function searchPatients(
+  q: string,
+  limit = 10,
+  signal?: AbortSignal,
+): Promise<Patient[]> {
+  const base = getApiBase();
+  const params = new URLSearchParams({ q, limit: String(limit) });
+  const res = await fetch(`${base}/patients/search?${params}`, { signal });
+  if (!res.ok) throw new Error("Failed to search patients");
+  return (await res.json()) as Patient[];
+}
+
 export type SummaryItem = { type: "diagnostic"; summary: string };
 
 export type HistoryEntry = {
@@ -37,16 +54,12 @@ export type HistoryEntry = {
 };
 
 /**
- * Fetches patient clinical history from the backend.
+ * Patient clinical history, from the shared dashboard stream.
  */
 export async function fetchPatientHistory(
   patientId: string,
 ): Promise<HistoryEntry[]> {
-  const base = getApiBase();
-  const res = await fetch(`${base}/patient/${patientId}/history`);
-  if (!res.ok) throw new Error("Failed to load patient history");
-  const data = (await res.json()) as HistoryEntry[];
-  return data;
+  return loadDashboard(patientId).history;
 }
 
 export type MedicationEntry = {
@@ -59,16 +72,12 @@ export type MedicationEntry = {
 };
 
 /**
- * Fetches patient medications from the backend (OpenFDA-ready; description not yet implemented).
+ * Patient medications, from the shared dashboard stream (description not yet implemented).
  */
 export async function fetchPatientMedications(
   patientId: string,
 ): Promise<MedicationEntry[]> {
-  const base = getApiBase();
-  const res = await fetch(`${base}/patient/${patientId}/medications`);
-  if (!res.ok) throw new Error("Failed to load medications");
-  const data = (await res.json()) as MedicationEntry[];
-  return data;
+  return loadDashboard(patientId).medications;
 }
 
 export type ContraindicationEntry = {
@@ -88,116 +97,171 @@ export type FamilyHistoryEntry = {
 };
 
 /**
- * Fetches patient family history from the backend (main.py from sample_data).
+ * Patient family history, from the shared dashboard stream.
  */
 export async function fetchPatientFamilyHistory(
   patientId: string,
 ): Promise<FamilyHistoryEntry[]> {
-  const base = getApiBase();
-  const res = await fetch(`${base}/patient/${patientId}/family_history`);
-  if (!res.ok) throw new Error("Failed to load family history");
-  return (await res.json()) as FamilyHistoryEntry[];
+  return loadDashboard(patientId).family_history;
 }
 
 /**
- * Fetches potential contraindications from the backend (OpenFDA; description not yet implemented).
+ * Potential contraindications (OpenFDA + Gemini), from the shared dashboard stream.
  */
 export async function fetchContraindications(
   patientId: string,
 ): Promise<ContraindicationEntry[]> {
-  const base = getApiBase();
-  const res = await fetch(`${base}/patient/${patientId}/contraindications`);
-  if (!res.ok) throw new Error("Failed to load contraindications");
-  const data = (await res.json()) as ContraindicationEntry[];
-  return data;
+  return loadDashboard(patientId).contraindications;
 }
 
 /**
- * Fetches patient info, history, medications, family history, and contraindications,
- * then calls the backend to generate an AI summary that considers all of these.
- * Returns the summary items array.
+ * Returns the AI summary, which the backend builds from the patient's history,
+ * medications, family history, and contraindications.
  */
 export async function fetchPatientSummary(
   patientId: string,
 ): Promise<SummaryItem[]> {
-  const base = getApiBase();
+  return loadDashboard(patientId).summary;
+}
 
-  const [patientRes, historyRes, medsRes, familyRes, contraRes] =
-    await Promise.all([
-      fetch(`${base}/patient/${patientId}`),
-      fetch(`${base}/patient/${patientId}/history`),
-      fetch(`${base}/patient/${patientId}/medications`),
-      fetch(`${base}/patient/${patientId}/family_history`),
-      fetch(`${base}/patient/${patientId}/contraindications`),
-    ]);
-
-  if (!patientRes.ok || !historyRes.ok || !medsRes.ok) {
-    throw new Error("Failed to load patient data");
-  }
+export type PatientInfo = {
+  name: string;
+  patientid: string;
+  patientDOB: string;
+};
+
+export type PatientDashboard = {
+  patient: PatientInfo;
+  history: HistoryEntry[];
+  medications: MedicationEntry[];
+  family_history: FamilyHistoryEntry[];
+  contraindications: ContraindicationEntry[];
+  summary: SummaryItem[];
+};
+
+type DashboardSection = keyof PatientDashboard;
 
-  const patient = (await patientRes.json()) as { name: string };
-  const history = (await historyRes.json()) as Array<{
-    label: string;
-    date?: string;
-    items?: string[];
-  }>;
-  const medications = (await medsRes.json()) as Array<{
-    label: string;
-    items?: string[];
-  }>;
-  const familyHistory = familyRes.ok
-    ? ((await familyRes.json()) as Array<{
-        label: string;
-        relation?: string;
-        conditions?: string[];
-      }>)
-    : [];
-  const contraindications = contraRes.ok
-    ? ((await contraRes.json()) as Array<{
-        label: string;
-        severity?: string;
-        items?: string[];
-      }>)
-    : [];
-
-  const summaryRes = await fetch(`${base}/patient/summary`, {
-    method: "POST",
-    headers: { "Content-Type": "application/json" },
-    body: JSON.stringify({
-      patient_name: patient.name,
-      history: history.map((h) => ({
-        label: h.label,
-        date: h.date ?? "",
-        items: h.items ?? [],
-      })),
-      medications: medications.map((m) => ({
-        label: m.label,
-        items: m.items ?? [],
-      })),
-      family_history: familyHistory.map((f) => ({
-        label: f.label,
-        relation: f.relation ?? "",
-        conditions: f.conditions ?? [],
-      })),
-      contraindications: contraindications.map((c) => ({
-        label: c.label,
-        severity: c.severity ?? "",
-        items: c.items ?? [],
-      })),
-    }),
-  });
-
-  if (!summaryRes.ok) {
-    const err = await summaryRes
-      .json()
-      .catch(() => ({ detail: summaryRes.statusText }));
-    throw new Error(
-      typeof err.detail === "string"
-        ? err.detail
-        : "Failed to generate summary",
-    );
+type DashboardLoad = {
+  [K in DashboardSection]: Promise<PatientDashboard[K]>;
+};
+
+const DASHBOARD_SECTIONS: DashboardSection[] = [
+  "patient",
+  "history",
+  "medications",
+  "family_history",
+  "contraindications",
+  "summary",
+];
+
+const dashboardLoads = new Map<string, DashboardLoad>();
+
+/** How long a finished dashboard load is reused, so remounting cards don't refetch. */
+const DASHBOARD_REUSE_MS = 30_000;
+
+/**
+ * Streams GET /patient/{id}/dashboard?stream=true once per patient and hands each
+ * section to whichever card asks for it, so the cards mounted for one dashboard
+ * share a single request. A complete load is kept for DASHBOARD_REUSE_MS after the
+ * stream ends; one with failed or provisional sections is dropped at once so the
+ * next visit refetches.
+ */
+function loadDashboard(patientId: string): DashboardLoad {
+  const existing = dashboardLoads.get(patientId);
+  if (existing) return existing;
+
+  const resolvers = {} as Record<
+    DashboardSection,
+    { resolve: (value: unknown) => void; reject: (err: Error) => void }
+  >;
+  const load = {} as Record<DashboardSection, Promise<unknown>>;
+  for (const section of DASHBOARD_SECTIONS) {
+    load[section] = new Promise((resolve, reject) => {
+      resolvers[section] = { resolve, reject };
+    });
+    // Sections no card asked for shouldn't surface as unhandled rejections
+    load[section].catch(() => {});
   }
+  dashboardLoads.set(patientId, load as DashboardLoad);
+
+  const settled = new Set<DashboardSection>();
+  let reusable = true;
+  const settle = (section: DashboardSection, value: unknown, err?: Error) => {
+    if (settled.has(section)) return;
+    settled.add(section);
+    if (err) {
+      reusable = false;
+      resolvers[section].reject(err);
+    } else resolvers[section].resolve(value);
+  };
+  const failRemaining = (err: Error) => {
+    for (const section of DASHBOARD_SECTIONS) settle(section, undefined, err);
+  };
 
-  const data = (await summaryRes.json()) as SummaryItem[];
-  return data;
+  streamDashboard(patientId, (event, data) => {
+    if (event === "error") {
+      const { section, detail } = data as { section: string; detail?: string };
+      if (DASHBOARD_SECTIONS.includes(section as DashboardSection)) {
+        settle(
+          section as DashboardSection,
+          undefined,
+          new Error(detail || `Failed to load ${section}`),
+        );
+      }
+    } else if (event === "provisional") {
+      // Gemini is still finishing these in the background; the next visit should ask again
+      reusable = false;
+    } else if (DASHBOARD_SECTIONS.includes(event as DashboardSection)) {
+      const section = event as DashboardSection;
+      // Lists arrive wrapped as {data: [...]}; the patient object arrives as-is
+      settle(section, section === "patient" ? data : (data as { data: unknown }).data);
+    }
+  })
+    .catch((e) =>
+      failRemaining(e instanceof Error ? e : new Error("Failed to load dashboard")),
+    )
+    .finally(() => {
+      failRemaining(new Error("Failed to load dashboard"));
+      const drop = () => {
+        if (dashboardLoads.get(patientId) === (load as DashboardLoad)) dashboardLoads.delete(patientId);
+      };
+      if (reusable) setTimeout(drop, DASHBOARD_REUSE_MS);
+      else drop();
+    });
+
+  return load as DashboardLoad;
+}
+
+/**
+ * Reads a Server-Sent Events response from fetch and calls onEvent(event, data)
+ * for each event, with data parsed as JSON.
+ */
+async function streamDashboard(
+  patientId: string,
+  onEvent: (event: string, data: unknown) => void,
+): Promise<void> {
+  const base = getApiBase();
+  const res = await fetch(`${base}/patient/${patientId}/dashboard?stream=true`);
+  if (!res.ok || !res.body) throw new Error("Failed to load patient data");
+
+  const reader = res.body.pipeThrough(new TextDecoderStream()).getReader();
+  let buffer = "";
+  for (;;) {
+    const { value, done } = await reader.read();
+    if (done) break;
+    buffer += value;
+    let boundary = buffer.indexOf("\n\n");
+    while (boundary !== -1) {
+      const block = buffer.slice(0, boundary);
+      buffer = buffer.slice(boundary + 2);
+      let event = "message";
+      const dataLines: string[] = [];
+      for (const line of block.split("\n")) {
+        if (line.startsWith("event:")) event = line.slice(6).trim();
+        else if (line.startsWith("data:")) dataLines.push(line.slice(5).trimStart());
+      }
+      if (dataLines.length) onEvent(event, JSON.parse(dataLines.join("\n")));
+      boundary = buffer.indexOf("\n\n");
+    }
+  }
 }
@@ -1,11 +1,14 @@
 import { useState, useEffect } from "react";
 import { Link, useSearchParams, useNavigate } from "react-router-dom";
-import { fetchPatients, type Patient } from "../api/client";
+import { fetchPatients, searchPatients, type Patient } from "../api/client";
 
 const DEFAULT_PATIENT_ID = "BIO-20231205";
+const SUGGESTION_COUNT = 8;
+const SEARCH_DEBOUNCE_MS = 150;
 
 export default function Navbar() {
-  const [patients, setPatients] = useState<Patient[]>([]);
+  const [suggestions, setSuggestions] = useState<Patient[]>([]);
+  const [results, setResults] = useState<Patient[]>([]);
   const [currentPatient, setCurrentPatient] = useState<Patient | null>(null);
   const [query, setQuery] = useState("");
   const [showResults, setShowResults] = useState(false);
@@ -13,28 +16,54 @@ export default function Navbar() {
   const navigate = useNavigate();
   const patientIdFromUrl = searchParams.get("patient") || DEFAULT_PATIENT_ID;
 
+  // First page only: shown while the search box is empty
   useEffect(() => {
     let cancelled = false;
-    fetchPatients()
+    fetchPatients(SUGGESTION_COUNT)
       .then((list) => {
-        if (!cancelled) setPatients(list);
+        if (!cancelled) setSuggestions(list);
       })
       .catch(() => {});
     return () => { cancelled = true; };
   }, []);
 
   useEffect(() => {
-    const match = patients.find((p) => p.id === patientIdFromUrl);
-    setCurrentPatient(match ?? patients[0] ?? null);
-  }, [patients, patientIdFromUrl]);
+    let cancelled = false;
+    searchPatients(patientIdFromUrl, 1)
+      .then((list) => {
+        if (cancelled) return;
+        const match = list.find((p) => p.id === patientIdFromUrl);
+        setCurrentPatient(match ?? null);
+      })
+      .catch(() => {});
+    return () => { cancelled = true; };
+  }, [patientIdFromUrl]);
+
+  useEffect(() => {
+    if (!currentPatient && suggestions.length > 0) {
+      setCurrentPatient(suggestions[0]);
+    }
+  }, [currentPatient, suggestions]);
+
+  useEffect(() => {
+    const q = query.trim();
+    if (!q) {
+      setResults([]);
+      return;
+    }
+    const controller = new AbortController();
+    const timer = setTimeout(() => {
+      searchPatients(q, SUGGESTION_COUNT, controller.signal)
+        .then(setResults)
+        .catch(() => {});
+    }, SEARCH_DEBOUNCE_MS);
+    return () => {
+      clearTimeout(timer);
+      controller.abort();
+    };
+  }, [query]);
 
-  const filtered = query.trim()
-    ? patients.filter(
-        (p) =>
-          p.name.toLowerCase().includes(query.toLowerCase()) ||
-          p.id.toLowerCase().includes(query.toLowerCase()),
-      )
-    : patients;
+  const filtered = query.trim() ? results : suggestions;
 
   return (
     <nav className="flex items-center justify-between px-6 py-2.5 bg-white border-b border-slate-200">